@@ -5,13 +5,14 @@ from flask_migrate import Migrate
 from flask_login import LoginManager
 from dotenv import load_dotenv
 import os
+import tempfile
 
 db = SQLAlchemy()
 migrate = Migrate()
 login_manager = LoginManager()
 login_manager.login_view = "auth.login"  # redirect unauthorized users
 
-def create_app():
+def create_app(test_config=None):
     load_dotenv()
     app = Flask(__name__)
 
@@ -22,23 +23,90 @@ def create_app():
 
     # local static path for uploads
     app.config["UPLOAD_FOLDER"] = os.getenv("UPLOAD_FOLDER")
-    os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
 
     # aws s3 settings (for prod)
     app.config["USE_S3"] = os.getenv("USE_S3", "false").lower() == "true"
     app.config["S3_BUCKET_NAME"] = os.getenv("S3_BUCKET_NAME")
+    app.config["S3_ENDPOINT_URL"] = os.getenv("S3_ENDPOINT_URL")
+
+    # direct uploads: presigned POST limits, also enforced by the local endpoint
+    app.config["MAX_SCREENSHOT_BYTES"] = int(
+        os.getenv("MAX_SCREENSHOT_BYTES", str(10 * 1024 * 1024))
+    )
+    app.config["UPLOAD_URL_TTL"] = 300
+
+    # screenshots wait here until a background worker has sent them to s3
+    app.config["UPLOAD_SPOOL"] = os.getenv(
+        "UPLOAD_SPOOL", os.path.join(tempfile.gettempdir(), "mk8-upload-spool")
+    )
+    app.config["UPLOAD_WORKERS"] = int(os.getenv("UPLOAD_WORKERS", "4"))
+    app.config["UPLOAD_MAX_PENDING"] = int(os.getenv("UPLOAD_MAX_PENDING", "64"))
+    app.config["UPLOAD_QUEUE_TIMEOUT"] = 5
+    app.config["UPLOAD_RETRIES"] = 3
+    app.config["UPLOAD_RETRY_BACKOFF"] = 1.0
+
+    # thumbnails and webp copies of each screenshot, made in a process pool
+    app.config["SCREENSHOT_DERIVATIVES"] = (
+        os.getenv("SCREENSHOT_DERIVATIVES", "true").lower() == "true"
+    )
+    # perceptual hashes of each upload, for spotting reused proof; made with
+    # the derivatives when those are on, on the same pool on their own if not
+    app.config["SCREENSHOT_HASHES"] = (
+        os.getenv("SCREENSHOT_HASHES", "true").lower() == "true"
+    )
+    app.config["IMAGE_WORKERS"] = int(os.getenv("IMAGE_WORKERS", "2"))
+    # screenshots this many bits apart (of 64) are flagged as the same proof
+    app.config["PHASH_MAX_DISTANCE"] = 6
+
+    # moderators claim pending entries in batches, each leased for a while
+    app.config["CLAIM_BATCH"] = int(os.getenv("CLAIM_BATCH", "10"))
+    app.config["CLAIM_LEASE_SECONDS"] = int(os.getenv("CLAIM_LEASE_SECONDS", "900"))
+    # times this many standard deviations faster than their track's typical
+    # time are flagged and moderated first
+    app.config["SUSPICION_FLAG"] = 3.0
+
+    # keep each track's standings in a sorted in-process array, so ranks
+    # and pages skip the COUNT over the index; costs memory per worker
+    app.config["RANK_INDEX"] = os.getenv("RANK_INDEX", "false").lower() == "true"
+
+    # seconds nginx may serve an anonymous leaderboard page without asking us
+    app.config["PUBLIC_MAX_AGE"] = int(os.getenv("PUBLIC_MAX_AGE", "30"))
+
+    # live leaderboard streams, each one holds a worker thread open; by
+    # default a quarter of gunicorn's threads, the rest serve everything else
+    app.config["WORKER_THREADS"] = int(os.getenv("WORKER_THREADS", "32"))
+    app.config["SSE_MAX_SUBSCRIBERS"] = int(
+        os.getenv("SSE_MAX_SUBSCRIBERS", app.config["WORKER_THREADS"] // 4)
+    )
+    app.config["SSE_HEARTBEAT_SECONDS"] = 15
+
+    if test_config is not None:
+        app.config.update(test_config)
+
+    os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
 
     db.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
 
+    from . import derivatives, events, uploads, users
+    users.init_app(app)
+    events.init_app(app)
+    uploads.init_app(app)
+    derivatives.init_app(app)
+
     #blueprints
     from .routes.main import main
     from .routes.auth import auth
     from .routes.admin import admin
+    from .routes.api import api
 
     app.register_blueprint(main)
     app.register_blueprint(auth)
     app.register_blueprint(admin)
+    app.register_blueprint(api)
+
+    from . import commands
+    commands.init_app(app)
 
     return app
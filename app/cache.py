@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from . import db
+from .models import CacheVersion
+from .sql import upsert
+
+_MISSING = object()
+_caches = {}
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire ``ttl`` seconds after being set.
+
+    Caches live per process. Callers that need cross-worker invalidation put a
+    DB version (see ``get_version``) in the key, so a bump simply makes the
+    old entries unreachable until they age out.
+    """
+
+    def __init__(self, name, maxsize=128, ttl=300):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        _caches[name] = self
+
+    def _lookup(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for ``key``, calling ``loader`` on a miss.
+
+        Concurrent misses on the same key wait for a single loader call
+        instead of all hitting the database at once.
+        """
+        value = self._lookup(key)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+                value = loader()
+                self.set(key, value)
+            else:
+                self.hits += 1
+        with self._lock:
+            self._loading.pop(key, None)
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+        }
+
+
+def clear_caches():
+    for cache in _caches.values():
+        cache.clear()
+
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+def get_version(key):
+    return version_info(key)[0]
+
+
+def version_info(key):
+    """The version for ``key`` and when it last changed (None if never)."""
+    row = db.session.get(CacheVersion, key)
+    if row is None:
+        return 0, None
+    updated_at = row.updated_at
+    if updated_at.tzinfo is None:
+        # sqlite hands back naive datetimes, they were stored as UTC
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return row.version, updated_at
+
+
+def bump_version(key):
+    """Increment the version for ``key`` as part of the current transaction.
+
+    Returns the new version. The row stays locked until commit, so it is
+    exactly the version this transaction's write will be published as.
+    """
+    now = datetime.now(timezone.utc)
+    version = db.session.execute(upsert(
+        CacheVersion,
+        {"key": key, "version": 1, "updated_at": now},
+        keys=[CacheVersion.key],
+        update={"version": CacheVersion.version + 1, "updated_at": now},
+    ).returning(CacheVersion.version)).scalar_one()
+    # drop any stale copy already loaded into this session
+    row = db.session.identity_map.get(db.session.identity_key(CacheVersion, key))
+    if row is not None:
+        db.session.expire(row)
+    return version
@@ -0,0 +1,103 @@
+import os
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+from flask import current_app
+from sqlalchemy import select, union_all
+
+from . import db
+from .models import Leaderboard, ScreenshotObject, Submission
+from .uploads import delete_stored, key_from_url, stored_url, uploader
+
+# one object in the bucket or UPLOAD_FOLDER
+StoredObject = namedtuple("StoredObject", "key size modified")
+
+# delete_objects takes at most this many keys per call
+MAX_BATCH = 1000
+
+
+def iter_stored():
+    """Stream every stored object, a page or directory entry at a time."""
+    if current_app.config["USE_S3"]:
+        paginator = uploader().s3.get_paginator("list_objects_v2")
+        pages = paginator.paginate(
+            Bucket=current_app.config["S3_BUCKET_NAME"],
+            PaginationConfig={"PageSize": MAX_BATCH},
+        )
+        for page in pages:
+            for obj in page.get("Contents", ()):
+                yield StoredObject(obj["Key"], obj["Size"], obj["LastModified"])
+        return
+    with os.scandir(current_app.config["UPLOAD_FOLDER"]) as entries:
+        for entry in entries:
+            # other dotfiles aren't ours; stale half-written uploads are
+            if entry.name.startswith(".") and not entry.name.startswith(".incoming-"):
+                continue
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            modified = datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+            yield StoredObject(entry.name, stat.st_size, modified)
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def referenced(keys):
+    """The subset of ``keys`` some entry or history row still points at."""
+    urls = [stored_url(key) for key in keys]
+    paths = union_all(
+        select(ScreenshotObject.key).where(ScreenshotObject.key.in_(keys)),
+        select(Leaderboard.screenshot_path).where(Leaderboard.screenshot_path.in_(urls)),
+        select(Leaderboard.thumbnail_path).where(Leaderboard.thumbnail_path.in_(urls)),
+        select(Leaderboard.webp_path).where(Leaderboard.webp_path.in_(urls)),
+        select(Submission.screenshot_path).where(
+            Submission.screenshot_path.in_(urls)
+        ),
+    )
+    return {key_from_url(path) for path in db.session.scalars(paths)}
+
+
+def foreign_paths():
+    """How many entries and history rows point outside the current storage.
+
+    Collection matches objects to rows by URL, so with any of these around
+    it could delete screenshots that are still in use.
+    """
+    prefix = stored_url("")
+    return sum(
+        model.query.filter(
+            ~model.screenshot_path.startswith(prefix, autoescape=True)
+        ).count()
+        for model in (Leaderboard, Submission)
+    )
+
+
+def sweep(dry_run=False, min_age=3600, rate=0, batch_size=MAX_BATCH):
+    """Find, and unless ``dry_run`` delete, objects no entry references.
+
+    Walks storage in batches of ``batch_size``, looking each batch up in
+    the database, and yields ``(scanned, orphans)`` per batch as it goes.
+    Objects younger than ``min_age`` seconds are left alone: a direct upload
+    is stored before the submit that references it. ``rate`` caps deletions
+    per second.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=min_age)
+    for batch in batched(iter_stored(), min(batch_size, MAX_BATCH)):
+        old = [obj for obj in batch if obj.modified < cutoff]
+        orphans = []
+        if old:
+            used = referenced([obj.key for obj in old])
+            orphans = [obj for obj in old if obj.key not in used]
+            # don't hold a read transaction open between batches
+            db.session.rollback()
+        if orphans and not dry_run:
+            delete_stored([obj.key for obj in orphans])
+            if rate:
+                time.sleep(len(orphans) / rate)
+        yield len(batch), orphans
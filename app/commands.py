@@ -0,0 +1,157 @@
+import time
+
+import click
+
+from . import cleanup, cups, db, derivatives, phash, points, screening, uploads
+from .export import FORMATS, export_tracks, iter_export
+
+
+@click.command("export-times")
+@click.option("--format", "fmt", type=click.Choice(list(FORMATS)), default="csv")
+@click.option("--track", help="Only export this track.")
+@click.option("--cup", help="Only export the tracks in this cup.")
+@click.option("--output", type=click.File("w"), default="-",
+              help="File to write to, stdout by default.")
+def export_times(fmt, track, cup, output):
+    """Stream every verified time, joined with its username."""
+    try:
+        tracks = export_tracks(track, cup)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    for chunk in iter_export(fmt, tracks):
+        output.write(chunk)
+
+
+@click.command("rebuild-cups")
+def rebuild_cups():
+    """Recompute every materialized cup standing in one grouped query."""
+    count = cups.rebuild()
+    db.session.commit()
+    click.echo(f"Rebuilt {count} cup standings")
+
+
+@click.command("rebuild-points")
+def rebuild_points():
+    """Recompute the global points ranking from every track's standings."""
+    count = points.rebuild()
+    db.session.commit()
+    click.echo(f"Awarded points for {count} placements")
+
+
+@click.command("check-points")
+def check_points():
+    """Compare the incrementally kept points with a full recomputation."""
+    mismatches = points.check()
+    for user_id, (persisted, expected) in sorted(mismatches.items()):
+        click.echo(f"user {user_id}: stored {persisted}, expected {expected}")
+    if mismatches:
+        raise click.ClickException(f"{len(mismatches)} players out of sync")
+    click.echo("Points are consistent")
+
+
+@click.command("resume-uploads")
+def resume_uploads():
+    """Retry screenshots still waiting in the spool for the bucket."""
+    uploaded, failed = uploads.resume()
+    click.echo(f"Uploaded {uploaded} screenshots, {failed} still failing")
+
+
+@click.command("backfill-derivatives")
+@click.option("--batch-size", default=20, show_default=True,
+              help="Screenshots held in memory and rendered at once.")
+def backfill_derivatives(batch_size):
+    """Make thumbnails and webp copies for screenshots that lack them."""
+    made, failed = derivatives.backfill(batch_size)
+    click.echo(f"Made derivatives for {made} screenshots, {failed} failed")
+
+
+@click.command("content-address-screenshots")
+@click.option("--batch-size", default=100, show_default=True)
+def content_address_screenshots(batch_size):
+    """Move screenshots to digest keys and rewrite their paths."""
+    moved, missing = uploads.content_address(batch_size)
+    click.echo(f"Moved {moved} screenshots, {missing} missing or unreadable")
+
+
+@click.command("rebuild-screenshot-refs")
+def rebuild_screenshot_refs():
+    """Recount how many entries and history rows use each screenshot."""
+    count = uploads.rebuild_references()
+    db.session.commit()
+    click.echo(f"Counted references to {count} screenshots")
+
+
+@click.command("gc-screenshots")
+@click.option("--dry-run", is_flag=True, help="Only list what would be deleted.")
+@click.option("--min-age", default=3600, show_default=True,
+              help="Seconds an object must have existed to be collected.")
+@click.option("--rate", default=0.0,
+              help="Most deletions per second, unlimited by default.")
+@click.option("--batch-size", type=click.IntRange(1, cleanup.MAX_BATCH),
+              default=cleanup.MAX_BATCH, show_default=True)
+@click.option("--interval", default=0,
+              help="Keep running, sweeping every this many seconds.")
+@click.option("--force", is_flag=True,
+              help="Sweep even if some entries point outside this storage.")
+def gc_screenshots(dry_run, min_age, rate, batch_size, interval, force):
+    """Delete stored screenshots that no entry or history row references."""
+    foreign = cleanup.foreign_paths()
+    if foreign and not force:
+        raise click.ClickException(
+            f"{foreign} entries or history rows point outside the configured "
+            "storage; refusing to sweep without --force"
+        )
+    while True:
+        scanned = orphaned = freed = 0
+        for count, orphans in cleanup.sweep(dry_run, min_age, rate, batch_size):
+            scanned += count
+            orphaned += len(orphans)
+            freed += sum(obj.size for obj in orphans)
+            if dry_run:
+                for obj in orphans:
+                    click.echo(f"would delete {obj.key}")
+        verb = "Would free" if dry_run else "Freed"
+        click.echo(f"Scanned {scanned} objects, {orphaned} orphaned. "
+                   f"{verb} {freed} bytes")
+        if not interval:
+            return
+        time.sleep(interval)
+
+
+@click.command("hash-screenshots")
+@click.option("--batch-size", default=50, show_default=True)
+def hash_screenshots(batch_size):
+    """Compute perceptual hashes for screenshots in the history."""
+    hashed, failed = phash.backfill(batch_size)
+    click.echo(f"Hashed {hashed} screenshots, {failed} unreadable")
+
+
+@click.command("rebuild-track-stats")
+def rebuild_track_stats():
+    """Recompute each track's time distribution from its verified times."""
+    count = screening.rebuild()
+    db.session.commit()
+    click.echo(f"Rebuilt stats for {count} tracks")
+
+
+@click.command("rescore-pending")
+@click.option("--batch-size", default=5000, show_default=True)
+def rescore_pending(batch_size):
+    """Score the whole moderation queue against the current track stats."""
+    count = screening.rescore(batch_size)
+    click.echo(f"Rescored {count} pending entries")
+
+
+def init_app(app):
+    app.cli.add_command(export_times)
+    app.cli.add_command(rebuild_cups)
+    app.cli.add_command(rebuild_points)
+    app.cli.add_command(check_points)
+    app.cli.add_command(resume_uploads)
+    app.cli.add_command(backfill_derivatives)
+    app.cli.add_command(content_address_screenshots)
+    app.cli.add_command(rebuild_screenshot_refs)
+    app.cli.add_command(gc_screenshots)
+    app.cli.add_command(hash_screenshots)
+    app.cli.add_command(rebuild_track_stats)
+    app.cli.add_command(rescore_pending)
@@ -0,0 +1,88 @@
+from sqlalchemy import case, delete, func, insert, select
+
+from . import db
+from .models import CupStanding, Leaderboard, User
+from .sql import upsert
+from .tracks import CUPS, TRACK_CUPS
+
+CUP_SIZE = 4
+
+
+def cup_totals(cup=None, user_ids=None):
+    """Summed verified time per (cup, player), for players with all four tracks.
+
+    A single grouped query: with no filters it aggregates every cup in one
+    pass, mapping each track to its cup with a CASE expression.
+    """
+    cup_of = case(TRACK_CUPS, value=Leaderboard.track)
+    query = (
+        select(
+            cup_of.label("cup"),
+            Leaderboard.user_id,
+            func.sum(Leaderboard.total_ms).label("total_ms"),
+        )
+        .where(Leaderboard.verified.is_(True))
+        .group_by(cup_of, Leaderboard.user_id)
+        .having(func.count() == CUP_SIZE)
+    )
+    if cup is not None:
+        query = query.where(Leaderboard.track.in_(CUPS[cup]))
+    if user_ids is not None:
+        query = query.where(Leaderboard.user_id.in_(user_ids))
+    return query
+
+
+def refresh_player(track, user_id):
+    """Recompute one player's row in the cup containing ``track``.
+
+    Call after a verified time on ``track`` appeared, changed or went away;
+    only that player's four entries are summed again.
+    """
+    refresh_players(track, [user_id])
+
+
+def refresh_players(track, user_ids):
+    """``refresh_player`` for several players at once, in one grouped query."""
+    cup = TRACK_CUPS[track]
+    user_ids = set(user_ids)
+    totals = {
+        row.user_id: row.total_ms
+        for row in db.session.execute(cup_totals(cup, user_ids))
+    }
+    gone = user_ids - totals.keys()
+    if gone:
+        db.session.execute(delete(CupStanding).where(
+            CupStanding.cup == cup, CupStanding.user_id.in_(gone)
+        ))
+    for user_id, total_ms in totals.items():
+        db.session.execute(upsert(
+            CupStanding,
+            {"cup": cup, "user_id": user_id, "total_ms": total_ms},
+            keys=[CupStanding.cup, CupStanding.user_id],
+            update={"total_ms": total_ms},
+        ))
+
+
+def rebuild():
+    """Throw away the materialized standings and aggregate them from scratch."""
+    db.session.execute(delete(CupStanding))
+    rows = db.session.execute(cup_totals()).all()
+    if rows:
+        db.session.execute(insert(CupStanding), [row._asdict() for row in rows])
+    return len(rows)
+
+
+def cup_standings(cup, limit=50):
+    return (
+        db.session.query(CupStanding.user_id, User.username, CupStanding.total_ms)
+        .join(User)
+        .filter(CupStanding.cup == cup)
+        .order_by(CupStanding.total_ms, CupStanding.user_id)
+        .limit(limit)
+        .all()
+    )
+
+
+def format_total(total_ms):
+    mins, ms = divmod(total_ms, 60_000)
+    return "%02d:%02d:%03d" % (mins, ms // 1000, ms % 1000)
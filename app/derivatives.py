@@ -0,0 +1,224 @@
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from flask import current_app
+from PIL import Image
+from sqlalchemy import select
+
+from . import db, phash, uploads
+from .cache import bump_version
+from .models import Leaderboard
+
+logger = logging.getLogger(__name__)
+
+# fits the pending table while the timer digits stay readable
+THUMBNAIL_SIZE = (320, 180)
+WEBP_QUALITY = 80
+
+
+def render(data):
+    """Return ``(thumbnail, webp, dhash)`` for one screenshot.
+
+    Runs in a worker process, so it only takes and returns plain values.
+    The perceptual hash comes along since the image is decoded anyway.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB")
+        dhash = phash.dhash(image)
+        webp = io.BytesIO()
+        image.save(webp, "WEBP", quality=WEBP_QUALITY, method=4)
+        image.thumbnail(THUMBNAIL_SIZE)
+        thumbnail = io.BytesIO()
+        image.save(thumbnail, "WEBP", quality=WEBP_QUALITY)
+    return thumbnail.getvalue(), webp.getvalue(), dhash
+
+
+def derivative_keys(key):
+    stem = key.rsplit(".", 1)[0]
+    return f"{stem}.thumb.webp", f"{stem}.webp"
+
+
+def store(url, thumbnail, webp, dhash):
+    """Save rendered derivatives beside the original; the caller commits.
+
+    Returns how many submissions got a new perceptual hash.
+    """
+    thumbnail_key, webp_key = derivative_keys(uploads.key_from_url(url))
+    thumbnail_path = uploads.write_stored(thumbnail_key, thumbnail, "image/webp")
+    webp_path = uploads.write_stored(webp_key, webp, "image/webp")
+    link(url, thumbnail_path, webp_path)
+    return phash.store_hash(url, dhash)
+
+
+def link(url, thumbnail_path, webp_path):
+    # every entry showing this screenshot shares its derivatives
+    Leaderboard.query.filter_by(screenshot_path=url).update(
+        {"thumbnail_path": thumbnail_path, "webp_path": webp_path}
+    )
+
+
+class Renderer:
+    """Makes screenshot derivatives and perceptual hashes in the background.
+
+    Decoding and re-encoding is CPU bound, so it happens in a process pool,
+    spawned rather than forked because the web workers are threaded. A few
+    threads fetch originals, wait on the pool and store the results.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.workers = app.config["IMAGE_WORKERS"]
+        self._processes = None
+        self._threads = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="screenshot-derivatives"
+        )
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    def processes(self):
+        with self._lock:
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._processes
+
+    def enqueue(self, url):
+        future = self._threads.submit(self._run, url)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._finished)
+
+    def _finished(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def drain(self):
+        """Block until every queued screenshot has been processed."""
+        while True:
+            with self._lock:
+                futures = list(self._futures)
+            if not futures:
+                return
+            for future in futures:
+                future.result()
+
+    def shutdown(self):
+        self.drain()
+        with self._lock:
+            if self._processes is not None:
+                self._processes.shutdown()
+                self._processes = None
+
+    def _run(self, url):
+        with self.app.app_context():
+            try:
+                if self.app.config["SCREENSHOT_DERIVATIVES"]:
+                    self._derive(url)
+                else:
+                    self._hash(url)
+                db.session.commit()
+            except Exception:
+                logger.exception("couldn't process screenshot %s", url)
+
+    def _derive(self, url):
+        made = (
+            db.session.query(Leaderboard.thumbnail_path, Leaderboard.webp_path)
+            .filter(
+                Leaderboard.screenshot_path == url,
+                Leaderboard.thumbnail_path.isnot(None),
+            )
+            .first()
+        )
+        if made is None:
+            data = uploads.read_stored(url)
+            store(url, *self.processes().submit(render, data).result())
+            return
+        # a duplicate of a screenshot that was rendered already
+        link(url, *made)
+        dhash = phash.known_hash(url)
+        if dhash is not None:
+            phash.store_hash(url, dhash)
+
+    def _hash(self, url):
+        # no derivatives wanted, only the perceptual hash
+        dhash = phash.known_hash(url)
+        if dhash is None:
+            data = uploads.read_stored(url)
+            dhash = self.processes().submit(phash.hash_bytes, data).result()
+        phash.store_hash(url, dhash)
+
+
+def init_app(app):
+    app.extensions["derivatives"] = Renderer(app)
+
+
+def renderer():
+    return current_app.extensions["derivatives"]
+
+
+def enqueue(url):
+    """Queue derivatives and the hash for a screenshot now in storage.
+
+    With SCREENSHOT_DERIVATIVES off the screenshot is still hashed, unless
+    SCREENSHOT_HASHES is off too.
+    """
+    config = current_app.config
+    if config["SCREENSHOT_DERIVATIVES"] or config["SCREENSHOT_HASHES"]:
+        renderer().enqueue(url)
+
+
+def backfill(batch_size=20):
+    """Render derivatives for every stored screenshot that has none.
+
+    Walks the distinct screenshots in batches, fanning each batch out over
+    the process pool. Returns ``(made, failed)`` counts.
+    """
+    pool = renderer().processes()
+    made = failed = 0
+    after = ""
+    while True:
+        batch = db.session.scalars(
+            select(Leaderboard.screenshot_path)
+            .distinct()
+            .where(
+                Leaderboard.thumbnail_path.is_(None),
+                Leaderboard.upload_status == "done",
+                Leaderboard.screenshot_path > after,
+            )
+            .order_by(Leaderboard.screenshot_path)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return made, failed
+        after = batch[-1]
+
+        rendering = []
+        hashed = False
+        for url in batch:
+            try:
+                data = uploads.read_stored(url)
+            except Exception:
+                logger.warning("couldn't read %s", url, exc_info=True)
+                failed += 1
+                continue
+            rendering.append((url, pool.submit(render, data)))
+
+        for url, future in rendering:
+            try:
+                rendered = future.result()
+            except Exception:
+                logger.warning("couldn't render %s", url, exc_info=True)
+                failed += 1
+                continue
+            if store(url, *rendered):
+                hashed = True
+            made += 1
+        if hashed:
+            # old screenshots, below what the cached hash trees top up from
+            bump_version(phash.PHASH_KEY)
+        db.session.commit()
@@ -0,0 +1,87 @@
+from collections import namedtuple
+
+import numpy as np
+from sqlalchemy import select
+
+from . import db
+from .cache import TTLCache
+from .models import Leaderboard
+from .standings import track_version
+
+# a track's verified times as one sorted int32 array, plus the summary
+# every viewer shares; keyed by (track, track version)
+snapshot_cache = TTLCache("distributions", maxsize=128, ttl=600)
+
+PERCENTILES = (1, 10, 25, 50, 75, 90, 99)
+HISTOGRAM_BINS = 20
+
+Snapshot = namedtuple("Snapshot", "times summary")
+
+
+def load_times(track):
+    """Every verified time on ``track``, fastest first, as a NumPy array.
+
+    Reads the one column straight off the (track, verified, total_ms)
+    index, already in order, without building ORM objects.
+    """
+    rows = db.session.scalars(
+        select(Leaderboard.total_ms)
+        .where(Leaderboard.track == track, Leaderboard.verified.is_(True))
+        .order_by(Leaderboard.total_ms)
+    )
+    return np.fromiter(rows, dtype=np.int32)
+
+
+def summarize(times):
+    if not len(times):
+        return {"count": 0}
+    cuts = np.percentile(times, PERCENTILES)
+    # the slowest 1% would stretch every bin, they get a bucket of their own
+    edges = np.linspace(times[0], max(cuts[-1], times[0] + 1), HISTOGRAM_BINS + 1)
+    counts, _ = np.histogram(times, bins=edges)
+    return {
+        "count": len(times),
+        "best_ms": int(times[0]),
+        "median_ms": int(round(cuts[PERCENTILES.index(50)])),
+        "percentiles": {
+            f"p{p}": int(round(cut)) for p, cut in zip(PERCENTILES, cuts)
+        },
+        "histogram": {
+            "edges_ms": [int(round(edge)) for edge in edges],
+            "counts": counts.tolist(),
+            "slower": int(len(times) - np.searchsorted(times, edges[-1], "right")),
+        },
+    }
+
+
+def snapshot(track, version=None):
+    if version is None:
+        version = track_version(track)
+
+    def build():
+        times = load_times(track)
+        return Snapshot(times, summarize(times))
+
+    return snapshot_cache.get_or_load((track, version), build)
+
+
+def percentile_of(times, total_ms):
+    """Share of verified times, in percent, no faster than ``total_ms``.
+
+    The record holder is at 100; a binary search, so any time can be asked
+    about without touching the database.
+    """
+    if not len(times):
+        return None
+    faster = np.searchsorted(times, total_ms, side="left")
+    return round(100 * (len(times) - int(faster)) / len(times), 2)
+
+
+def verified_time(track, user_id):
+    return db.session.scalar(
+        select(Leaderboard.total_ms).where(
+            Leaderboard.track == track,
+            Leaderboard.user_id == user_id,
+            Leaderboard.verified.is_(True),
+        )
+    )
@@ -0,0 +1,189 @@
+import json
+import logging
+import queue
+import select
+import threading
+import time
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import text
+
+from . import db
+from .standings import standing_json
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "leaderboard_events"
+
+
+class LocalBroker:
+    """Fans track events out to the SSE subscribers of this process.
+
+    Good enough on its own for the dev server; with several gunicorn workers
+    use ``PostgresBroker`` so an event published by one worker reaches the
+    subscribers of all of them.
+    """
+
+    def __init__(self, max_subscribers=100, queue_size=100):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, track):
+        """Return a queue of events for ``track``, or None if at capacity."""
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            events = queue.Queue(self.queue_size)
+            self._subscribers[track].add(events)
+            self._count += 1
+            return events
+
+    def unsubscribe(self, track, events):
+        with self._lock:
+            subscribers = self._subscribers.get(track)
+            if subscribers and events in subscribers:
+                subscribers.remove(events)
+                self._count -= 1
+                if not subscribers:
+                    del self._subscribers[track]
+
+    def subscriber_count(self):
+        return self._count
+
+    def publish(self, track, event):
+        self.deliver(track, event)
+
+    def deliver(self, track, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(track, ()))
+        for events in subscribers:
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                # a client this far behind can't apply diffs any more
+                with events.mutex:
+                    events.queue.clear()
+                events.put_nowait({"type": "resync"})
+
+
+class PostgresBroker(LocalBroker):
+    """Cross-worker fan-out over Postgres LISTEN/NOTIFY.
+
+    ``publish`` sends a NOTIFY; each worker runs one listener thread (started
+    on its first subscriber) that hands notifications to its local queues.
+    """
+
+    def __init__(self, engine, **kwargs):
+        super().__init__(**kwargs)
+        self.engine = engine
+        self._listener = None
+
+    def subscribe(self, track):
+        self._start_listener()
+        return super().subscribe(track)
+
+    def publish(self, track, event):
+        payload = json.dumps({"track": track, "event": event})
+        db.session.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": CHANNEL, "payload": payload},
+        )
+        db.session.commit()
+
+    def _start_listener(self):
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(
+                target=self._listen, name="leaderboard-events", daemon=True
+            )
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                self._listen_once()
+            except Exception:
+                logger.exception("event listener lost its connection")
+                time.sleep(5)
+
+    def _listen_once(self):
+        # a dedicated connection, taken out of the pool for good
+        raw = self.engine.raw_connection()
+        raw.detach()
+        conn = raw.driver_connection
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            while True:
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    message = json.loads(notify.payload)
+                    self.deliver(message["track"], message["event"])
+        finally:
+            conn.close()
+
+
+def init_app(app):
+    max_subscribers = app.config["SSE_MAX_SUBSCRIBERS"]
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name == "postgresql":
+        broker = PostgresBroker(engine, max_subscribers=max_subscribers)
+    else:
+        broker = LocalBroker(max_subscribers=max_subscribers)
+    app.extensions["events"] = broker
+
+
+def broker():
+    return current_app.extensions["events"]
+
+
+def publish(track, event):
+    """Push ``event`` to everyone watching ``track``; call after committing."""
+    broker().publish(track, event)
+
+
+def entry_added(standing, rank):
+    """Diff for an entry that joined the standings at zero-based ``rank``.
+
+    ``shift`` tells clients that every rank from ``from`` down moves by
+    ``by``, so they can patch their copy without refetching it.
+    """
+    return {
+        "type": "added",
+        "entry": standing_json(standing, rank + 1),
+        "shift": {"from": rank + 1, "by": 1},
+    }
+
+
+def entry_removed(standing, rank):
+    return {
+        "type": "removed",
+        "id": standing.id,
+        "shift": {"from": rank + 2, "by": -1},
+    }
+
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def stream(events, heartbeat):
+    """SSE body for one subscriber's queue of events."""
+    yield "retry: 5000\n\n"
+    while True:
+        try:
+            event = events.get(timeout=heartbeat)
+        except queue.Empty:
+            yield ": heartbeat\n\n"
+            continue
+        yield format_sse(event)
@@ -0,0 +1,80 @@
+import csv
+import io
+import json
+
+from . import db
+from .models import Leaderboard, User
+from .tracks import CUPS, TRACKS
+
+EXPORT_FIELDS = ("id", "track", "player", "time_mins", "time_s", "time_ms",
+                 "total_ms", "screenshot_path")
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def export_tracks(track=None, cup=None):
+    """Tracks to export for the given filters, None meaning all of them."""
+    if track and track not in TRACKS:
+        raise ValueError(f"Unknown track: {track}")
+    if cup and cup not in CUPS:
+        raise ValueError(f"Unknown cup: {cup}")
+    if track and cup and track not in CUPS[cup]:
+        return []
+    if track:
+        return [track]
+    if cup:
+        return list(CUPS[cup])
+    return None
+
+
+def verified_rows(tracks=None, batch_size=1000):
+    """Yield every verified entry with its username, ``batch_size`` at a time.
+
+    ``yield_per`` makes psycopg2 use a server-side cursor, so only one batch
+    is ever held in memory.
+    """
+    query = (
+        db.session.query(
+            Leaderboard.id,
+            Leaderboard.track,
+            User.username,
+            Leaderboard.time_mins,
+            Leaderboard.time_s,
+            Leaderboard.time_ms,
+            Leaderboard.total_ms,
+            Leaderboard.screenshot_path,
+        )
+        .join(Leaderboard.user)
+        .filter(Leaderboard.verified.is_(True))
+        .order_by(Leaderboard.id)
+        .execution_options(yield_per=batch_size)
+    )
+    if tracks is not None:
+        query = query.filter(Leaderboard.track.in_(tracks))
+    for row in query:
+        yield dict(zip(EXPORT_FIELDS, row))
+
+
+def iter_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+def iter_export(fmt, tracks=None):
+    rows = verified_rows(tracks)
+    if fmt == "csv":
+        return iter_csv(rows)
+    if fmt == "ndjson":
+        return iter_ndjson(rows)
+    raise ValueError(f"Unknown format: {fmt}")
@@ -0,0 +1,69 @@
+from datetime import datetime, timezone
+
+from . import db, uploads
+from .models import Submission, User
+
+
+def record_submission(entry):
+    """Append the entry's new time to the history and point the entry at it.
+
+    A still-pending submission it replaces is marked superseded. The history
+    row holds its own reference to the screenshot, so the proof outlives the
+    entry moving on to a newer time.
+    """
+    previous = entry.submission
+    if previous is not None and previous.status == "pending":
+        previous.status = "superseded"
+    entry.submission = Submission(
+        user_id=entry.user_id,
+        track=entry.track,
+        time_mins=entry.time_mins,
+        time_s=entry.time_s,
+        time_ms=entry.time_ms,
+        total_ms=entry.total_ms,
+        screenshot_path=entry.screenshot_path,
+        status="pending",
+        submitted_at=datetime.now(timezone.utc),
+    )
+    uploads.acquire(entry.screenshot_path)
+
+
+def mark_verified(entry, was_record):
+    # rows seeded outside main.submit have no history
+    if entry.submission is None:
+        return
+    entry.submission.status = "verified"
+    entry.submission.verified_at = datetime.now(timezone.utc)
+    entry.submission.was_record = was_record
+
+
+def mark_rejected(entry):
+    if entry.submission is not None:
+        entry.submission.status = "rejected"
+
+
+def record_progression(track):
+    """Every verified time that set the record on ``track``, oldest first.
+
+    Reads only the record-setting rows through the partial index.
+    """
+    return (
+        db.session.query(Submission, User.username)
+        .join(User)
+        .filter(
+            Submission.track == track,
+            Submission.was_record.is_(True),
+            Submission.status == "verified",
+        )
+        .order_by(Submission.verified_at)
+        .all()
+    )
+
+
+def player_progression(user_id, track):
+    """Every time a player has submitted on ``track``, oldest first."""
+    return (
+        Submission.query.filter_by(user_id=user_id, track=track)
+        .order_by(Submission.submitted_at)
+        .all()
+    )
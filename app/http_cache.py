@@ -0,0 +1,42 @@
+from flask import current_app, request, session
+from werkzeug.wrappers import Response
+
+
+def make_etag(*parts):
+    return "-".join(str(part) for part in parts)
+
+
+def not_modified(etag, last_modified, private=False):
+    """Return a 304 response if the client's copy is still current, else None.
+
+    Checked before any ranking query runs, so a revalidation only costs the
+    version lookup. Requests with pending flash messages always get a full
+    page, otherwise the message would never be shown.
+    """
+    if "_flashes" in session:
+        return None
+    if request.if_none_match:
+        matched = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified is not None:
+        matched = last_modified.replace(microsecond=0) <= request.if_modified_since
+    else:
+        matched = False
+    if not matched:
+        return None
+    response = Response(status=304)
+    return add_cache_headers(response, etag, last_modified, private)
+
+
+def add_cache_headers(response, etag, last_modified, private=False):
+    response.set_etag(etag, weak=private)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    if private:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    else:
+        # shared caches (nginx) may keep anonymous copies for a short while
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config["PUBLIC_MAX_AGE"]
+    response.vary.add("Cookie")
+    return response
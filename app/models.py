@@ -1,13 +1,9 @@
-from . import db, login_manager
+from . import db
 from flask_login import UserMixin
 from flask_bcrypt import Bcrypt
 
 bcrypt = Bcrypt()
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
-
 # user model
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -28,10 +24,137 @@ class Leaderboard(db.Model):
     time_mins = db.Column(db.Integer, nullable=False)
     time_s = db.Column(db.Integer, nullable=False)
     time_ms = db.Column(db.Integer, nullable=False)
+    # whole time in milliseconds, what the standings are ordered by
+    total_ms = db.Column(db.Integer, nullable=False)
 
     #link to a user
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
-    user = db.relationship("User", backref=db.backref("scores", lazy="dynamic"))
+    user = db.relationship(
+        "User",
+        foreign_keys=[user_id],
+        backref=db.backref("scores", lazy="dynamic"),
+    )
 
     screenshot_path = db.Column(db.String(255), nullable=False)
     verified = db.Column(db.Boolean, default=False)
+    # uploading while the proof is still on its way to s3, then done or failed
+    upload_status = db.Column(
+        db.String(20), nullable=False, default="done", server_default="done"
+    )
+    # resized and compressed copies stored beside the original, once made
+    thumbnail_path = db.Column(db.String(255))
+    webp_path = db.Column(db.String(255))
+
+    # the history row this entry currently shows
+    submission_id = db.Column(db.Integer, db.ForeignKey("submission.id"))
+    submission = db.relationship("Submission")
+
+    # the admin a pending entry is leased to for moderation, and until when
+    claimed_by = db.Column(db.Integer, db.ForeignKey("user.id"))
+    claimed_until = db.Column(db.DateTime(timezone=True))
+    claimant = db.relationship("User", foreign_keys=[claimed_by])
+
+    # how unlikely the time looked against its track when submitted, as
+    # standard deviations faster than typical; None until the track has data
+    suspicion = db.Column(db.Float)
+
+    __table_args__ = (
+        db.Index(
+            "ix_leaderboard_track_verified_total_ms", "track", "verified", "total_ms"
+        ),
+        # the moderation queue, oldest first
+        db.Index(
+            "ix_leaderboard_pending", "id",
+            postgresql_where=db.text("NOT verified"),
+            sqlite_where=db.text("NOT verified"),
+        ),
+    )
+
+    def set_time(self, time_mins, time_s, time_ms):
+        self.time_mins = time_mins
+        self.time_s = time_s
+        self.time_ms = time_ms
+        self.total_ms = (time_mins * 60 + time_s) * 1000 + time_ms
+
+# append-only history of every submitted time; rows are never deleted, only
+# their moderation status moves on
+class Submission(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    track = db.Column(db.String(100), nullable=False)
+    time_mins = db.Column(db.Integer, nullable=False)
+    time_s = db.Column(db.Integer, nullable=False)
+    time_ms = db.Column(db.Integer, nullable=False)
+    total_ms = db.Column(db.Integer, nullable=False)
+    screenshot_path = db.Column(db.String(255), nullable=False)
+    # pending, verified, rejected, or superseded by a newer submission
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    submitted_at = db.Column(db.DateTime(timezone=True), nullable=False)
+    verified_at = db.Column(db.DateTime(timezone=True))
+    # set at verification when this time became the track record
+    was_record = db.Column(db.Boolean, nullable=False, default=False)
+    # perceptual hash of the screenshot (64-bit dHash as hex), once computed
+    dhash = db.Column(db.String(16))
+
+    user = db.relationship("User")
+
+    __table_args__ = (
+        db.Index(
+            "ix_submission_user_track_submitted", "user_id", "track", "submitted_at"
+        ),
+        # only record-setting rows, so progression reads stay tiny
+        db.Index(
+            "ix_submission_track_record", "track", "verified_at",
+            postgresql_where=db.text("was_record"),
+            sqlite_where=db.text("was_record"),
+        ),
+    )
+
+# per-key version counters, bumped in the same transaction as the write they
+# describe so every worker can tell when its cached copy is out of date
+class CacheVersion(db.Model):
+    key = db.Column(db.String(150), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+# materialized cup standings: a player's summed time over a cup's four
+# tracks, only for players with a verified time on all of them
+class CupStanding(db.Model):
+    cup = db.Column(db.String(50), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    total_ms = db.Column(db.Integer, nullable=False)
+
+    user = db.relationship("User")
+
+    __table_args__ = (
+        db.Index("ix_cup_standing_cup_total_ms", "cup", "total_ms"),
+    )
+
+# points currently awarded for a placement on one track
+class TrackPoints(db.Model):
+    track = db.Column(db.String(100), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    points = db.Column(db.Integer, nullable=False)
+
+# a player's points summed over every track, the global ranking
+class PlayerPoints(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    points = db.Column(db.Integer, nullable=False, index=True)
+
+    user = db.relationship("User")
+
+# a content-addressed screenshot in storage and how many entries and history
+# rows point at it; the object is deleted once the count drops to zero
+class ScreenshotObject(db.Model):
+    key = db.Column(db.String(255), primary_key=True)
+    refs = db.Column(db.Integer, nullable=False)
+
+# running sums over a track's verified times, in log milliseconds, so a new
+# time can be scored against the distribution without reading it
+class TrackStats(db.Model):
+    track = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+    sum_log = db.Column(db.Float, nullable=False)
+    sum_log_sq = db.Column(db.Float, nullable=False)
+    # the current record, None once the track has no verified times
+    best_ms = db.Column(db.Integer)
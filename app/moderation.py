@@ -0,0 +1,285 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.orm import joinedload
+
+from . import cups, db, points, rank_index, screening, uploads
+from .models import Leaderboard, Submission
+from .standings import standings_page, touch_records, touch_track, touch_user
+
+
+def pending_page(after=None, limit=50):
+    """A page of the moderation queue, oldest first, with users loaded.
+
+    Keyset-paginated on id: pass the last id of the previous page as
+    ``after``. Returns ``(entries, next_after)``; ``next_after`` is None on
+    the last page.
+    """
+    query = (
+        Leaderboard.query.options(
+            joinedload(Leaderboard.user),
+            joinedload(Leaderboard.submission),
+            joinedload(Leaderboard.claimant),
+        )
+        .filter(Leaderboard.verified.is_(False))
+        .order_by(Leaderboard.id)
+    )
+    if after is not None:
+        query = query.filter(Leaderboard.id > after)
+    entries = query.limit(limit + 1).all()
+    if len(entries) > limit:
+        return entries[:limit], entries[limit - 1].id
+    return entries, None
+
+
+# the most suspicious times are handed out first, then oldest first
+riskiest_first = (Leaderboard.suspicion.desc().nulls_last(), Leaderboard.id)
+
+
+def held_by(user_id, now):
+    """Entries whose lease ``user_id`` holds at ``now``."""
+    return and_(Leaderboard.claimed_by == user_id, Leaderboard.claimed_until > now)
+
+
+def unclaimed(now):
+    return or_(Leaderboard.claimed_until.is_(None), Leaderboard.claimed_until <= now)
+
+
+def lease_holder(entry, now):
+    """The admin holding ``entry``'s lease at ``now``, if anyone."""
+    until = entry.claimed_until
+    if until is None:
+        return None
+    if until.tzinfo is None:
+        # sqlite hands back naive datetimes, they were stored as UTC
+        until = until.replace(tzinfo=timezone.utc)
+    return entry.claimant if until > now else None
+
+
+def claimable(now, limit):
+    """Ids of the next ``limit`` pending entries free at ``now``, locked."""
+    return (
+        select(Leaderboard.id)
+        .where(Leaderboard.verified.is_(False), unclaimed(now))
+        .order_by(*riskiest_first)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+
+
+def claim(user_id, limit):
+    """Lease pending entries to ``user_id`` until they hold ``limit`` of them.
+
+    Leases they already hold are renewed. The rest are the riskiest pending
+    entries nobody holds: on Postgres the subquery picks them with
+    ``FOR UPDATE SKIP LOCKED``, so admins claiming at once each get
+    different rows without waiting on each other. SQLite has no row locks
+    and drops that clause, but it runs one writer at a time, so the single
+    conditional UPDATE is just as exclusive there.
+    """
+    now = datetime.now(timezone.utc)
+    until = now + timedelta(seconds=current_app.config["CLAIM_LEASE_SECONDS"])
+    held = db.session.execute(
+        update(Leaderboard)
+        .where(held_by(user_id, now))
+        .values(claimed_until=until),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    if held < limit:
+        db.session.execute(
+            update(Leaderboard)
+            .where(Leaderboard.id.in_(claimable(now, limit - held)), unclaimed(now))
+            .values(claimed_by=user_id, claimed_until=until),
+            execution_options={"synchronize_session": False},
+        )
+    db.session.commit()
+    return my_claims(user_id)
+
+
+def my_claims(user_id):
+    """The pending entries leased to ``user_id``, riskiest first."""
+    return (
+        Leaderboard.query.options(
+            joinedload(Leaderboard.user), joinedload(Leaderboard.submission)
+        )
+        .filter(
+            Leaderboard.verified.is_(False),
+            held_by(user_id, datetime.now(timezone.utc)),
+        )
+        .order_by(*riskiest_first)
+        .all()
+    )
+
+
+def release_claims(user_id):
+    """Hand every entry ``user_id`` holds back to the queue."""
+    released = db.session.execute(
+        update(Leaderboard)
+        .where(Leaderboard.claimed_by == user_id, Leaderboard.verified.is_(False))
+        .values(claimed_by=None, claimed_until=None),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    db.session.commit()
+    return released
+
+
+def holds_lease(entry_id, user_id):
+    """Whether ``user_id`` holds the lease on an entry, locking it if so."""
+    held = db.session.scalar(
+        select(Leaderboard.id)
+        .where(Leaderboard.id == entry_id, held_by(user_id, datetime.now(timezone.utc)))
+        .with_for_update()
+    )
+    return held is not None
+
+
+def by_track(entries):
+    """Entries grouped by track, tracks sorted.
+
+    Writers go through tracks in this order, so concurrent writes take the
+    per-track version rows in the same order (see ``standings``).
+    """
+    tracks = defaultdict(list)
+    for entry in entries:
+        tracks[entry.track].append(entry)
+    return dict(sorted(tracks.items()))
+
+
+def verify_entries(ids, user_id):
+    """Verify the selected pending entries in one transaction.
+
+    One UPDATE flips them all; standings, cups and points are then
+    refreshed once per affected track. Only entries leased to ``user_id``
+    are verified; ones whose screenshot is still uploading are skipped.
+    Returns ``(verified, tracks)``.
+    """
+    entries = (
+        Leaderboard.query.filter(
+            Leaderboard.id.in_(ids),
+            Leaderboard.verified.is_(False),
+            Leaderboard.upload_status == "done",
+            held_by(user_id, datetime.now(timezone.utc)),
+        )
+        .order_by(Leaderboard.id)
+        .with_for_update()
+        .all()
+    )
+    if not entries:
+        return [], []
+    tracks = by_track(entries)
+
+    # of a batch, only the fastest time can have set a new record
+    records = []
+    record_changed = False
+    versions = {}
+    for track, group in tracks.items():
+        fastest = min(group, key=lambda e: (e.total_ms, e.id))
+        best = standings_page(track, limit=1)
+        record = not best or (fastest.total_ms, fastest.id) <= (
+            best[0].total_ms, best[0].id
+        )
+        record_changed |= record
+        if record and fastest.submission_id is not None:
+            records.append(fastest.submission_id)
+        versions[track] = touch_track(track)
+    # after every track, like a single write's touch_track(record_changed=...)
+    if record_changed:
+        touch_records()
+    for player_id in sorted({e.user_id for e in entries}):
+        touch_user(player_id)
+
+    verified_ids = [e.id for e in entries]
+    db.session.execute(
+        update(Leaderboard)
+        .where(Leaderboard.id.in_(verified_ids))
+        .values(verified=True, claimed_by=None, claimed_until=None)
+    )
+    submission_ids = [e.submission_id for e in entries if e.submission_id]
+    if submission_ids:
+        db.session.execute(
+            update(Submission)
+            .where(Submission.id.in_(submission_ids))
+            .values(
+                status="verified",
+                verified_at=datetime.now(timezone.utc),
+                was_record=Submission.id.in_(records),
+            )
+        )
+
+    for track, group in tracks.items():
+        cups.refresh_players(track, [e.user_id for e in group])
+        points.recompute_track(track)
+        screening.adjust(track, added=[e.total_ms for e in group])
+    ranked = {track: rank_index.standings(group) for track, group in tracks.items()}
+    db.session.commit()
+    for track, added in ranked.items():
+        rank_index.update(track, versions[track], added=added)
+    return entries, list(tracks)
+
+
+def reject_entries(ids, user_id):
+    """Reject and delete the selected entries in one transaction.
+
+    One DELETE removes them all; tracks that lose a verified time are
+    refreshed once each. Pending entries are only rejected if ``user_id``
+    holds their lease. Screenshots nothing references any more are
+    deleted after commit. Returns ``(rejected, tracks that changed)``.
+    """
+    entries = (
+        Leaderboard.query.filter(
+            Leaderboard.id.in_(ids),
+            or_(
+                Leaderboard.verified.is_(True),
+                held_by(user_id, datetime.now(timezone.utc)),
+            ),
+        )
+        .order_by(Leaderboard.id)
+        .with_for_update()
+        .all()
+    )
+    if not entries:
+        return [], []
+    verified = by_track(e for e in entries if e.verified)
+
+    record_changed = False
+    versions = {}
+    for track, group in verified.items():
+        best = standings_page(track, limit=1)
+        record_changed |= bool(best) and best[0].id in {e.id for e in group}
+        versions[track] = touch_track(track)
+    if record_changed:
+        touch_records()
+    for player_id in sorted({e.user_id for e in entries}):
+        touch_user(player_id)
+
+    submission_ids = [e.submission_id for e in entries if e.submission_id]
+    if submission_ids:
+        db.session.execute(
+            update(Submission)
+            .where(Submission.id.in_(submission_ids))
+            .values(status="rejected")
+        )
+    released = [
+        url
+        for url, count in Counter(e.screenshot_path for e in entries).items()
+        if uploads.release(url, count)
+    ]
+    db.session.execute(
+        delete(Leaderboard).where(Leaderboard.id.in_([e.id for e in entries]))
+    )
+
+    for track, group in verified.items():
+        cups.refresh_players(track, [e.user_id for e in group])
+        points.recompute_track(track)
+        screening.adjust(track, removed=[e.total_ms for e in group])
+    unranked = {
+        track: [(e.total_ms, e.id) for e in group] for track, group in verified.items()
+    }
+    db.session.commit()
+    for track, removed in unranked.items():
+        rank_index.update(track, versions[track], removed=removed)
+    for url in released:
+        uploads.discard(url)
+    return entries, list(verified)
@@ -0,0 +1,251 @@
+import io
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from PIL import Image
+from sqlalchemy import func, select, update
+
+from . import db, derivatives, uploads
+from .cache import TTLCache, bump_version, get_version
+from .models import Submission, User
+
+logger = logging.getLogger(__name__)
+
+PHASH_KEY = "phash"
+
+# built per process, topped up as screenshots are hashed, and rebuilt when
+# the backfill bumps the version
+index_cache = TTLCache("phash", maxsize=2, ttl=3600)
+
+# how long after submitting a screenshot may still be waiting for its hash
+HASH_WINDOW = timedelta(days=1)
+
+
+def dhash(image, size=8):
+    """64-bit difference hash: does each pixel get brighter to the right?
+
+    Survives rescaling, recompression and small crops, so the same
+    screenshot re-saved still lands within a few bits of the original.
+    """
+    small = image.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            bits = (bits << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return f"{bits:016x}"
+
+
+def hash_bytes(data):
+    # runs in a worker process
+    with Image.open(io.BytesIO(data)) as image:
+        return dhash(image)
+
+
+def distance(a, b):
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance.
+
+    Each child hangs off its parent by distance, so a search within ``k``
+    bits only descends into children whose edge is within ``k`` of the
+    query's own distance, skipping most of the tree.
+    """
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, item):
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            d = distance(value, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, max_distance):
+        """``(distance, item)`` for everything within ``max_distance`` bits."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = distance(value, node[0])
+            if d <= max_distance:
+                found.extend((d, item) for item in node[1])
+            for edge, child in node[2].items():
+                if d - max_distance <= edge <= d + max_distance:
+                    stack.append(child)
+        return sorted(found, key=lambda match: match[0])
+
+
+class HashIndex:
+    """Every stored hash in a BK-tree, topped up with new ones as they land.
+
+    Hashes are added to submissions shortly after they're made, so the
+    tree remembers ``watermark``, the id below which nothing can still
+    gain a hash: either it has one, it was too long ago, or it is older
+    than the oldest submission still waiting on the derivatives pipeline.
+    Topping up only reads rows above it. Anything hashed further back
+    (the backfill) bumps the version, and the tree is rebuilt.
+    """
+
+    def __init__(self):
+        self.tree = BKTree()
+        self.watermark = 0
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        with self.lock:
+            cutoff = datetime.now(timezone.utc) - HASH_WINDOW
+            waiting = db.session.scalar(
+                select(func.min(Submission.id)).where(
+                    Submission.id > self.watermark,
+                    Submission.dhash.is_(None),
+                    Submission.submitted_at >= cutoff,
+                )
+            )
+            if waiting is not None:
+                watermark = waiting - 1
+            else:
+                latest = db.session.scalar(select(func.max(Submission.id)))
+                watermark = max(latest or 0, self.watermark)
+            # read after the watermark, so a hash landing in between is seen
+            rows = db.session.execute(
+                select(Submission.id, Submission.dhash).where(
+                    Submission.id > self.watermark, Submission.dhash.isnot(None)
+                )
+            )
+            for submission_id, value in rows:
+                if submission_id not in self.seen:
+                    self.tree.add(int(value, 16), submission_id)
+                    self.seen.add(submission_id)
+            self.watermark = watermark
+            self.seen = {i for i in self.seen if i > watermark}
+        return self.tree
+
+
+def cached_index(version=None):
+    if version is None:
+        version = get_version(PHASH_KEY)
+    return index_cache.get_or_load(version, HashIndex).refresh()
+
+
+def store_hash(url, value):
+    """Record the hash of the screenshot at ``url``; the caller commits.
+
+    Returns how many submissions got it. New submissions are picked up
+    by the cached trees on their own; only the backfill, which hashes
+    old rows, needs to bump the version.
+    """
+    return db.session.execute(
+        update(Submission)
+        .where(Submission.screenshot_path == url, Submission.dhash.is_(None))
+        .values(dhash=value)
+    ).rowcount
+
+
+def known_hash(url):
+    return db.session.scalars(
+        select(Submission.dhash)
+        .where(Submission.screenshot_path == url, Submission.dhash.isnot(None))
+        .limit(1)
+    ).first()
+
+
+def backfill(batch_size=50):
+    """Hash every screenshot in the history that has no hash yet.
+
+    Distinct screenshots are read a batch at a time and hashed in parallel
+    on the derivatives process pool. Returns ``(hashed, failed)``.
+    """
+    pool = derivatives.renderer().processes()
+    hashed = failed = 0
+    after = ""
+    while True:
+        batch = db.session.scalars(
+            select(Submission.screenshot_path)
+            .distinct()
+            .where(Submission.dhash.is_(None), Submission.screenshot_path > after)
+            .order_by(Submission.screenshot_path)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return hashed, failed
+        after = batch[-1]
+
+        hashing = []
+        changed = False
+        for url in batch:
+            try:
+                data = uploads.read_stored(url)
+            except Exception:
+                # superseded screenshots may have been deleted already
+                logger.info("couldn't read %s", url, exc_info=True)
+                failed += 1
+                continue
+            hashing.append((url, pool.submit(hash_bytes, data)))
+
+        for url, future in hashing:
+            try:
+                value = future.result()
+            except Exception:
+                logger.warning("couldn't hash %s", url, exc_info=True)
+                failed += 1
+                continue
+            if store_hash(url, value):
+                changed = True
+            hashed += 1
+        if changed:
+            bump_version(PHASH_KEY)
+        db.session.commit()
+
+
+def similar(submissions, limit=5):
+    """Other submissions whose screenshot looks like each of ``submissions``.
+
+    Returns ``{submission id: [(bits apart, Submission, username), ...]}``,
+    closest first, loading every match in one query.
+    """
+    tree = cached_index()
+    max_distance = current_app.config["PHASH_MAX_DISTANCE"]
+    found = {}
+    for submission in submissions:
+        if submission is None or submission.dhash is None:
+            continue
+        matches = [
+            (d, match_id)
+            for d, match_id in tree.search(int(submission.dhash, 16), max_distance)
+            if match_id != submission.id
+        ][:limit]
+        if matches:
+            found[submission.id] = matches
+
+    ids = {match_id for matches in found.values() for _, match_id in matches}
+    if not ids:
+        return {}
+    loaded = {
+        s.id: (s, username)
+        for s, username in db.session.query(Submission, User.username)
+        .join(User)
+        .filter(Submission.id.in_(ids))
+    }
+    result = defaultdict(list)
+    for submission_id, matches in found.items():
+        for d, match_id in matches:
+            result[submission_id].append((d, *loaded[match_id]))
+    return result
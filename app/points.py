@@ -0,0 +1,138 @@
+from collections import Counter
+
+from sqlalchemy import delete, func, insert, select
+
+from . import db
+from .models import Leaderboard, PlayerPoints, TrackPoints, User
+from .sql import upsert
+
+# race points for 1st to 12th, anything lower scores nothing
+PLACEMENT_POINTS = (15, 12, 10, 9, 8, 7, 6, 5, 4, 3, 2, 1)
+
+
+def placement_points(track):
+    """{user_id: points} for the current top placements on ``track``."""
+    top = (
+        db.session.query(Leaderboard.user_id)
+        .filter(Leaderboard.track == track, Leaderboard.verified.is_(True))
+        .order_by(Leaderboard.total_ms, Leaderboard.id)
+        .limit(len(PLACEMENT_POINTS))
+    )
+    return {user_id: points for (user_id,), points in zip(top, PLACEMENT_POINTS)}
+
+
+def recompute_track(track):
+    """Re-award ``track``'s points and apply only what changed.
+
+    Only the scoring placements of this one track are read; each player
+    whose award moved gets the difference added to their total. Call after
+    the write is flushed and before committing. Returns the deltas.
+    """
+    awarded = placement_points(track)
+    previous = dict(
+        db.session.query(TrackPoints.user_id, TrackPoints.points).filter_by(
+            track=track
+        )
+    )
+    deltas = {
+        user_id: awarded.get(user_id, 0) - previous.get(user_id, 0)
+        for user_id in awarded.keys() | previous.keys()
+    }
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return deltas
+
+    # in id order, so concurrent recomputes lock PlayerPoints rows alike
+    for user_id in sorted(deltas):
+        if user_id in awarded:
+            db.session.execute(upsert(
+                TrackPoints,
+                {"track": track, "user_id": user_id, "points": awarded[user_id]},
+                keys=[TrackPoints.track, TrackPoints.user_id],
+                update={"points": awarded[user_id]},
+            ))
+        else:
+            db.session.execute(delete(TrackPoints).where(
+                TrackPoints.track == track, TrackPoints.user_id == user_id
+            ))
+        db.session.execute(upsert(
+            PlayerPoints,
+            {"user_id": user_id, "points": deltas[user_id]},
+            keys=[PlayerPoints.user_id],
+            update={"points": PlayerPoints.points + deltas[user_id]},
+        ))
+    db.session.execute(delete(PlayerPoints).where(
+        PlayerPoints.user_id.in_(deltas), PlayerPoints.points == 0
+    ))
+    return deltas
+
+
+def full_awards():
+    """Every track's awards from scratch, as {(track, user_id): points}.
+
+    One window query keeps the scoring placements of every track.
+    """
+    position = func.row_number().over(
+        partition_by=Leaderboard.track,
+        order_by=(Leaderboard.total_ms, Leaderboard.id),
+    ).label("position")
+    ranked = (
+        select(Leaderboard.track, Leaderboard.user_id, position)
+        .where(Leaderboard.verified.is_(True))
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(ranked).where(ranked.c.position <= len(PLACEMENT_POINTS))
+    )
+    return {
+        (track, user_id): PLACEMENT_POINTS[position - 1]
+        for track, user_id, position in rows
+    }
+
+
+def totals(awards):
+    points = Counter()
+    for (_, user_id), awarded in awards.items():
+        points[user_id] += awarded
+    return points
+
+
+def rebuild():
+    """Replace the persisted points with a full recomputation."""
+    awards = full_awards()
+    db.session.execute(delete(TrackPoints))
+    db.session.execute(delete(PlayerPoints))
+    if awards:
+        db.session.execute(insert(TrackPoints), [
+            {"track": track, "user_id": user_id, "points": points}
+            for (track, user_id), points in awards.items()
+        ])
+        db.session.execute(insert(PlayerPoints), [
+            {"user_id": user_id, "points": points}
+            for user_id, points in totals(awards).items()
+        ])
+    return len(awards)
+
+
+def check():
+    """Compare persisted totals with a full recomputation.
+
+    Returns {user_id: (persisted, expected)} for every player that differs.
+    """
+    expected = totals(full_awards())
+    persisted = dict(db.session.query(PlayerPoints.user_id, PlayerPoints.points))
+    return {
+        user_id: (persisted.get(user_id, 0), expected.get(user_id, 0))
+        for user_id in persisted.keys() | expected.keys()
+        if persisted.get(user_id, 0) != expected.get(user_id, 0)
+    }
+
+
+def global_standings(limit=50):
+    return (
+        db.session.query(PlayerPoints.user_id, User.username, PlayerPoints.points)
+        .join(User)
+        .order_by(PlayerPoints.points.desc(), PlayerPoints.user_id)
+        .limit(limit)
+        .all()
+    )
@@ -0,0 +1,187 @@
+import threading
+from bisect import bisect_left, bisect_right
+
+from flask import current_app
+from sqlalchemy import select
+
+from . import db
+from .models import Leaderboard, User
+from .standings import Standing, standings_page, to_standing, track_version
+from .standings import user_standing as counted_standing
+
+# loaded per process and patched in place by this process's own writes; a
+# version mismatch with the database means another worker wrote, and the
+# track is read again on next use
+_indexes = {}
+_loading = {}
+_lock = threading.Lock()
+_counters = {"loads": 0, "updates": 0, "dropped": 0}
+
+
+class RankIndex:
+    """One track's verified standings as a sorted array.
+
+    ``keys`` holds ``(total_ms, id)`` in rank order beside the matching
+    ``Standing`` rows, so a rank is a binary search and a page is a slice.
+    Inserting shifts the tail of the arrays, which stays cheap next to the
+    request that caused it.
+    """
+
+    def __init__(self, version, standings):
+        self.version = version
+        self.standings = list(standings)
+        self.keys = [(s.total_ms, s.id) for s in self.standings]
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def rank(self, total_ms, entry_id):
+        """Zero-based rank of the entry at ``(total_ms, entry_id)``."""
+        with self.lock:
+            return bisect_left(self.keys, (total_ms, entry_id))
+
+    def page(self, after=None, limit=10):
+        """Like ``standings_page``: rows ranked below ``after``, in order."""
+        with self.lock:
+            start = 0 if after is None else bisect_right(self.keys, tuple(after))
+            return self.standings[start:start + limit]
+
+    def add(self, standing):
+        key = (standing.total_ms, standing.id)
+        position = bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            # a load that raced the write already picked it up
+            return
+        self.keys.insert(position, key)
+        self.standings.insert(position, standing)
+
+    def remove(self, total_ms, entry_id):
+        position = bisect_left(self.keys, (total_ms, entry_id))
+        if position < len(self.keys) and self.keys[position] == (total_ms, entry_id):
+            del self.keys[position]
+            del self.standings[position]
+
+
+def enabled():
+    return current_app.config["RANK_INDEX"]
+
+
+def load(track):
+    rows = db.session.execute(
+        select(
+            Leaderboard.id,
+            Leaderboard.track,
+            Leaderboard.user_id,
+            User.username,
+            Leaderboard.time_mins,
+            Leaderboard.time_s,
+            Leaderboard.time_ms,
+            Leaderboard.total_ms,
+        )
+        .join(Leaderboard.user)
+        .where(Leaderboard.track == track, Leaderboard.verified.is_(True))
+        .order_by(Leaderboard.total_ms, Leaderboard.id)
+    )
+    return [Standing(*row) for row in rows]
+
+
+def index_for(track, version=None):
+    """The track's index at its current version, loading it if needed.
+
+    None when the index is switched off. Pass ``version`` if the caller
+    has already read it.
+    """
+    if not enabled():
+        return None
+    if version is None:
+        version = track_version(track)
+    with _lock:
+        index = _indexes.get(track)
+        if index is not None and index.version == version:
+            return index
+        track_lock = _loading.setdefault(track, threading.Lock())
+    with track_lock:
+        with _lock:
+            index = _indexes.get(track)
+        if index is None or index.version != version:
+            # read after the version, so it is never older than its label
+            index = RankIndex(version, load(track))
+            _counters["loads"] += 1
+            with _lock:
+                _indexes[track] = index
+    return index
+
+
+def update(track, version, added=(), removed=()):
+    """Apply a committed write to the track's index, if one is loaded.
+
+    ``version`` is what the write bumped the track to (``touch_track``'s
+    return value). Only an index at the version just before it can be
+    patched; otherwise it is dropped and reloaded on next use.
+    """
+    if not enabled():
+        return
+    with _lock:
+        index = _indexes.get(track)
+        if index is None:
+            return
+        if index.version != version - 1:
+            del _indexes[track]
+            _counters["dropped"] += 1
+            return
+        with index.lock:
+            for key in removed:
+                index.remove(*key)
+            for standing in added:
+                index.add(standing)
+            index.version = version
+        _counters["updates"] += 1
+
+
+def standings(entries):
+    """``Standing`` rows for entries about to be verified, for ``update``.
+
+    Call before committing, while the entries are still loaded.
+    """
+    if not enabled() or not entries:
+        return []
+    usernames = dict(db.session.execute(
+        select(User.id, User.username).where(
+            User.id.in_({e.user_id for e in entries})
+        )
+    ).all())
+    return [to_standing(e, usernames[e.user_id]) for e in entries]
+
+
+def user_standing(track, user, version=None):
+    """``standings.user_standing``, ranked from the index when it is on."""
+    index = index_for(track, version)
+    if index is None:
+        return counted_standing(track, user)
+    entry = Leaderboard.query.filter_by(
+        track=track, user_id=user.id, verified=True
+    ).first()
+    if entry is None:
+        return None, None
+    return to_standing(entry, user.username), index.rank(entry.total_ms, entry.id)
+
+
+def page(track, after=None, limit=10, version=None):
+    """``standings.standings_page``, sliced from the index when it is on."""
+    index = index_for(track, version)
+    if index is None:
+        return standings_page(track, after=after, limit=limit)
+    return index.page(after, limit)
+
+
+def stats():
+    with _lock:
+        sizes = {track: len(index) for track, index in _indexes.items()}
+    return dict(_counters, tracks=len(sizes), entries=sum(sizes.values()))
+
+
+def clear():
+    with _lock:
+        _indexes.clear()
+        _counters.update(dict.fromkeys(_counters, 0))
@@ -1,18 +1,53 @@
 # app/routes/admin.py
-from flask import Blueprint, render_template, redirect, url_for, flash, abort
+from datetime import datetime, timezone
+
+from flask import (
+    Blueprint,
+    current_app,
+    render_template,
+    redirect,
+    url_for,
+    flash,
+    abort,
+    jsonify,
+    request,
+    Response,
+    stream_with_context,
+)
 from flask_login import login_required, current_user
-from ..models import Leaderboard
-from .. import db
-import os
+from sqlalchemy import select
+from ..models import Leaderboard, User
+from ..cache import cache_stats
+from ..export import FORMATS, export_tracks, iter_export
+from ..events import entry_added, entry_removed, publish
+from ..standings import holds_record, touch_track, touch_user, user_standing
+from .. import (
+    cups,
+    db,
+    history,
+    moderation,
+    phash,
+    points,
+    rank_index,
+    screening,
+    uploads,
+)
 
 admin = Blueprint("admin", __name__, url_prefix="/admin")
 
+PENDING_PAGE_SIZE = 50
+
 def admin_required(f):
     from functools import wraps
     @wraps(f)
     def wrapper(*args, **kwargs):
         if not current_user.is_authenticated or not current_user.is_admin:
             abort(403)
+        # the logged-in user comes from a cache that may predate a demotion
+        if not db.session.scalar(
+            select(User.is_admin).where(User.id == current_user.id)
+        ):
+            abort(403)
         return f(*args, **kwargs)
     return wrapper
 
@@ -20,16 +55,112 @@ def admin_required(f):
 @login_required
 @admin_required
 def pending():
-    pending_entries = Leaderboard.query.filter_by(verified=False).all()
-    return render_template("admin_pending.html", entries=pending_entries)
+    after = request.args.get("after", type=int)
+    claims = moderation.my_claims(current_user.id)
+    entries, next_after = moderation.pending_page(after, PENDING_PAGE_SIZE)
+    similar = phash.similar([e.submission for e in claims])
+    now = datetime.now(timezone.utc)
+    holders = {e.id: moderation.lease_holder(e, now) for e in entries}
+    return render_template(
+        "admin_pending.html",
+        claims=claims,
+        holders=holders,
+        entries=entries,
+        similar=similar,
+        after=after,
+        next_after=next_after,
+    )
+
+@admin.route("/claim", methods=["POST"])
+@login_required
+@admin_required
+def claim():
+    claims = moderation.claim(current_user.id, current_app.config["CLAIM_BATCH"])
+    if not claims:
+        flash("Nothing left to claim", "invalid_time")
+    return back_to_pending()
+
+@admin.route("/release", methods=["POST"])
+@login_required
+@admin_required
+def release():
+    released = moderation.release_claims(current_user.id)
+    flash(f"Released {released} entries", "success")
+    return back_to_pending()
+
+def lease_lost():
+    flash("Claim this entry before moderating it; your lease may have "
+          "expired", "invalid_time")
+    return redirect(url_for("admin.pending"))
+
+def locked_entry(entry_id):
+    # the row first, like the bulk actions (lock order is in standings)
+    return (
+        Leaderboard.query.filter_by(id=entry_id).with_for_update().first_or_404()
+    )
+
+def selected_ids():
+    return request.form.getlist("ids", type=int)
+
+def back_to_pending():
+    return redirect(url_for("admin.pending", after=request.form.get("after") or None))
+
+@admin.route("/bulk/verify", methods=["POST"])
+@login_required
+@admin_required
+def bulk_verify():
+    ids = selected_ids()
+    verified, tracks = moderation.verify_entries(ids, current_user.id)
+    for track in tracks:
+        # clients refetch once rather than apply a diff per entry
+        publish(track, {"type": "resync"})
+    flash(f"Verified {len(verified)} entries", "success")
+    if len(verified) < len(ids):
+        flash(f"Skipped {len(ids) - len(verified)} already verified, still "
+              "uploading or not claimed by you", "invalid_time")
+    return back_to_pending()
+
+@admin.route("/bulk/reject", methods=["POST"])
+@login_required
+@admin_required
+def bulk_reject():
+    ids = selected_ids()
+    rejected, tracks = moderation.reject_entries(ids, current_user.id)
+    for track in tracks:
+        publish(track, {"type": "resync"})
+    flash(f"Rejected and deleted {len(rejected)} entries", "invalid_time")
+    if len(rejected) < len(ids):
+        flash(f"Skipped {len(ids) - len(rejected)} not claimed by you",
+              "invalid_time")
+    return back_to_pending()
 
 @admin.route("/verify/<int:entry_id>", methods=["POST"])
 @login_required
 @admin_required
 def verify(entry_id):
-    entry = Leaderboard.query.get_or_404(entry_id)
+    entry = locked_entry(entry_id)
+    if entry.verified:
+        # a double-clicked Approve or a stale page
+        flash("Entry is already verified", "invalid_time")
+        return redirect(url_for("admin.pending"))
+    if not moderation.holds_lease(entry.id, current_user.id):
+        return lease_lost()
+    if entry.upload_status != "done":
+        flash("Proof screenshot hasn't finished uploading yet", "invalid_time")
+        return redirect(url_for("admin.pending"))
+    record = holds_record(entry)
+    version = touch_track(entry.track, record_changed=record)
+    touch_user(entry.user_id)
     entry.verified = True
+    entry.claimed_by = entry.claimed_until = None
+    history.mark_verified(entry, record)
+    cups.refresh_player(entry.track, entry.user_id)
+    points.recompute_track(entry.track)
+    screening.adjust(entry.track, added=[entry.total_ms])
+    ranked = rank_index.standings([entry])
     db.session.commit()
+    rank_index.update(entry.track, version, added=ranked)
+    publish(entry.track, entry_added(*user_standing(entry.track, entry.user)))
     flash("Entry verified", "success")
     return redirect(url_for("admin.pending"))
 
@@ -37,8 +168,54 @@ def verify(entry_id):
 @login_required
 @admin_required
 def reject(entry_id):
-    entry = Leaderboard.query.get_or_404(entry_id)
+    entry = locked_entry(entry_id)
+    if not entry.verified and not moderation.holds_lease(entry.id, current_user.id):
+        return lease_lost()
+    standing = None
+    if entry.verified:
+        version = touch_track(entry.track, record_changed=holds_record(entry))
+        standing = user_standing(entry.track, entry.user)
+    touch_user(entry.user_id)
+    history.mark_rejected(entry)
+    screenshot = entry.screenshot_path
+    released = uploads.release(screenshot)
     db.session.delete(entry)
+    if standing is not None:
+        cups.refresh_player(entry.track, entry.user_id)
+        points.recompute_track(entry.track)
+        screening.adjust(entry.track, removed=[entry.total_ms])
     db.session.commit()
+    if released:
+        uploads.discard(screenshot)
+    if standing is not None:
+        ranked, _ = standing
+        rank_index.update(
+            entry.track, version, removed=[(ranked.total_ms, ranked.id)]
+        )
+        publish(entry.track, entry_removed(*standing))
     flash("Entry rejected and deleted", "invalid_time")
     return redirect(url_for("admin.pending"))
+
+@admin.route("/metrics")
+@login_required
+@admin_required
+def metrics():
+    return jsonify(caches=cache_stats(), rank_index=rank_index.stats())
+
+@admin.route("/export")
+@login_required
+@admin_required
+def export():
+    fmt = request.args.get("format", "csv")
+    if fmt not in FORMATS:
+        abort(400)
+    try:
+        tracks = export_tracks(request.args.get("track"), request.args.get("cup"))
+    except ValueError:
+        abort(400)
+
+    return Response(
+        stream_with_context(iter_export(fmt, tracks)),
+        mimetype=FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename=times.{fmt}"},
+    )
@@ -0,0 +1,228 @@
+from flask import Blueprint, Response, current_app, jsonify, request, abort
+from flask_login import current_user
+from werkzeug.exceptions import HTTPException
+
+from .. import cups, distribution, events, history, points, rank_index
+from ..http_cache import add_cache_headers, make_etag, not_modified
+from ..models import User
+from ..standings import (
+    cached_player_profile,
+    cached_world_records,
+    records_version_info,
+    format_time,
+    standing_json,
+    track_version_info,
+)
+from .main import CUPS, TRACKS, track_order
+
+api = Blueprint("api", __name__, url_prefix="/api")
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+@api.errorhandler(HTTPException)
+def json_error(e):
+    return jsonify(error=e.description), e.code
+
+
+def encode_cursor(standing, rank):
+    return f"{standing.total_ms}.{standing.id}.{rank}"
+
+
+def decode_cursor(cursor):
+    """Split a cursor into the (total_ms, id) key and the rank of that row."""
+    try:
+        total_ms, entry_id, rank = (int(part) for part in cursor.split("."))
+    except ValueError:
+        abort(400, "Invalid cursor")
+    return (total_ms, entry_id), rank
+
+
+def page_size():
+    try:
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        abort(400, "Invalid limit")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+@api.route("/leaderboard/<map_name>")
+def leaderboard(map_name):
+    if map_name not in TRACKS:
+        abort(404, "Unknown track")
+
+    limit = page_size()
+    after, rank = None, 0
+    if request.args.get("after"):
+        after, rank = decode_cursor(request.args["after"])
+
+    version, last_modified = track_version_info(map_name)
+    etag = make_etag("api-leaderboard", version, limit, request.args.get("after"))
+    cached = not_modified(etag, last_modified)
+    if cached is not None:
+        return cached
+
+    # one extra row tells us whether there is a next page
+    rows = rank_index.page(map_name, after=after, limit=limit + 1, version=version)
+    entries = []
+    for standing in rows[:limit]:
+        rank += 1
+        entries.append(standing_json(standing, rank))
+
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(rows[limit - 1], rank)
+
+    response = jsonify(track=map_name, entries=entries, next=next_cursor)
+    return add_cache_headers(response, etag, last_modified)
+
+
+@api.route("/leaderboard/<map_name>/stats")
+def track_stats(map_name):
+    if map_name not in TRACKS:
+        abort(404, "Unknown track")
+
+    version, last_modified = track_version_info(map_name)
+    private = current_user.is_authenticated
+    viewer = current_user.id if private else "anon"
+    etag = make_etag("api-stats", version, viewer)
+    cached = not_modified(etag, last_modified, private)
+    if cached is not None:
+        return cached
+
+    snapshot = distribution.snapshot(map_name, version)
+    you = None
+    if private:
+        total_ms = distribution.verified_time(map_name, current_user.id)
+        if total_ms is not None:
+            you = {
+                "total_ms": total_ms,
+                "percentile": distribution.percentile_of(snapshot.times, total_ms),
+            }
+
+    response = jsonify(track=map_name, **snapshot.summary, you=you)
+    return add_cache_headers(response, etag, last_modified, private)
+
+
+@api.route("/records")
+def records():
+    version, last_modified = records_version_info()
+    etag = make_etag("records", version)
+    cached = not_modified(etag, last_modified)
+    if cached is not None:
+        return cached
+
+    best = cached_world_records(version)
+    response = jsonify(records={
+        track: standing_json(best[track]) if track in best else None
+        for track in TRACKS
+    })
+    return add_cache_headers(response, etag, last_modified)
+
+
+@api.route("/leaderboard/<map_name>/events")
+def leaderboard_events(map_name):
+    """Server-sent events with a diff each time the track's standings change."""
+    if map_name not in TRACKS:
+        abort(404, "Unknown track")
+
+    subscribers = events.broker()
+    queue = subscribers.subscribe(map_name)
+    if queue is None:
+        response = jsonify(error="Too many live viewers, try again later")
+        response.status_code = 503
+        response.headers["Retry-After"] = "30"
+        return response
+
+    heartbeat = current_app.config["SSE_HEARTBEAT_SECONDS"]
+    response = Response(events.stream(queue, heartbeat), mimetype="text/event-stream")
+    # runs however the response ends, even if the body was never read
+    response.call_on_close(lambda: subscribers.unsubscribe(map_name, queue))
+    response.headers["Cache-Control"] = "no-cache"
+    # let nginx pass events through as they're written
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@api.route("/player/<username>")
+def player(username):
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        abort(404, "Unknown player")
+
+    profile = cached_player_profile(user)
+    summary = {k: v for k, v in profile.items() if k != "tracks"}
+    tracks = [
+        dict(standing_json(t.standing, t.rank), track=t.standing.track, field=t.field)
+        for t in sorted(profile["tracks"], key=track_order)
+    ]
+    return jsonify(player=user.username, summary=summary, tracks=tracks)
+
+
+@api.route("/cup/<cup_name>")
+def cup(cup_name):
+    if cup_name not in CUPS:
+        abort(404, "Unknown cup")
+
+    standings = [
+        {
+            "rank": rank,
+            "player": username,
+            "time": cups.format_total(total_ms),
+            "total_ms": total_ms,
+        }
+        for rank, (_, username, total_ms)
+        in enumerate(cups.cup_standings(cup_name, page_size()), start=1)
+    ]
+    return jsonify(cup=cup_name, tracks=CUPS[cup_name], standings=standings)
+
+
+@api.route("/rankings")
+def rankings():
+    standings = [
+        {"rank": rank, "player": username, "points": total}
+        for rank, (_, username, total)
+        in enumerate(points.global_standings(page_size()), start=1)
+    ]
+    return jsonify(standings=standings)
+
+
+def submission_json(submission):
+    return {
+        "id": submission.id,
+        "time": format_time(submission),
+        "total_ms": submission.total_ms,
+        "status": submission.status,
+        "submitted_at": submission.submitted_at.isoformat(),
+        "verified_at": (
+            submission.verified_at.isoformat() if submission.verified_at else None
+        ),
+    }
+
+
+@api.route("/leaderboard/<map_name>/history")
+def record_history(map_name):
+    if map_name not in TRACKS:
+        abort(404, "Unknown track")
+
+    records = [
+        dict(submission_json(submission), player=username)
+        for submission, username in history.record_progression(map_name)
+    ]
+    return jsonify(track=map_name, records=records)
+
+
+@api.route("/player/<username>/history/<map_name>")
+def player_history(username, map_name):
+    if map_name not in TRACKS:
+        abort(404, "Unknown track")
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        abort(404, "Unknown player")
+
+    submissions = [
+        submission_json(submission)
+        for submission in history.player_progression(user.id, map_name)
+    ]
+    return jsonify(player=user.username, track=map_name, submissions=submissions)
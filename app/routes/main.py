@@ -5,205 +5,126 @@ from flask import (
     redirect,
     url_for,
     flash,
+    abort,
     current_app,
-    abort
+    jsonify,
+    make_response,
 )
 from flask_login import login_required, current_user
+from markupsafe import Markup
 from werkzeug.utils import secure_filename
-import os
-import uuid
-import boto3
-
-s3 = boto3.client("s3")
-
-from .. import db
-from ..models import Leaderboard
-
-CUPS = {
-    # base game
-    "Mushroom Cup": [
-        "Mario Kart Stadium",
-        "Water Park",
-        "Sweet Sweet Canyon",
-        "Thwomp Ruins",
-    ],
-    "Flower Cup": [
-        "Mario Circuit (MK8)",
-        "Toad Harbor",
-        "Twisted Mansion",
-        "Shy Guy Falls",
-    ],
-    "Star Cup": [
-        "Sunshine Airport",
-        "Dolphin Shoals",
-        "Electrodrome",
-        "Mount Wario",
-    ],
-    "Special Cup": [
-        "Cloudtop Cruise",
-        "Bone-Dry Dunes",
-        "Bowser's Castle (MK8)",
-        "Rainbow Road (MK8)",
-    ],
-    "Shell Cup": [
-        "Moo Moo Meadows (Wii)",
-        "Mario Circuit (GBA)",
-        "Cheep Cheep Beach (DS)",
-        "Toad's Turnpike (N64)",
-    ],
-    "Banana Cup": [
-        "Dry Dry Desert (GCN)",
-        "Donut Plains 3 (SNES)",
-        "Royal Raceway (N64)",
-        "DK Jungle (3DS)",
-    ],
-    "Leaf Cup": [
-        "Wario Stadium (DS)",
-        "Sherbet Land (GCN)",
-        "Music Park (3DS)",
-        "Yoshi Valley (N64)",
-    ],
-    "Lightning Cup": [
-        "Tick-Tock Clock (DS)",
-        "Piranha Plant Slide (3DS)",
-        "Grumble Volcano (Wii)",
-        "Rainbow Road (N64)",
-    ],
-    "Egg Cup": [
-        "Yoshi Circuit (GCN)",
-        "Excitebike Arena",
-        "Dragon Driftway",
-        "Mute City (F-Zero)",
-    ],
-    "Triforce Cup": [
-        "Wario's Gold Mine (Wii)",
-        "Rainbow Road (SNES)",
-        "Ice Ice Outpost",
-        "Hyrule Circuit",
-    ],
-    "Crossing Cup": [
-        "Baby Park (GCN)",
-        "Cheese Land (GBA)",
-        "Wild Woods",
-        "Animal Crossing",
-    ],
-    "Bell Cup": [
-        "Neo Bowser City (3DS)",
-        "Ribbon Road (GBA)",
-        "Super Bell Subway",
-        "Big Blue (F-Zero)",
-    ],
-    # DLC
-    "Golden Dash Cup": [
-        "Paris Promenade (Tour)",
-        "Toad Circuit (3DS)",
-        "Choco Mountain (N64)",
-        "Coconut Mall (Wii)",
-    ],
-    "Lucky Cat Cup": [
-        "Tokyo Blur (Tour)",
-        "Shroom Ridge (DS)",
-        "Sky Garden (GBA)",
-        "Ninja Hideaway (Tour)",
-    ],
-    "Turnip Cup": [
-        "New York Minute (Tour)",
-        "Mario Circuit 3 (SNES)",
-        "Kalimari Desert (N64)",
-        "Waluigi Pinball (DS)",
-    ],
-    "Propeller Cup": [
-        "Sydney Sprint (Tour)",
-        "Snow Land (GBA)",
-        "Mushroom Gorge (Wii)",
-        "Sky-High Sundae",
-    ],
-    "Rock Cup": [
-        "London Loop (Tour)",
-        "Boo Lake (GBA)",
-        "Rock Rock Mountain (3DS)",
-        "Maple Treeway (Wii)",
-    ],
-    "Moon Cup": [
-        "Berlin Byways (Tour)",
-        "Peach Gardens (DS)",
-        "Merry Mountain (Tour)",
-        "Rainbow Road (3DS)",
-    ],
-    "Fruit Cup": [
-        "Amsterdam Drift (Tour)",
-        "Riverside Park (GBA)",
-        "DK Summit (Wii)",
-        "Yoshi's Island",
-    ],
-    "Boomerang Cup": [
-        "Bangkok Rush (Tour)",
-        "Mario Circuit (DS)",
-        "Waluigi Stadium (GCN)",
-        "Singapore Speedway (Tour)",
-    ],
-    "Feather Cup": [
-        "Athens Dash (Tour)",
-        "Daisy Cruiser (GCN)",
-        "Moonview Highway (Wii)",
-        "Squeaky Clean Sprint",
-    ],
-    "Cherry Cup": [
-        "Los Angeles Laps (Tour)",
-        "Sunset Wilds (GBA)",
-        "Koopa Cape (Wii)",
-        "Vancouver Velocity (Tour)",
-    ],
-    "Acorn Cup": [
-        "Rome Avanti (Tour)",
-        "DK Mountain (GCN)",
-        "Daisy Circuit (Wii)",
-        "Piranha Plant Cove",
-    ],
-    "Spiny Cup": [
-        "Madrid Drive (Tour)",
-        "Rosalina's Ice World (3DS)",
-        "Bowser Castle 3 (SNES)",
-        "Rainbow Road (Wii)",
-    ],
-}
-
-TRACKS = [track for tracks in CUPS.values() for track in tracks]
+
+from .. import (
+    cups,
+    db,
+    derivatives,
+    history,
+    points,
+    rank_index,
+    screening,
+    uploads,
+)
+from ..models import Leaderboard, User
+from ..tracks import CUPS, TRACKS
+from ..cache import TTLCache
+from ..events import entry_removed, publish
+from ..http_cache import add_cache_headers, make_etag, not_modified
+from ..standings import (
+    cached_player_profile,
+    cached_top_times,
+    cached_world_records,
+    holds_record,
+    touch_track,
+    touch_user,
+    track_version_info,
+    user_standing,
+)
+
+
+# rendered top-10 table rows, keyed by (track, track version)
+fragment_cache = TTLCache("fragments", maxsize=256, ttl=300)
 
 main = Blueprint("main", __name__)
 
 @main.route("/")
 def index():
-    return render_template("index.html", maps=TRACKS, CUPS=CUPS)
+    return render_template(
+        "index.html", maps=TRACKS, CUPS=CUPS, records=cached_world_records()
+    )
 
 @main.route("/leaderboard/<map_name>")
 def leaderboard(map_name):
     if map_name not in TRACKS:
         abort(404)
 
-    times = Leaderboard.query.filter_by(track=map_name, verified=True).all()
-    # sort times, only render top 10 on leaderboard
-    full_times = sorted(
-        times, key=lambda x: x.time_mins + (x.time_s / 60) + (x.time_ms / 60000)
-    )
+    version, last_modified = track_version_info(map_name)
+    viewer = current_user.id if current_user.is_authenticated else "anon"
+    private = current_user.is_authenticated
+    etag = make_etag("leaderboard", version, viewer)
+    cached = not_modified(etag, last_modified, private)
+    if cached is not None:
+        return cached
 
-    times = full_times[:10]
+    # only render top 10 on leaderboard, the same for every viewer
+    def render_rows():
+        times = cached_top_times(map_name, version=version)
+        rows = render_template("_standings_rows.html", times=times)
+        return Markup(rows), {t.id for t in times}
 
-    user_index = None
+    standings_rows, top_ids = fragment_cache.get_or_load(
+        (map_name, version), render_rows
+    )
 
-    if(
-        current_user.is_authenticated 
-        and current_user.scores.filter_by(track=map_name, verified=True).first() is not None
-    ):
-        if current_user.scores.filter_by(track=map_name, verified=True).first() not in times:
-            times.append(current_user.scores.filter_by(track=map_name, verified=True).first())
-            user_index = full_times.index(current_user.scores.filter_by(track=map_name, verified=True).first())
+    user_entry, user_index = None, None
+    if current_user.is_authenticated:
+        user_entry, user_index = rank_index.user_standing(
+            map_name, current_user, version
+        )
+        if user_entry is not None and user_entry.id in top_ids:
+            user_entry, user_index = None, None
 
-    return render_template(
+    response = make_response(render_template(
         "leaderboard.html",
         map_name=map_name,
-        times=times,
+        standings_rows=standings_rows,
+        user_entry=user_entry,
         user_index=user_index
+    ))
+    return add_cache_headers(response, etag, last_modified, private)
+
+@main.route("/cup/<cup_name>")
+def cup(cup_name):
+    if cup_name not in CUPS:
+        abort(404)
+    return render_template(
+        "cup.html",
+        cup_name=cup_name,
+        tracks=CUPS[cup_name],
+        standings=cups.cup_standings(cup_name),
+        format_total=cups.format_total,
+    )
+
+
+@main.route("/rankings")
+def rankings():
+    return render_template(
+        "rankings.html", standings=points.global_standings()
+    )
+
+
+def track_order(player_track):
+    return TRACKS.index(player_track.standing.track)
+
+
+@main.route("/player/<username>")
+def player(username):
+    user = User.query.filter_by(username=username).first_or_404()
+    profile = cached_player_profile(user)
+    return render_template(
+        "player.html",
+        player=user,
+        profile=profile,
+        tracks=sorted(profile["tracks"], key=track_order),
     )
 
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg"}
@@ -211,6 +132,45 @@ ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg"}
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
+@main.route("/submit/upload-url", methods=["POST"])
+@login_required
+def upload_url():
+    """Hand out a short-lived target for uploading a screenshot directly.
+
+    The browser sends the file's SHA-256 and size; if those bytes are
+    already stored there is nothing to upload.
+    """
+    filename = secure_filename(request.form.get("filename", ""))
+    digest = request.form.get("sha256", "").lower()
+    try:
+        size = int(request.form.get("size", ""))
+    except ValueError:
+        size = 0
+    if not allowed_file(filename):
+        return jsonify(error="Please upload a PNG or JPG file"), 400
+    key = uploads.content_key(digest, uploads.extension_for(filename))
+    if not uploads.is_content_key(key):
+        return jsonify(error="Invalid checksum"), 400
+    if not 0 < size <= current_app.config["MAX_SCREENSHOT_BYTES"]:
+        return jsonify(error="Screenshot is too large"), 400
+    if uploads.object_exists(key):
+        return jsonify(key=key, exists=True)
+    return jsonify(key=key, exists=False, **uploads.upload_target(key, size))
+
+@main.route("/uploads", methods=["PUT"])
+def local_upload():
+    """Local stand-in for the bucket's presigned PUT."""
+    if current_app.config["USE_S3"]:
+        abort(404)
+    target = uploads.load_upload_token(request.args.get("token", ""))
+    if target is None:
+        abort(403)
+    if request.mimetype != uploads.content_type_for(target["key"]):
+        abort(400)
+    if not uploads.save_local(request.stream, target["key"], target["size"]):
+        abort(400)
+    return "", 204
+
 @main.route("/submit", methods=["POST"])
 @login_required
 def submit():
@@ -226,63 +186,92 @@ def submit():
         flash("Invalid Time", "invalid_time")
         return redirect(url_for("main.leaderboard", map_name=map_name))
 
-    screenshot = request.files.get("screenshot")
+    screenshot_key = request.form.get("screenshot_key")
+    if screenshot_key:
+        # already in storage, uploaded straight from the browser
+        file_url = uploads.stored_screenshot(screenshot_key)
+        if file_url is None:
+            flash("Screenshot upload not found, please try again.",
+                  "missing_screenshot")
+            return redirect(url_for("main.leaderboard", map_name=map_name))
+        pending_upload = None
+    else:
+        screenshot = request.files.get("screenshot")
 
-    if not screenshot:
-        flash("Missing screenshot file.", "missing_screenshot")
-        return redirect(url_for("main.leaderboard", map_name=map_name))
+        if not screenshot:
+            flash("Missing screenshot file.", "missing_screenshot")
+            return redirect(url_for("main.leaderboard", map_name=map_name))
 
-    filename = secure_filename(screenshot.filename)
+        filename = secure_filename(screenshot.filename)
 
-    if not allowed_file(filename):
-        flash("Invalid screenshot file type. Please upload a PNG or JPG file"
-        , "invalid_screenshot")
-        return redirect(url_for("main.leaderboard", map_name=map_name))
-    
-    unique_name = f"{uuid.uuid4().hex}_{filename}"
+        if not allowed_file(filename):
+            flash("Invalid screenshot file type. Please upload a PNG or JPG file"
+            , "invalid_screenshot")
+            return redirect(url_for("main.leaderboard", map_name=map_name))
 
-    if current_app.config["USE_S3"]:
-        # upload to s3 !!
-        s3.upload_fileobj(
-            screenshot,
-            current_app.config["S3_BUCKET_NAME"],
-            unique_name,  # folder inside the bucket
-            ExtraArgs={"ContentType": screenshot.content_type},
-        )
-        file_url = f"https://{current_app.config['S3_BUCKET_NAME']}.s3.us-west-2.amazonaws.com/{unique_name}"
-    else:
-        # save locally
-        file_path = os.path.join(current_app.config["UPLOAD_FOLDER"], unique_name)
-        screenshot.save(file_path)
-        file_url = f"/static/uploads/{unique_name}"
+        # with s3 this only spools to disk, the transfer happens after commit
+        file_url, pending_upload = uploads.save_screenshot(screenshot)
+    upload_status = "uploading" if pending_upload else "done"
 
-    existing_entry = Leaderboard.query.filter_by(
-        track=map_name, user_id=current_user.id
-    ).first()
+    # the row before any version, in the order every write locks them
+    existing_entry = (
+        Leaderboard.query.filter_by(track=map_name, user_id=current_user.id)
+        .with_for_update()
+        .first()
+    )
 
+    removed = None
+    released = None
+    if existing_entry and existing_entry.verified:
+        # their verified time drops off the board until re-verified
+        version = touch_track(map_name, record_changed=holds_record(existing_entry))
+        removed = user_standing(map_name, current_user)
+    touch_user(current_user.id)
     if existing_entry:
         # update existing entry
-        existing_entry.time_mins = time_mins
-        existing_entry.time_s = time_s
-        existing_entry.time_ms = time_ms
+        was_verified = existing_entry.verified
+        previous_ms = existing_entry.total_ms
+        if uploads.release(existing_entry.screenshot_path):
+            released = existing_entry.screenshot_path
+        existing_entry.set_time(time_mins, time_s, time_ms)
         existing_entry.screenshot_path = file_url
+        existing_entry.upload_status = upload_status
         existing_entry.verified = False
+        if was_verified:
+            cups.refresh_player(map_name, current_user.id)
+            points.recompute_track(map_name)
+            screening.adjust(map_name, removed=[previous_ms])
+        existing_entry.suspicion = screening.score(map_name, existing_entry.total_ms)
+        history.record_submission(existing_entry)
         flash("Entry updated! Awaiting verification...", "pending")
     else:
         # new entry if not found
         new_entry = Leaderboard(
             track=map_name,
-            time_mins=time_mins,
-            time_s=time_s,
-            time_ms=time_ms,
             user_id=current_user.id,
             screenshot_path=file_url,
+            upload_status=upload_status,
             verified=False,
         )
+        new_entry.set_time(time_mins, time_s, time_ms)
+        new_entry.suspicion = screening.score(map_name, new_entry.total_ms)
+        history.record_submission(new_entry)
         flash("New entry created! Awaiting verification...", "pending")
         db.session.add(new_entry)
 
     db.session.commit()
+    if released is not None:
+        uploads.discard(released)
+    if pending_upload is not None:
+        uploads.uploader().enqueue(pending_upload)
+    else:
+        derivatives.enqueue(file_url)
+    if removed is not None:
+        ranked, _ = removed
+        rank_index.update(
+            map_name, version, removed=[(ranked.total_ms, ranked.id)]
+        )
+        publish(map_name, entry_removed(*removed))
 
     return redirect(url_for("main.leaderboard", map_name=map_name))
 
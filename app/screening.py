@@ -0,0 +1,162 @@
+import math
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import delete, func, insert, select, update
+
+from . import db
+from .models import Leaderboard, TrackStats
+from .sql import upsert
+
+# below this many verified times a track's spread means little
+MIN_SAMPLES = 10
+# floor on the spread (in log ms, so roughly 1%), or a track of near
+# identical times would flag anything a hair faster than them
+MIN_LOG_STD = 0.01
+
+
+def log_ms(total_ms):
+    return np.log(np.maximum(total_ms, 1))
+
+
+def best_time(track):
+    # the record, straight off the standings index
+    return (
+        select(func.min(Leaderboard.total_ms))
+        .where(Leaderboard.track == track, Leaderboard.verified.is_(True))
+        .scalar_subquery()
+    )
+
+
+def adjust(track, added=(), removed=()):
+    """Fold newly verified times into ``track``'s sums and take old ones out.
+
+    The sums are bumped in place by one upsert, so concurrent verifies
+    can't lose each other's updates. Call after the write is made and
+    before committing.
+    """
+    added = log_ms(np.asarray(added, dtype=np.float64))
+    removed = log_ms(np.asarray(removed, dtype=np.float64))
+    count = len(added) - len(removed)
+    sum_log = float(added.sum() - removed.sum())
+    sum_log_sq = float((added**2).sum() - (removed**2).sum())
+    db.session.flush()
+    db.session.execute(upsert(
+        TrackStats,
+        {
+            "track": track,
+            "count": count,
+            "sum_log": sum_log,
+            "sum_log_sq": sum_log_sq,
+            "best_ms": best_time(track),
+        },
+        keys=[TrackStats.track],
+        update={
+            "count": TrackStats.count + count,
+            "sum_log": TrackStats.sum_log + sum_log,
+            "sum_log_sq": TrackStats.sum_log_sq + sum_log_sq,
+            "best_ms": best_time(track),
+        },
+    ))
+
+
+def spread(stats):
+    """``(mean, std)`` of the track's log times, None with too few of them."""
+    if stats is None or stats.count < MIN_SAMPLES:
+        return None
+    mean = stats.sum_log / stats.count
+    variance = max(stats.sum_log_sq / stats.count - mean * mean, 0.0)
+    std = math.sqrt(variance * stats.count / (stats.count - 1))
+    return mean, max(std, MIN_LOG_STD)
+
+
+def scores(stats, total_ms):
+    """How many standard deviations faster than typical each time is.
+
+    Works on a single time or an array of them. Times that would beat the
+    record score at least the flag threshold, so they are always looked at
+    early. None if the track doesn't have enough verified times yet.
+    """
+    fit = spread(stats)
+    if fit is None:
+        return None
+    mean, std = fit
+    z = (mean - log_ms(total_ms)) / std
+    if stats.best_ms is not None:
+        flag = current_app.config["SUSPICION_FLAG"]
+        z = np.where(np.less(total_ms, stats.best_ms), np.maximum(z, flag), z)
+    return np.round(z, 2)
+
+
+def score(track, total_ms):
+    """Suspicion of one new time on ``track``: a primary key read and arithmetic."""
+    z = scores(db.session.get(TrackStats, track), total_ms)
+    return None if z is None else float(z)
+
+
+def rebuild():
+    """Recompute every track's sums from its verified times."""
+    db.session.execute(delete(TrackStats))
+    tracks = db.session.scalars(
+        select(Leaderboard.track).distinct().where(Leaderboard.verified.is_(True))
+    ).all()
+    rows = []
+    for track in tracks:
+        totals = np.fromiter(
+            db.session.scalars(
+                select(Leaderboard.total_ms).where(
+                    Leaderboard.track == track, Leaderboard.verified.is_(True)
+                )
+            ),
+            dtype=np.float64,
+        )
+        logs = log_ms(totals)
+        rows.append({
+            "track": track,
+            "count": len(totals),
+            "sum_log": float(logs.sum()),
+            "sum_log_sq": float((logs**2).sum()),
+            "best_ms": int(totals.min()),
+        })
+    if rows:
+        db.session.execute(insert(TrackStats), rows)
+    return len(rows)
+
+
+def rescore(batch_size=5000):
+    """Score every pending entry again against the current track sums.
+
+    Reads the queue a batch at a time into arrays, scores each track's
+    slice in one vectorized pass and writes the batch back with one
+    executemany. Returns how many entries were scored.
+    """
+    stats = {s.track: s for s in TrackStats.query}
+    rescored = 0
+    after = 0
+    while True:
+        rows = db.session.execute(
+            select(Leaderboard.id, Leaderboard.track, Leaderboard.total_ms)
+            .where(Leaderboard.verified.is_(False), Leaderboard.id > after)
+            .order_by(Leaderboard.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return rescored
+        after = rows[-1].id
+
+        ids, tracks, totals = (np.array(column) for column in zip(*rows))
+        suspicion = np.full(len(ids), np.nan)
+        for track in np.unique(tracks):
+            mask = tracks == track
+            z = scores(stats.get(track), totals[mask])
+            if z is not None:
+                suspicion[mask] = z
+        db.session.execute(
+            update(Leaderboard),
+            [
+                {"id": int(i), "suspicion": None if np.isnan(z) else float(z)}
+                for i, z in zip(ids, suspicion)
+            ],
+        )
+        db.session.commit()
+        rescored += len(ids)
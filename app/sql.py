@@ -0,0 +1,16 @@
+from sqlalchemy.dialects import postgresql, sqlite
+
+from . import db
+
+
+def upsert(model, values, keys, update=None):
+    """INSERT ... ON CONFLICT (keys) DO UPDATE for Postgres and SQLite.
+
+    Without ``update`` an existing row is left alone (DO NOTHING).
+    """
+    dialect = db.session.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = insert(model).values(**values)
+    if update is None:
+        return stmt.on_conflict_do_nothing(index_elements=keys)
+    return stmt.on_conflict_do_update(index_elements=keys, set_=update)
@@ -0,0 +1,293 @@
+from collections import namedtuple
+
+from sqlalchemy import and_, func, or_, select, tuple_
+from sqlalchemy.dialects.postgresql import distinct_on
+from sqlalchemy.orm import aliased
+
+from . import db
+from .cache import TTLCache, bump_version, get_version, version_info
+from .models import Leaderboard, User
+
+# plain rows so cached standings don't hold on to session-bound ORM objects
+Standing = namedtuple(
+    "Standing", "id track user_id username time_mins time_s time_ms total_ms"
+)
+
+# one entry per track (and limit), keyed by the track's version
+standings_cache = TTLCache("standings", maxsize=256, ttl=300)
+# best time on every track, keyed by the records version
+records_cache = TTLCache("records", maxsize=4, ttl=300)
+# a player's ranks across tracks, keyed by the player's version; other
+# players' times move those ranks too, which the short TTL bounds
+player_cache = TTLCache("players", maxsize=1024, ttl=60)
+
+RECORDS_KEY = "records"
+
+
+def track_key(track):
+    return f"track:{track}"
+
+
+def user_key(user_id):
+    return f"user:{user_id}"
+
+
+# every write locks in one order so two of them can't wait on each other:
+# the leaderboard rows it changes (by id), then track versions (by track),
+# the records version, and last the players' versions (by id)
+
+
+def touch_user(user_id):
+    """Mark a player's profile as changed; call before committing the write."""
+    bump_version(user_key(user_id))
+
+
+def track_version(track):
+    return get_version(track_key(track))
+
+
+def track_version_info(track):
+    return version_info(track_key(track))
+
+
+def touch_track(track, record_changed=False):
+    """Mark a track's standings as changed; call before committing the write.
+
+    Pass ``record_changed`` when the write also moves the track's record
+    (see ``holds_record``) so the world-records overview is rebuilt too.
+    Returns the track's new version.
+    """
+    version = bump_version(track_key(track))
+    if record_changed:
+        touch_records()
+    return version
+
+
+def touch_records():
+    """Mark the world-records overview as changed."""
+    bump_version(RECORDS_KEY)
+
+
+def to_standing(entry, username):
+    return Standing(
+        entry.id,
+        entry.track,
+        entry.user_id,
+        username,
+        entry.time_mins,
+        entry.time_s,
+        entry.time_ms,
+        entry.total_ms,
+    )
+
+
+def format_time(standing):
+    return "%02d:%02d:%03d" % (standing.time_mins, standing.time_s, standing.time_ms)
+
+
+def standing_json(standing, rank=None):
+    data = {
+        "id": standing.id,
+        "player": standing.username,
+        "time": format_time(standing),
+        "total_ms": standing.total_ms,
+    }
+    if rank is not None:
+        data["rank"] = rank
+    return data
+
+
+def ahead_of(total_ms, entry_id, model=Leaderboard):
+    """Filter for entries placed above the given (total_ms, id) position.
+
+    Ties on time are broken by id so every entry has exactly one rank.
+    """
+    return or_(
+        model.total_ms < total_ms,
+        and_(model.total_ms == total_ms, model.id < entry_id),
+    )
+
+
+def behind(total_ms, entry_id, model=Leaderboard):
+    """Filter for entries placed below the given (total_ms, id) position.
+
+    Written as a row-value comparison so the planner can seek straight to
+    the position in the (track, verified, total_ms) index.
+    """
+    return tuple_(model.total_ms, model.id) > tuple_(total_ms, entry_id)
+
+
+def standings_page(track, after=None, limit=10):
+    """Verified standings for ``track`` in rank order.
+
+    ``after`` is the ``(total_ms, id)`` of the last row already seen, so
+    each page is an index range scan no matter how deep it is.
+    """
+    query = (
+        db.session.query(Leaderboard, User.username)
+        .join(Leaderboard.user)
+        .filter(Leaderboard.track == track, Leaderboard.verified.is_(True))
+    )
+    if after is not None:
+        query = query.filter(behind(*after))
+    rows = query.order_by(Leaderboard.total_ms, Leaderboard.id).limit(limit)
+    return [to_standing(entry, username) for entry, username in rows]
+
+
+def top_times(track, limit=10):
+    return standings_page(track, limit=limit)
+
+
+def cached_top_times(track, limit=10, version=None):
+    if version is None:
+        version = track_version(track)
+    key = (track, version, limit)
+    return standings_cache.get_or_load(key, lambda: top_times(track, limit))
+
+
+def user_standing(track, user):
+    """The user's verified entry on ``track`` and its zero-based rank.
+
+    Both come back from a single query; returns ``(None, None)`` when the
+    user has no verified time there.
+    """
+    ahead = aliased(Leaderboard)
+    rank = (
+        select(func.count())
+        .select_from(ahead)
+        .where(
+            ahead.track == Leaderboard.track,
+            ahead.verified.is_(True),
+            ahead_of(Leaderboard.total_ms, Leaderboard.id, model=ahead),
+        )
+        .scalar_subquery()
+    )
+    row = (
+        db.session.query(Leaderboard, rank)
+        .filter(
+            Leaderboard.track == track,
+            Leaderboard.user_id == user.id,
+            Leaderboard.verified.is_(True),
+        )
+        .first()
+    )
+    if row is None:
+        return None, None
+    entry, position = row
+    return to_standing(entry, user.username), position
+
+
+def holds_record(entry):
+    """Whether ``entry`` is, or would be once verified, its track's record."""
+    best = standings_page(entry.track, limit=1)
+    if not best:
+        return True
+    return (entry.total_ms, entry.id) <= (best[0].total_ms, best[0].id)
+
+
+def records_query(dialect):
+    """Statement selecting the best verified entry per track.
+
+    Postgres gets ``DISTINCT ON``; other backends fall back to keeping the
+    first row of a ``ROW_NUMBER()`` window per track.
+    """
+    order = (Leaderboard.track, Leaderboard.total_ms, Leaderboard.id)
+    verified = Leaderboard.verified.is_(True)
+    if dialect == "postgresql":
+        best = (
+            select(Leaderboard)
+            .where(verified)
+            .ext(distinct_on(Leaderboard.track))
+            .order_by(*order)
+            .subquery()
+        )
+    else:
+        position = func.row_number().over(
+            partition_by=Leaderboard.track,
+            order_by=(Leaderboard.total_ms, Leaderboard.id),
+        )
+        ranked = select(Leaderboard, position.label("position")).where(verified)
+        ranked = ranked.subquery()
+        best = select(ranked).where(ranked.c.position == 1).subquery()
+
+    record = aliased(Leaderboard, best)
+    return select(record, User.username).join(User, User.id == record.user_id)
+
+
+def world_records():
+    dialect = db.session.get_bind().dialect.name
+    rows = db.session.execute(records_query(dialect))
+    return {entry.track: to_standing(entry, username) for entry, username in rows}
+
+
+def records_version_info():
+    return version_info(RECORDS_KEY)
+
+
+def cached_world_records(version=None):
+    if version is None:
+        version = get_version(RECORDS_KEY)
+    return records_cache.get_or_load(version, world_records)
+
+
+PlayerTrack = namedtuple("PlayerTrack", "standing rank field")
+
+
+def player_tracks(user):
+    """The user's verified entries with their rank and field size per track.
+
+    One window-function query, only partitioning the tracks the user has a
+    verified time on.
+    """
+    verified = Leaderboard.verified.is_(True)
+    their_tracks = select(Leaderboard.track).where(
+        Leaderboard.user_id == user.id, verified
+    )
+    ranked = (
+        select(
+            Leaderboard,
+            func.row_number().over(
+                partition_by=Leaderboard.track,
+                order_by=(Leaderboard.total_ms, Leaderboard.id),
+            ).label("position"),
+            func.count().over(partition_by=Leaderboard.track).label("field"),
+        )
+        .where(verified, Leaderboard.track.in_(their_tracks))
+        .subquery()
+    )
+    entry = aliased(Leaderboard, ranked)
+    rows = db.session.execute(
+        select(entry, ranked.c.position, ranked.c.field).where(
+            ranked.c.user_id == user.id
+        )
+    )
+    return [
+        PlayerTrack(to_standing(row, user.username), position, field)
+        for row, position, field in rows
+    ]
+
+
+def player_profile(user):
+    tracks = player_tracks(user)
+    pending = Leaderboard.query.filter_by(user_id=user.id, verified=False).count()
+    ranks = [t.rank for t in tracks]
+    return {
+        "tracks": tracks,
+        "verified": len(tracks),
+        "pending": pending,
+        "records": ranks.count(1),
+        "podiums": sum(1 for rank in ranks if rank <= 3),
+        "best_rank": min(ranks, default=None),
+        "average_rank": sum(ranks) / len(ranks) if ranks else None,
+        # share of each field at or behind the player, averaged
+        "average_percentile": (
+            sum(100 * (t.field - t.rank + 1) / t.field for t in tracks)
+            / len(tracks)
+            if tracks else None
+        ),
+    }
+
+
+def cached_player_profile(user):
+    key = (user.id, get_version(user_key(user.id)))
+    return player_cache.get_or_load(key, lambda: player_profile(user))
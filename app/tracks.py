@@ -0,0 +1,153 @@
+CUPS = {
+    # base game
+    "Mushroom Cup": [
+        "Mario Kart Stadium",
+        "Water Park",
+        "Sweet Sweet Canyon",
+        "Thwomp Ruins",
+    ],
+    "Flower Cup": [
+        "Mario Circuit (MK8)",
+        "Toad Harbor",
+        "Twisted Mansion",
+        "Shy Guy Falls",
+    ],
+    "Star Cup": [
+        "Sunshine Airport",
+        "Dolphin Shoals",
+        "Electrodrome",
+        "Mount Wario",
+    ],
+    "Special Cup": [
+        "Cloudtop Cruise",
+        "Bone-Dry Dunes",
+        "Bowser's Castle (MK8)",
+        "Rainbow Road (MK8)",
+    ],
+    "Shell Cup": [
+        "Moo Moo Meadows (Wii)",
+        "Mario Circuit (GBA)",
+        "Cheep Cheep Beach (DS)",
+        "Toad's Turnpike (N64)",
+    ],
+    "Banana Cup": [
+        "Dry Dry Desert (GCN)",
+        "Donut Plains 3 (SNES)",
+        "Royal Raceway (N64)",
+        "DK Jungle (3DS)",
+    ],
+    "Leaf Cup": [
+        "Wario Stadium (DS)",
+        "Sherbet Land (GCN)",
+        "Music Park (3DS)",
+        "Yoshi Valley (N64)",
+    ],
+    "Lightning Cup": [
+        "Tick-Tock Clock (DS)",
+        "Piranha Plant Slide (3DS)",
+        "Grumble Volcano (Wii)",
+        "Rainbow Road (N64)",
+    ],
+    "Egg Cup": [
+        "Yoshi Circuit (GCN)",
+        "Excitebike Arena",
+        "Dragon Driftway",
+        "Mute City (F-Zero)",
+    ],
+    "Triforce Cup": [
+        "Wario's Gold Mine (Wii)",
+        "Rainbow Road (SNES)",
+        "Ice Ice Outpost",
+        "Hyrule Circuit",
+    ],
+    "Crossing Cup": [
+        "Baby Park (GCN)",
+        "Cheese Land (GBA)",
+        "Wild Woods",
+        "Animal Crossing",
+    ],
+    "Bell Cup": [
+        "Neo Bowser City (3DS)",
+        "Ribbon Road (GBA)",
+        "Super Bell Subway",
+        "Big Blue (F-Zero)",
+    ],
+    # DLC
+    "Golden Dash Cup": [
+        "Paris Promenade (Tour)",
+        "Toad Circuit (3DS)",
+        "Choco Mountain (N64)",
+        "Coconut Mall (Wii)",
+    ],
+    "Lucky Cat Cup": [
+        "Tokyo Blur (Tour)",
+        "Shroom Ridge (DS)",
+        "Sky Garden (GBA)",
+        "Ninja Hideaway (Tour)",
+    ],
+    "Turnip Cup": [
+        "New York Minute (Tour)",
+        "Mario Circuit 3 (SNES)",
+        "Kalimari Desert (N64)",
+        "Waluigi Pinball (DS)",
+    ],
+    "Propeller Cup": [
+        "Sydney Sprint (Tour)",
+        "Snow Land (GBA)",
+        "Mushroom Gorge (Wii)",
+        "Sky-High Sundae",
+    ],
+    "Rock Cup": [
+        "London Loop (Tour)",
+        "Boo Lake (GBA)",
+        "Rock Rock Mountain (3DS)",
+        "Maple Treeway (Wii)",
+    ],
+    "Moon Cup": [
+        "Berlin Byways (Tour)",
+        "Peach Gardens (DS)",
+        "Merry Mountain (Tour)",
+        "Rainbow Road (3DS)",
+    ],
+    "Fruit Cup": [
+        "Amsterdam Drift (Tour)",
+        "Riverside Park (GBA)",
+        "DK Summit (Wii)",
+        "Yoshi's Island",
+    ],
+    "Boomerang Cup": [
+        "Bangkok Rush (Tour)",
+        "Mario Circuit (DS)",
+        "Waluigi Stadium (GCN)",
+        "Singapore Speedway (Tour)",
+    ],
+    "Feather Cup": [
+        "Athens Dash (Tour)",
+        "Daisy Cruiser (GCN)",
+        "Moonview Highway (Wii)",
+        "Squeaky Clean Sprint",
+    ],
+    "Cherry Cup": [
+        "Los Angeles Laps (Tour)",
+        "Sunset Wilds (GBA)",
+        "Koopa Cape (Wii)",
+        "Vancouver Velocity (Tour)",
+    ],
+    "Acorn Cup": [
+        "Rome Avanti (Tour)",
+        "DK Mountain (GCN)",
+        "Daisy Circuit (Wii)",
+        "Piranha Plant Cove",
+    ],
+    "Spiny Cup": [
+        "Madrid Drive (Tour)",
+        "Rosalina's Ice World (3DS)",
+        "Bowser Castle 3 (SNES)",
+        "Rainbow Road (Wii)",
+    ],
+}
+
+TRACKS = [track for tracks in CUPS.values() for track in tracks]
+
+# which cup each track belongs to
+TRACK_CUPS = {track: cup for cup, tracks in CUPS.items() for track in tracks}
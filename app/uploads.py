@@ -0,0 +1,579 @@
+import base64
+import hashlib
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.exceptions import ClientError
+from flask import current_app, url_for
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import delete, func, insert, select, update
+
+from . import db, derivatives
+from .models import Leaderboard, ScreenshotObject, Submission
+from .sql import upsert
+
+logger = logging.getLogger(__name__)
+
+# a screenshot spooled to local disk, waiting to be sent to the bucket
+PendingUpload = namedtuple("PendingUpload", "key spool_path content_type url")
+
+EXTENSIONS = {"png": "png", "jpg": "jpg", "jpeg": "jpg"}
+CONTENT_TYPES = {"png": "image/png", "jpg": "image/jpeg"}
+
+# screenshots are stored under the sha-256 of their bytes
+CONTENT_KEY = re.compile(r"[0-9a-f]{64}\.(png|jpg)")
+
+CHUNK_SIZE = 64 * 1024
+
+
+def make_s3_client(app):
+    # S3_ENDPOINT_URL points boto3 at a local stand-in (MinIO, moto server)
+    return boto3.client("s3", endpoint_url=app.config["S3_ENDPOINT_URL"])
+
+
+def public_url(key):
+    bucket = current_app.config["S3_BUCKET_NAME"]
+    endpoint = current_app.config["S3_ENDPOINT_URL"]
+    if endpoint:
+        return f"{endpoint.rstrip('/')}/{bucket}/{key}"
+    return f"https://{bucket}.s3.us-west-2.amazonaws.com/{key}"
+
+
+def local_url(key):
+    return f"/static/uploads/{key}"
+
+
+def stored_url(key):
+    if current_app.config["USE_S3"]:
+        return public_url(key)
+    return local_url(key)
+
+
+def key_from_url(url):
+    return url.rsplit("/", 1)[-1]
+
+
+def extension_for(filename):
+    return EXTENSIONS.get(filename.rsplit(".", 1)[-1].lower())
+
+
+def content_type_for(filename):
+    return CONTENT_TYPES.get(extension_for(filename))
+
+
+def content_key(digest, extension):
+    return f"{digest}.{extension}"
+
+
+def is_content_key(key):
+    return CONTENT_KEY.fullmatch(key) is not None
+
+
+def hash_to_file(stream, path, max_bytes=None):
+    """Copy ``stream`` to ``path`` and hash it in the same pass.
+
+    Returns ``(sha256 hex digest, size)``, or None (leaving nothing behind)
+    if the stream runs past ``max_bytes``.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "wb") as out:
+        while chunk := stream.read(CHUNK_SIZE):
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    if max_bytes is not None and size > max_bytes:
+        os.remove(path)
+        return None
+    return digest.hexdigest(), size
+
+
+def incoming_path(folder):
+    # dot-prefixed so nothing mistakes a half-written file for a screenshot
+    return os.path.join(folder, f".incoming-{uuid.uuid4().hex}")
+
+
+def object_exists(key):
+    if current_app.config["USE_S3"]:
+        try:
+            uploader().s3.head_object(
+                Bucket=current_app.config["S3_BUCKET_NAME"], Key=key
+            )
+        except ClientError:
+            return False
+        return True
+    return os.path.isfile(os.path.join(current_app.config["UPLOAD_FOLDER"], key))
+
+
+def read_stored(url):
+    """Bytes of a stored screenshot (or derivative), wherever it lives."""
+    key = key_from_url(url)
+    if current_app.config["USE_S3"]:
+        obj = uploader().s3.get_object(
+            Bucket=current_app.config["S3_BUCKET_NAME"], Key=key
+        )
+        return obj["Body"].read()
+    with open(os.path.join(current_app.config["UPLOAD_FOLDER"], key), "rb") as f:
+        return f.read()
+
+
+def write_stored(key, data, content_type):
+    """Store ``data`` next to the screenshots and return its URL."""
+    if current_app.config["USE_S3"]:
+        uploader().s3.put_object(
+            Bucket=current_app.config["S3_BUCKET_NAME"],
+            Key=key,
+            Body=data,
+            ContentType=content_type,
+        )
+        return public_url(key)
+    with open(os.path.join(current_app.config["UPLOAD_FOLDER"], key), "wb") as f:
+        f.write(data)
+    return local_url(key)
+
+
+def delete_stored(keys):
+    if current_app.config["USE_S3"]:
+        uploader().s3.delete_objects(
+            Bucket=current_app.config["S3_BUCKET_NAME"],
+            Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+        )
+        return
+    for key in keys:
+        try:
+            os.remove(os.path.join(current_app.config["UPLOAD_FOLDER"], key))
+        except FileNotFoundError:
+            pass
+
+
+def _signer():
+    return URLSafeTimedSerializer(
+        current_app.config["SECRET_KEY"], salt="screenshot-upload"
+    )
+
+
+def upload_target(key, size):
+    """Presigned PUT the browser uses to store ``key`` without the app.
+
+    Returns ``{"method", "url", "headers"}``. The signature pins the length
+    and, on S3, the SHA-256 checksum, so the bucket refuses bytes that don't
+    match their content address. Without S3 the PUT goes to
+    ``main.local_upload``, which checks the same things behind a signed token.
+    """
+    content_type = content_type_for(key)
+    ttl = current_app.config["UPLOAD_URL_TTL"]
+    if current_app.config["USE_S3"]:
+        digest = key.split(".", 1)[0]
+        checksum = base64.b64encode(bytes.fromhex(digest)).decode()
+        url = uploader().s3.generate_presigned_url(
+            "put_object",
+            Params={
+                "Bucket": current_app.config["S3_BUCKET_NAME"],
+                "Key": key,
+                "ContentType": content_type,
+                "ContentLength": size,
+                "ChecksumSHA256": checksum,
+            },
+            ExpiresIn=ttl,
+        )
+        headers = {"Content-Type": content_type, "x-amz-checksum-sha256": checksum}
+        return {"method": "PUT", "url": url, "headers": headers}
+    token = _signer().dumps({"key": key, "size": size})
+    return {
+        "method": "PUT",
+        "url": url_for("main.local_upload", token=token),
+        "headers": {"Content-Type": content_type},
+    }
+
+
+def load_upload_token(token):
+    """The ``{"key", "size"}`` a local upload token grants, or None."""
+    try:
+        return _signer().loads(token, max_age=current_app.config["UPLOAD_URL_TTL"])
+    except BadSignature:
+        return None
+
+
+def save_local(stream, key, size):
+    """Store a direct upload locally if it really is ``size`` bytes of ``key``."""
+    folder = current_app.config["UPLOAD_FOLDER"]
+    incoming = incoming_path(folder)
+    hashed = hash_to_file(stream, incoming, max_bytes=size)
+    if hashed is None or hashed != (key.split(".", 1)[0], size):
+        if hashed is not None:
+            os.remove(incoming)
+        return False
+    os.replace(incoming, os.path.join(folder, key))
+    return True
+
+
+def stored_screenshot(key):
+    """URL of a directly uploaded screenshot, or None if it isn't acceptable.
+
+    Checks the object really landed and is within the limits the upload
+    target promised, before an entry is allowed to point at it. The
+    reference is acquired first, so a concurrent ``discard`` can't delete
+    the object between these checks and the entry being committed.
+    """
+    if not is_content_key(key):
+        return None
+    acquire(key)
+    if not _acceptable(key):
+        db.session.rollback()
+        return None
+    return stored_url(key)
+
+
+def _acceptable(key):
+    if current_app.config["USE_S3"]:
+        try:
+            head = uploader().s3.head_object(
+                Bucket=current_app.config["S3_BUCKET_NAME"], Key=key
+            )
+        except ClientError:
+            return False
+        size, content_type = head["ContentLength"], head.get("ContentType")
+    else:
+        path = os.path.join(current_app.config["UPLOAD_FOLDER"], key)
+        if not os.path.isfile(path):
+            return False
+        size, content_type = os.path.getsize(path), content_type_for(key)
+    if not 0 < size <= current_app.config["MAX_SCREENSHOT_BYTES"]:
+        return False
+    return content_type == content_type_for(key)
+
+
+def save_screenshot(screenshot):
+    """Store an uploaded screenshot under the digest of its bytes.
+
+    The upload is hashed while it is copied out of the request, and dropped
+    if an identical screenshot is already stored. Locally the file lands in
+    UPLOAD_FOLDER; with S3 it is only spooled here and the returned
+    ``PendingUpload`` goes to the uploader once the entry is committed.
+    The reference is acquired before the dedupe check, so a concurrent
+    ``discard`` either sees it or finishes deleting first. Returns
+    ``(url, pending)``.
+    """
+    extension = extension_for(screenshot.filename)
+    use_s3 = current_app.config["USE_S3"]
+    folder = current_app.config["UPLOAD_SPOOL" if use_s3 else "UPLOAD_FOLDER"]
+    incoming = incoming_path(folder)
+    digest, _ = hash_to_file(screenshot.stream, incoming)
+    key = content_key(digest, extension)
+    path = os.path.join(folder, key)
+
+    acquire(key)
+    if object_exists(key):
+        os.remove(incoming)
+        return stored_url(key), None
+    os.replace(incoming, path)
+    if not use_s3:
+        return local_url(key), None
+    url = public_url(key)
+    return url, PendingUpload(key, path, CONTENT_TYPES[extension], url)
+
+
+def acquire(url):
+    """Count one more entry pointing at the object behind ``url`` (or key)."""
+    db.session.execute(upsert(
+        ScreenshotObject,
+        {"key": key_from_url(url), "refs": 1},
+        keys=[ScreenshotObject.key],
+        update={"refs": ScreenshotObject.refs + 1},
+    ))
+
+
+def release(url, count=1):
+    """Drop references; True once nothing points at the object any more.
+
+    Only the count changes here. Call ``discard`` after committing to remove
+    the bytes.
+    """
+    key = key_from_url(url)
+    db.session.execute(
+        update(ScreenshotObject)
+        .where(ScreenshotObject.key == key)
+        .values(refs=ScreenshotObject.refs - count)
+    )
+    gone = db.session.execute(
+        delete(ScreenshotObject).where(
+            ScreenshotObject.key == key, ScreenshotObject.refs <= 0
+        )
+    )
+    return gone.rowcount > 0
+
+
+def discard(url):
+    """Delete a released object and its derivatives, unless reused since.
+
+    A placeholder row holds the key while the bytes go, and is committed
+    away once they're gone. Uploads of the same screenshot acquire before
+    they trust ``object_exists``, so they either stop the delete or wait
+    for it and store their own copy.
+    """
+    key = key_from_url(url)
+    held = db.session.execute(
+        upsert(ScreenshotObject, {"key": key, "refs": 0}, keys=[ScreenshotObject.key])
+    )
+    if held.rowcount:
+        delete_stored([key, *derivatives.derivative_keys(key)])
+        db.session.execute(
+            delete(ScreenshotObject).where(ScreenshotObject.key == key)
+        )
+    db.session.commit()
+
+
+def rebuild_references():
+    """Recount every object's references from the entries and history."""
+    refs = defaultdict(int)
+    for path in (Leaderboard.screenshot_path, Submission.screenshot_path):
+        counts = db.session.execute(select(path, func.count()).group_by(path))
+        for url, count in counts:
+            refs[key_from_url(url)] += count
+    db.session.execute(delete(ScreenshotObject))
+    if refs:
+        db.session.execute(
+            insert(ScreenshotObject),
+            [{"key": key, "refs": count} for key, count in refs.items()],
+        )
+    return len(refs)
+
+
+def rehash(url):
+    """Copy a legacy object to its content address; returns the new URL.
+
+    The bytes are read once, hashing as they stream. The original is left
+    in place for the caller to delete once nothing points at it. None if
+    the object is missing or not an image type we store.
+    """
+    key = key_from_url(url)
+    extension = extension_for(key)
+    if extension is None:
+        return None
+    digest = hashlib.sha256()
+    if current_app.config["USE_S3"]:
+        s3 = uploader().s3
+        bucket = current_app.config["S3_BUCKET_NAME"]
+        try:
+            body = s3.get_object(Bucket=bucket, Key=key)["Body"]
+        except ClientError:
+            return None
+        for chunk in body.iter_chunks(CHUNK_SIZE):
+            digest.update(chunk)
+        new_key = content_key(digest.hexdigest(), extension)
+        if not object_exists(new_key):
+            s3.copy_object(
+                Bucket=bucket,
+                Key=new_key,
+                CopySource={"Bucket": bucket, "Key": key},
+                ContentType=CONTENT_TYPES[extension],
+                MetadataDirective="REPLACE",
+            )
+    else:
+        folder = current_app.config["UPLOAD_FOLDER"]
+        path = os.path.join(folder, key)
+        try:
+            with open(path, "rb") as f:
+                while chunk := f.read(CHUNK_SIZE):
+                    digest.update(chunk)
+        except FileNotFoundError:
+            return None
+        new_key = content_key(digest.hexdigest(), extension)
+        if not object_exists(new_key):
+            incoming = incoming_path(folder)
+            shutil.copyfile(path, incoming)
+            os.replace(incoming, os.path.join(folder, new_key))
+    return stored_url(new_key)
+
+
+def content_address(batch_size=100):
+    """Rewrite legacy screenshot paths to content addresses.
+
+    Walks the distinct paths in batches, copies each object to the key of
+    its digest (merging duplicates), points entries and history rows at
+    it, then recounts references. The old objects and their derivatives
+    are deleted only after each batch commits, so run
+    ``backfill-derivatives`` afterwards. Returns ``(moved, missing)``.
+    """
+    moved = missing = 0
+    after = ""
+    while True:
+        urls = db.session.scalars(
+            select(Leaderboard.screenshot_path)
+            .distinct()
+            .where(Leaderboard.screenshot_path > after)
+            .order_by(Leaderboard.screenshot_path)
+            .limit(batch_size)
+        ).all()
+        if not urls:
+            break
+        after = urls[-1]
+        superseded = []
+        for url in urls:
+            key = key_from_url(url)
+            if is_content_key(key):
+                continue
+            new_url = rehash(url)
+            if new_url is None:
+                logger.warning("can't content-address %s", url)
+                missing += 1
+                continue
+            superseded += [key, *derivatives.derivative_keys(key)]
+            db.session.execute(
+                update(Leaderboard)
+                .where(Leaderboard.screenshot_path == url)
+                .values(screenshot_path=new_url, thumbnail_path=None, webp_path=None)
+            )
+            db.session.execute(
+                update(Submission)
+                .where(Submission.screenshot_path == url)
+                .values(screenshot_path=new_url)
+            )
+            moved += 1
+        db.session.commit()
+        # entries point at the copies now, the originals can go
+        if superseded:
+            delete_stored(superseded)
+    rebuild_references()
+    db.session.commit()
+    return moved, missing
+
+
+class Uploader:
+    """Bounded pool of threads moving spooled screenshots into the bucket.
+
+    Entries wait in ``uploading`` until their file lands, then flip to
+    ``done``; after the last retry they are marked ``failed`` and the spool
+    file is kept for ``flask resume-uploads``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.s3 = make_s3_client(app)
+        self.retries = app.config["UPLOAD_RETRIES"]
+        self.backoff = app.config["UPLOAD_RETRY_BACKOFF"]
+        self._executor = ThreadPoolExecutor(
+            max_workers=app.config["UPLOAD_WORKERS"],
+            thread_name_prefix="screenshot-upload",
+        )
+        self._slots = threading.BoundedSemaphore(app.config["UPLOAD_MAX_PENDING"])
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    def enqueue(self, pending):
+        """Queue an upload; False if the queue stayed full (left for resume)."""
+        if not self._slots.acquire(timeout=self.app.config["UPLOAD_QUEUE_TIMEOUT"]):
+            logger.warning("upload queue full, %s left in the spool", pending.key)
+            return False
+        future = self._executor.submit(self._run, pending)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._finished)
+        return True
+
+    def _finished(self, future):
+        with self._lock:
+            self._futures.discard(future)
+        self._slots.release()
+
+    def drain(self):
+        """Block until every queued upload has finished."""
+        while True:
+            with self._lock:
+                futures = list(self._futures)
+            if not futures:
+                return
+            for future in futures:
+                future.result()
+
+    def _run(self, pending):
+        with self.app.app_context():
+            status = "done" if self.upload(pending) else "failed"
+            set_upload_status(pending.url, status)
+            if status == "done":
+                derivatives.enqueue(pending.url)
+
+    def upload(self, pending):
+        """Send one spooled file, retrying with backoff. True on success."""
+        bucket = self.app.config["S3_BUCKET_NAME"]
+        for attempt in range(self.retries + 1):
+            try:
+                self.s3.upload_file(
+                    pending.spool_path,
+                    bucket,
+                    pending.key,
+                    ExtraArgs={"ContentType": pending.content_type},
+                )
+            except FileNotFoundError:
+                # an upload of the same bytes for another entry got there first
+                return object_exists(pending.key)
+            except Exception:
+                logger.exception("upload of %s failed (attempt %d)",
+                                 pending.key, attempt + 1)
+                if attempt < self.retries:
+                    time.sleep(self.backoff * 2 ** attempt)
+                continue
+            try:
+                os.remove(pending.spool_path)
+            except FileNotFoundError:
+                pass
+            return True
+        return False
+
+
+def set_upload_status(url, status):
+    # every entry sharing these bytes; one that moved to another proof is left
+    Leaderboard.query.filter_by(screenshot_path=url).update(
+        {"upload_status": status}
+    )
+    db.session.commit()
+
+
+def init_app(app):
+    if app.config["USE_S3"]:
+        os.makedirs(app.config["UPLOAD_SPOOL"], exist_ok=True)
+    app.extensions["uploader"] = Uploader(app)
+
+
+def uploader():
+    return current_app.extensions["uploader"]
+
+
+def resume():
+    """Retry every screenshot still sitting in the spool.
+
+    Returns ``(uploaded, failed)`` counts.
+    """
+    bucket_uploader = uploader()
+    spool = current_app.config["UPLOAD_SPOOL"]
+    uploaded = failed = 0
+    stuck = db.session.scalars(
+        select(Leaderboard.screenshot_path)
+        .distinct()
+        .where(Leaderboard.upload_status.in_(("uploading", "failed")))
+    ).all()
+    for url in stuck:
+        key = key_from_url(url)
+        spool_path = os.path.join(spool, key)
+        if not os.path.exists(spool_path):
+            continue
+        content_type = content_type_for(key) or "application/octet-stream"
+        pending = PendingUpload(key, spool_path, content_type, url)
+        ok = bucket_uploader.upload(pending)
+        set_upload_status(url, "done" if ok else "failed")
+        if ok:
+            derivatives.enqueue(url)
+            uploaded += 1
+        else:
+            failed += 1
+    return uploaded, failed
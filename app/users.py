@@ -0,0 +1,56 @@
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+
+from . import db, login_manager
+from .cache import TTLCache
+from .models import User
+
+# column values of logged-in users by id, so an authenticated request doesn't
+# cost a primary key lookup; this worker's own writes drop the entry, other
+# workers' copies age out (admin rights are re-checked, see admin_required)
+user_cache = TTLCache("users", maxsize=1024, ttl=300)
+
+COLUMNS = [column.key for column in User.__table__.columns]
+
+
+def user_row(user_id):
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    return {key: getattr(user, key) for key in COLUMNS}
+
+
+def load_user(user_id):
+    user_id = int(user_id)
+    row = user_cache.get_or_load(user_id, lambda: user_row(user_id))
+    if row is None:
+        return None
+    # attach a copy to this request's session without reading it back
+    user = User(**row)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+@event.listens_for(db.session, "after_flush")
+def note_changed_users(session, flush_context):
+    changed = session.info.setdefault("changed_users", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, User):
+            changed.add(obj.id)
+
+
+# dropping at flush would let another request cache the old row again
+# before this transaction commits
+@event.listens_for(db.session, "after_commit")
+def forget_changed_users(session):
+    for user_id in session.info.pop("changed_users", ()):
+        user_cache.pop(user_id)
+
+
+@event.listens_for(db.session, "after_rollback")
+def keep_unchanged_users(session):
+    session.info.pop("changed_users", None)
+
+
+def init_app(app):
+    login_manager.user_loader(load_user)
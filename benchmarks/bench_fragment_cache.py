@@ -0,0 +1,73 @@
+"""Leaderboard page render time with and without the standings fragment cache.
+
+Seeds one track with 10k verified entries in an in-memory SQLite database,
+then times GET /leaderboard/<track> for an anonymous viewer:
+
+* cold: fragment cache cleared before every request, so the top-10 table is
+  re-rendered each time (the standings data itself stays cached)
+* warm: fragment cache hit, only the page shell is rendered
+
+Run from the repo root: ``PYTHONPATH=. python benchmarks/bench_fragment_cache.py``
+"""
+import random
+import tempfile
+import time
+
+from app import create_app, db
+from app.models import Leaderboard, User
+from app.routes.main import fragment_cache
+
+TRACK = "Mario Kart Stadium"
+ENTRIES = 10_000
+REQUESTS = 500
+
+
+def seed():
+    users = [
+        User(username=f"racer{i}", password_hash="x") for i in range(ENTRIES)
+    ]
+    db.session.add_all(users)
+    db.session.flush()
+    for user in users:
+        entry = Leaderboard(
+            track=TRACK, user_id=user.id, screenshot_path="x", verified=True
+        )
+        entry.set_time(
+            random.randint(1, 2), random.randint(0, 59), random.randint(0, 999)
+        )
+        db.session.add(entry)
+    db.session.commit()
+
+
+def timed(client, clear):
+    url = f"/leaderboard/{TRACK}"
+    client.get(url)
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        if clear:
+            fragment_cache.clear()
+        client.get(url)
+    return (time.perf_counter() - start) / REQUESTS * 1000
+
+
+def main():
+    app = create_app({
+        "SECRET_KEY": "bench",
+        "SQLALCHEMY_DATABASE_URI": "sqlite://",
+        "UPLOAD_FOLDER": tempfile.mkdtemp(),
+    })
+    with app.app_context():
+        db.create_all()
+        seed()
+        client = app.test_client()
+        cold = timed(client, clear=True)
+        warm = timed(client, clear=False)
+
+    print(f"{ENTRIES} entries on {TRACK!r}, {REQUESTS} requests each")
+    print(f"fragment cache cold: {cold:.3f} ms/request")
+    print(f"fragment cache warm: {warm:.3f} ms/request")
+    print(f"saved: {cold - warm:.3f} ms/request ({(1 - warm / cold):.0%})")
+
+
+if __name__ == "__main__":
+    main()
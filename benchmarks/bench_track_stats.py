@@ -0,0 +1,96 @@
+"""Per-track stats from ORM rows versus the columnar snapshot.
+
+Seeds one track with 100k verified entries in an in-memory SQLite database,
+then times computing the stats summary and one viewer's percentile:
+
+* orm: load every entry as an ORM object and work it out in Python
+* snapshot build: read the one column into a NumPy array and summarize it,
+  what a request pays right after the track changes
+* snapshot warm: the cached snapshot, only the viewer's binary search
+
+Run from the repo root: ``PYTHONPATH=. python benchmarks/bench_track_stats.py``
+"""
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import insert
+
+from app import create_app, db
+from app.distribution import percentile_of, snapshot, snapshot_cache
+from app.models import Leaderboard, User
+
+TRACK = "Mario Kart Stadium"
+ENTRIES = 100_000
+ROUNDS = 5
+WARM_ROUNDS = 1000
+
+
+def seed():
+    db.session.execute(insert(User), [
+        {"username": f"racer{i}", "password_hash": "x"} for i in range(ENTRIES)
+    ])
+    rows = []
+    for user_id in range(1, ENTRIES + 1):
+        mins = random.randint(1, 2)
+        s, ms = random.randint(0, 59), random.randint(0, 999)
+        rows.append({
+            "track": TRACK,
+            "user_id": user_id,
+            "screenshot_path": "x",
+            "verified": True,
+            "time_mins": mins,
+            "time_s": s,
+            "time_ms": ms,
+            "total_ms": (mins * 60 + s) * 1000 + ms,
+        })
+    db.session.execute(insert(Leaderboard), rows)
+    db.session.commit()
+
+
+def orm_stats(total_ms):
+    entries = Leaderboard.query.filter_by(track=TRACK, verified=True).all()
+    times = sorted(e.total_ms for e in entries)
+    cuts = statistics.quantiles(times, n=100)
+    median = statistics.median(times)
+    no_faster = sum(1 for t in times if t >= total_ms)
+    db.session.expunge_all()
+    return median, cuts, no_faster / len(times)
+
+
+def snapshot_stats(total_ms):
+    found = snapshot(TRACK, version=0)
+    return found.summary, percentile_of(found.times, total_ms)
+
+
+def timed(action, rounds, before=None):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        if before is not None:
+            before()
+        action(95_000)
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main():
+    app = create_app({
+        "SECRET_KEY": "bench",
+        "SQLALCHEMY_DATABASE_URI": "sqlite://",
+        "UPLOAD_FOLDER": tempfile.mkdtemp(),
+    })
+    with app.app_context():
+        db.create_all()
+        seed()
+        orm = timed(orm_stats, ROUNDS)
+        build = timed(snapshot_stats, ROUNDS, before=snapshot_cache.clear)
+        warm = timed(snapshot_stats, WARM_ROUNDS)
+
+    print(f"{ENTRIES} verified entries on {TRACK!r}")
+    print(f"orm rows:        {orm:9.3f} ms/request")
+    print(f"snapshot build:  {build:9.3f} ms/request ({orm / build:.0f}x faster)")
+    print(f"snapshot warm:   {warm:9.3f} ms/request ({orm / warm:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
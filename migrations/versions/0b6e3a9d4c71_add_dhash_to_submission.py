@@ -0,0 +1,26 @@
+"""add dhash to submission
+
+Revision ID: 0b6e3a9d4c71
+Revises: f7b1d2c5e840
+Create Date: 2026-10-18 19:05:12.641870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b6e3a9d4c71'
+down_revision = 'f7b1d2c5e840'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('submission', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('dhash', sa.String(length=16), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('submission', schema=None) as batch_op:
+        batch_op.drop_column('dhash')
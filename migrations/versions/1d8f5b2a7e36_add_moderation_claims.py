@@ -0,0 +1,35 @@
+"""add moderation claims to leaderboard
+
+Revision ID: 1d8f5b2a7e36
+Revises: 0b6e3a9d4c71
+Create Date: 2026-10-18 20:14:36.582013
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1d8f5b2a7e36'
+down_revision = '0b6e3a9d4c71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('leaderboard', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('claimed_by', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('claimed_until', sa.DateTime(timezone=True),
+        nullable=True))
+        batch_op.create_foreign_key('fk_leaderboard_claimed_by', 'user',
+        ['claimed_by'], ['id'])
+        batch_op.create_index('ix_leaderboard_pending', ['id'], unique=False,
+        postgresql_where=sa.text('NOT verified'), sqlite_where=sa.text('NOT verified'))
+
+
+def downgrade():
+    with op.batch_alter_table('leaderboard', schema=None) as batch_op:
+        batch_op.drop_index('ix_leaderboard_pending')
+        batch_op.drop_constraint('fk_leaderboard_claimed_by', type_='foreignkey')
+        batch_op.drop_column('claimed_until')
+        batch_op.drop_column('claimed_by')
@@ -0,0 +1,39 @@
+"""add total_ms to leaderboard
+
+Revision ID: 3c9a1e5d7b20
+Revises: be4b460e19b9
+Create Date: 2026-10-18 10:12:41.530127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9a1e5d7b20'
+down_revision = 'be4b460e19b9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('leaderboard', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('total_ms', sa.Integer(), nullable=True))
+
+    # backfill from the split time columns before enforcing NOT NULL
+    op.execute(
+        "UPDATE leaderboard "
+        "SET total_ms = (time_mins * 60 + time_s) * 1000 + time_ms"
+    )
+
+    with op.batch_alter_table('leaderboard', schema=None) as batch_op:
+        batch_op.alter_column('total_ms', existing_type=sa.Integer(),
+        nullable=False)
+        batch_op.create_index('ix_leaderboard_track_verified_total_ms',
+        ['track', 'verified', 'total_ms'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('leaderboard', schema=None) as batch_op:
+        batch_op.drop_index('ix_leaderboard_track_verified_total_ms')
+        batch_op.drop_column('total_ms')
@@ -0,0 +1,38 @@
+"""add track stats and leaderboard suspicion
+
+Revision ID: 4a7c2e9f1b35
+Revises: 1d8f5b2a7e36
+Create Date: 2026-10-18 21:02:11.730418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a7c2e9f1b35'
+down_revision = '1d8f5b2a7e36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # populate afterwards with `flask rebuild-track-stats`, then score the
+    # existing queue with `flask rescore-pending`
+    op.create_table('track_stats',
+    sa.Column('track', sa.String(length=100), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('sum_log', sa.Float(), nullable=False),
+    sa.Column('sum_log_sq', sa.Float(), nullable=False),
+    sa.Column('best_ms', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('track')
+    )
+    with op.batch_alter_table('leaderboard', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('suspicion', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('leaderboard', schema=None) as batch_op:
+        batch_op.drop_column('suspicion')
+
+    op.drop_table('track_stats')
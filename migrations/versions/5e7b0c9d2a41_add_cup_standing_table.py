@@ -0,0 +1,37 @@
+"""add cup_standing table
+
+Revision ID: 5e7b0c9d2a41
+Revises: 8d2f64a1c3e9
+Create Date: 2026-10-18 14:36:52.104388
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e7b0c9d2a41'
+down_revision = '8d2f64a1c3e9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # populate afterwards with `flask rebuild-cups`
+    op.create_table('cup_standing',
+    sa.Column('cup', sa.String(length=50), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_ms', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('cup', 'user_id')
+    )
+    with op.batch_alter_table('cup_standing', schema=None) as batch_op:
+        batch_op.create_index('ix_cup_standing_cup_total_ms', ['cup', 'total_ms'],
+        unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('cup_standing', schema=None) as batch_op:
+        batch_op.drop_index('ix_cup_standing_cup_total_ms')
+
+    op.drop_table('cup_standing')
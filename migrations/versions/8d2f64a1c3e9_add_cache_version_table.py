@@ -0,0 +1,29 @@
+"""add cache_version table
+
+Revision ID: 8d2f64a1c3e9
+Revises: 3c9a1e5d7b20
+Create Date: 2026-10-18 11:04:17.882310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2f64a1c3e9'
+down_revision = '3c9a1e5d7b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cache_version',
+    sa.Column('key', sa.String(length=150), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('cache_version')
@@ -0,0 +1,44 @@
+"""add track_points and player_points tables
+
+Revision ID: a41c7e2f9b58
+Revises: 5e7b0c9d2a41
+Create Date: 2026-10-18 15:21:09.447615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41c7e2f9b58'
+down_revision = '5e7b0c9d2a41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # populate afterwards with `flask rebuild-points`
+    op.create_table('track_points',
+    sa.Column('track', sa.String(length=100), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('points', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('track', 'user_id')
+    )
+    op.create_table('player_points',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('points', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    with op.batch_alter_table('player_points', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_player_points_points'), ['points'],
+        unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('player_points', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_player_points_points'))
+
+    op.drop_table('player_points')
+    op.drop_table('track_points')
@@ -0,0 +1,91 @@
+"""add submission history
+
+Revision ID: c8e3f1a6d027
+Revises: a41c7e2f9b58
+Create Date: 2026-10-18 16:02:44.913520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e3f1a6d027'
+down_revision = 'a41c7e2f9b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('submission',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('track', sa.String(length=100), nullable=False),
+    sa.Column('time_mins', sa.Integer(), nullable=False),
+    sa.Column('time_s', sa.Integer(), nullable=False),
+    sa.Column('time_ms', sa.Integer(), nullable=False),
+    sa.Column('total_ms', sa.Integer(), nullable=False),
+    sa.Column('screenshot_path', sa.String(length=255), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('submitted_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('verified_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('was_record', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('submission', schema=None) as batch_op:
+        batch_op.create_index('ix_submission_user_track_submitted',
+        ['user_id', 'track', 'submitted_at'], unique=False)
+        batch_op.create_index('ix_submission_track_record',
+        ['track', 'verified_at'], unique=False,
+        postgresql_where=sa.text('was_record'), sqlite_where=sa.text('was_record'))
+
+    with op.batch_alter_table('leaderboard', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('submission_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_leaderboard_submission_id', 'submission',
+        ['submission_id'], ['id'])
+
+    # seed the history with every current entry; earlier times were
+    # overwritten in place and are gone. Each seeded row takes its entry's
+    # id, so entries link back by id even if a (user, track) pair repeats
+    op.execute(
+        "INSERT INTO submission (id, user_id, track, time_mins, time_s, "
+        "time_ms, total_ms, screenshot_path, status, submitted_at, "
+        "verified_at, was_record) "
+        "SELECT id, user_id, track, time_mins, time_s, time_ms, total_ms, "
+        "screenshot_path, "
+        "CASE WHEN verified THEN 'verified' ELSE 'pending' END, "
+        "CURRENT_TIMESTAMP, "
+        "CASE WHEN verified THEN CURRENT_TIMESTAMP END, "
+        "false "
+        "FROM leaderboard"
+    )
+    op.execute("UPDATE leaderboard SET submission_id = id")
+    if op.get_bind().dialect.name == 'postgresql':
+        # new submissions number on from the seeded ids
+        op.execute(
+            "SELECT setval(pg_get_serial_sequence('submission', 'id'), "
+            "COALESCE(MAX(id), 0) + 1, false) FROM submission"
+        )
+    # today's records are the only progression we know about
+    op.execute(
+        "UPDATE submission SET was_record = true WHERE id IN ("
+        "SELECT submission_id FROM ("
+        "SELECT submission_id, ROW_NUMBER() OVER ("
+        "PARTITION BY track ORDER BY total_ms, id) AS position "
+        "FROM leaderboard WHERE verified) AS ranked "
+        "WHERE position = 1)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('leaderboard', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_leaderboard_submission_id', type_='foreignkey')
+        batch_op.drop_column('submission_id')
+
+    with op.batch_alter_table('submission', schema=None) as batch_op:
+        batch_op.drop_index('ix_submission_track_record',
+        postgresql_where=sa.text('was_record'), sqlite_where=sa.text('was_record'))
+        batch_op.drop_index('ix_submission_user_track_submitted')
+
+    op.drop_table('submission')
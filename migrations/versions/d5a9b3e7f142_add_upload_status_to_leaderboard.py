@@ -0,0 +1,27 @@
+"""add upload_status to leaderboard
+
+Revision ID: d5a9b3e7f142
+Revises: c8e3f1a6d027
+Create Date: 2026-10-18 16:48:30.275906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a9b3e7f142'
+down_revision = 'c8e3f1a6d027'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('leaderboard', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('upload_status', sa.String(length=20),
+        nullable=False, server_default='done'))
+
+
+def downgrade():
+    with op.batch_alter_table('leaderboard', schema=None) as batch_op:
+        batch_op.drop_column('upload_status')
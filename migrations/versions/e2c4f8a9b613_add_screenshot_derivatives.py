@@ -0,0 +1,30 @@
+"""add screenshot derivative paths
+
+Revision ID: e2c4f8a9b613
+Revises: d5a9b3e7f142
+Create Date: 2026-10-18 17:32:04.518220
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2c4f8a9b613'
+down_revision = 'd5a9b3e7f142'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('leaderboard', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('thumbnail_path', sa.String(length=255),
+        nullable=True))
+        batch_op.add_column(sa.Column('webp_path', sa.String(length=255),
+        nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('leaderboard', schema=None) as batch_op:
+        batch_op.drop_column('webp_path')
+        batch_op.drop_column('thumbnail_path')
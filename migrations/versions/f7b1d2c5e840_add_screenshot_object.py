@@ -0,0 +1,28 @@
+"""add screenshot_object reference counts
+
+Revision ID: f7b1d2c5e840
+Revises: e2c4f8a9b613
+Create Date: 2026-10-18 18:21:47.093316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7b1d2c5e840'
+down_revision = 'e2c4f8a9b613'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('screenshot_object',
+    sa.Column('key', sa.String(length=255), nullable=False),
+    sa.Column('refs', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('screenshot_object')
@@ -23,13 +23,13 @@ with app.app_context():
         for track in tracks:
             entry = Leaderboard(
                 track=track,
-                time_mins=random.randint(1, 2),
-                time_s=random.randint(0, 59),
-                time_ms=random.randint(0, 999),
                 user_id=u.id,
                 verified=True,
                 screenshot_path=screenshot_path,
             )
+            entry.set_time(
+                random.randint(1, 2), random.randint(0, 59), random.randint(0, 999)
+            )
             db.session.add(entry)
 
     db.session.commit()
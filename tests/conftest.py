@@ -0,0 +1,83 @@
+import io
+
+import pytest
+from app import create_app, db, rank_index
+from app.cache import clear_caches
+from app.models import Leaderboard, User, bcrypt
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        "TESTING": True,
+        "SECRET_KEY": "test",
+        "SQLALCHEMY_DATABASE_URI": "sqlite://",
+        "UPLOAD_FOLDER": str(tmp_path / "uploads"),
+        "USE_S3": False,
+        "SCREENSHOT_DERIVATIVES": False,
+        "SCREENSHOT_HASHES": False,
+    })
+    clear_caches()
+    rank_index.clear()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    def _make_user(username, password="pw", is_admin=False):
+        user = User(username=username, is_admin=is_admin)
+        # cheap hash, the default work factor makes the suite crawl
+        user.password_hash = bcrypt.generate_password_hash(
+            password, rounds=4
+        ).decode("utf-8")
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return _make_user
+
+
+@pytest.fixture
+def make_entry(app):
+    def _make_entry(user, track, mins, s, ms, verified=True):
+        entry = Leaderboard(
+            track=track,
+            user_id=user.id,
+            screenshot_path="/static/uploads/proof.png",
+            verified=verified,
+        )
+        entry.set_time(mins, s, ms)
+        db.session.add(entry)
+        db.session.commit()
+        return entry
+    return _make_entry
+
+
+@pytest.fixture
+def login(client):
+    def _login(username, password="pw"):
+        return client.post(
+            "/login", data={"username": username, "password": password}
+        )
+    return _login
+
+
+@pytest.fixture
+def submit(client):
+    def _submit(track, mins, s, ms, screenshot=b"proof", filename="proof.png"):
+        return client.post("/submit", data={
+            "map_name": track,
+            "time_mins": mins,
+            "time_s": s,
+            "time_ms": ms,
+            "screenshot": (io.BytesIO(screenshot), filename),
+        }, content_type="multipart/form-data")
+    return _submit
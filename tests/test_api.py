@@ -0,0 +1,58 @@
+TRACK = "Mario Kart Stadium"
+
+
+def test_api_unknown_track_returns_json_404(client):
+    rv = client.get("/api/leaderboard/Not a Track")
+    assert rv.status_code == 404
+    assert rv.get_json()["error"] == "Unknown track"
+
+
+def test_api_rejects_malformed_cursor(client):
+    rv = client.get(f"/api/leaderboard/{TRACK}?after=nope")
+    assert rv.status_code == 400
+
+
+def test_api_pages_through_standings_with_cursor(client, make_user, make_entry):
+    for i in range(5):
+        make_entry(make_user(f"racer{i}"), TRACK, 1, 30, 4 - i)
+    make_entry(make_user("pending"), TRACK, 1, 0, 0, verified=False)
+
+    seen = []
+    url = f"/api/leaderboard/{TRACK}?limit=2"
+    while url:
+        page = client.get(url).get_json()
+        seen.extend((e["rank"], e["player"]) for e in page["entries"])
+        url = page["next"] and f"/api/leaderboard/{TRACK}?limit=2&after={page['next']}"
+
+    assert seen == [
+        (1, "racer4"), (2, "racer3"), (3, "racer2"), (4, "racer1"), (5, "racer0"),
+    ]
+
+
+def test_api_breaks_time_ties_by_entry_id(client, make_user, make_entry):
+    first = make_entry(make_user("first"), TRACK, 1, 30, 0)
+    make_entry(make_user("second"), TRACK, 1, 30, 0)
+
+    page = client.get(f"/api/leaderboard/{TRACK}?limit=1").get_json()
+    assert page["entries"][0]["id"] == first.id
+    page = client.get(
+        f"/api/leaderboard/{TRACK}?limit=1&after={page['next']}"
+    ).get_json()
+    assert page["entries"][0]["player"] == "second"
+    assert page["next"] is None
+
+
+def test_api_records_lists_best_verified_time_per_track(
+    client, make_user, make_entry
+):
+    fast, slow = make_user("fast"), make_user("slow")
+    make_entry(slow, TRACK, 1, 40, 0)
+    make_entry(fast, TRACK, 1, 30, 0)
+    make_entry(make_user("cheater"), TRACK, 0, 1, 0, verified=False)
+    make_entry(slow, "Water Park", 2, 0, 0)
+
+    records = client.get("/api/records").get_json()["records"]
+    assert len(records) == 96
+    assert records[TRACK]["player"] == "fast"
+    assert records["Water Park"]["time"] == "02:00:000"
+    assert records["Thwomp Ruins"] is None
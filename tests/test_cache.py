@@ -0,0 +1,123 @@
+import threading
+import time
+
+from app import db
+from app.cache import TTLCache, bump_version, get_version
+from app.standings import cached_top_times, standings_cache
+
+TRACK = "Mario Kart Stadium"
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache("test-lru", maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache("test-ttl", ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+
+def test_get_or_load_runs_loader_once_for_concurrent_misses():
+    cache = TTLCache("test-stampede")
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return "value"
+
+    threads = [
+        threading.Thread(target=cache.get_or_load, args=("k", loader))
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert cache.misses == 1 and cache.hits == 4
+
+
+def test_bump_version_increments(app):
+    assert get_version("track:x") == 0
+    bump_version("track:x")
+    bump_version("track:x")
+    db.session.commit()
+    assert get_version("track:x") == 2
+
+
+def test_verify_invalidates_cached_standings(
+    client, make_user, make_entry, login
+):
+    make_user("admin", is_admin=True)
+    entry = make_entry(make_user("racer"), TRACK, 1, 30, 0, verified=False)
+    assert cached_top_times(TRACK) == []
+    assert cached_top_times(TRACK) == []
+    assert standings_cache.hits == 1
+
+    login("admin")
+    client.post("/admin/claim")
+    client.post(f"/admin/verify/{entry.id}")
+    assert [s.username for s in cached_top_times(TRACK)] == ["racer"]
+
+
+def test_reject_of_pending_entry_keeps_cache(client, make_user, make_entry, login):
+    make_user("admin", is_admin=True)
+    entry = make_entry(make_user("racer"), TRACK, 1, 30, 0, verified=False)
+    login("admin")
+    client.post("/admin/claim")
+    client.post(f"/admin/reject/{entry.id}")
+    assert get_version(f"track:{TRACK}") == 0
+
+
+def test_records_query_uses_distinct_on_for_postgres():
+    from sqlalchemy.dialects import postgresql
+    from app.standings import records_query
+
+    sql = str(records_query("postgresql").compile(dialect=postgresql.dialect()))
+    assert "DISTINCT ON" in sql
+
+
+def test_records_version_only_moves_when_record_changes(
+    client, make_user, make_entry, login
+):
+    make_user("admin", is_admin=True)
+    make_entry(make_user("holder"), TRACK, 1, 30, 0)
+    slower = make_entry(make_user("slower"), TRACK, 1, 45, 0, verified=False)
+    faster = make_entry(make_user("faster"), TRACK, 1, 20, 0, verified=False)
+    login("admin")
+    client.post("/admin/claim")
+
+    client.post(f"/admin/verify/{slower.id}")
+    assert get_version("records") == 0
+    client.post(f"/admin/verify/{faster.id}")
+    assert get_version("records") == 1
+    client.post(f"/admin/reject/{faster.id}")
+    assert get_version("records") == 2
+
+
+def test_standings_fragment_is_reused_until_track_changes(
+    client, make_user, make_entry, login
+):
+    from app.routes.main import fragment_cache
+
+    make_user("admin", is_admin=True)
+    entry = make_entry(make_user("racer"), TRACK, 1, 30, 0, verified=False)
+    client.get(f"/leaderboard/{TRACK}")
+    client.get(f"/leaderboard/{TRACK}")
+    assert (fragment_cache.misses, fragment_cache.hits) == (1, 1)
+
+    login("admin")
+    client.post("/admin/claim")
+    client.post(f"/admin/verify/{entry.id}", follow_redirects=True)
+    body = client.get(f"/leaderboard/{TRACK}").get_data(as_text=True)
+    assert fragment_cache.misses == 2
+    assert "racer" in body
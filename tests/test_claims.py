@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import update
+
+from app import db, moderation
+from app.models import Leaderboard
+from app.tracks import CUPS
+
+TRACK = CUPS["Mushroom Cup"][0]
+
+
+def pending(make_user, make_entry, count):
+    racer = make_user("racer")
+    return [
+        make_entry(racer, TRACK, 1, 30, i, verified=False).id for i in range(count)
+    ]
+
+
+def claimed_ids(user_id):
+    return [e.id for e in moderation.my_claims(user_id)]
+
+
+def test_admins_claim_disjoint_batches(app, make_user, make_entry):
+    app.config["CLAIM_BATCH"] = 3
+    ids = pending(make_user, make_entry, 5)
+    first = make_user("first", is_admin=True).id
+    second = make_user("second", is_admin=True).id
+
+    assert [e.id for e in moderation.claim(first, 3)] == ids[:3]
+    assert [e.id for e in moderation.claim(second, 3)] == ids[3:]
+    # claiming again only renews, it doesn't take more
+    assert [e.id for e in moderation.claim(first, 3)] == ids[:3]
+
+
+def test_only_the_lease_holder_can_moderate(client, make_user, make_entry, login):
+    ids = pending(make_user, make_entry, 2)
+    make_user("holder", is_admin=True)
+    make_user("other", is_admin=True)
+    login("holder")
+    client.post("/admin/claim")
+    client.get("/logout")
+
+    login("other")
+    client.post(f"/admin/verify/{ids[0]}")
+    client.post(f"/admin/reject/{ids[1]}")
+    client.post("/admin/bulk/verify", data={"ids": ids})
+    db.session.expire_all()
+    assert Leaderboard.query.filter_by(verified=False).count() == 2
+    client.get("/logout")
+
+    login("holder")
+    client.post("/admin/bulk/verify", data={"ids": ids})
+    db.session.expire_all()
+    entries = Leaderboard.query.all()
+    assert all(e.verified and e.claimed_by is None for e in entries)
+
+
+def test_expired_lease_goes_back_to_the_queue(app, make_user, make_entry):
+    ids = pending(make_user, make_entry, 1)
+    first = make_user("first", is_admin=True).id
+    second = make_user("second", is_admin=True).id
+    moderation.claim(first, 1)
+    assert moderation.claim(second, 1) == []
+
+    db.session.execute(
+        update(Leaderboard).values(
+            claimed_until=datetime.now(timezone.utc) - timedelta(seconds=1)
+        )
+    )
+    db.session.commit()
+    assert claimed_ids(first) == []
+    assert [e.id for e in moderation.claim(second, 1)] == ids
+    assert moderation.verify_entries(ids, first) == ([], [])
+
+
+def test_release_hands_claims_back(app, make_user, make_entry):
+    ids = pending(make_user, make_entry, 2)
+    first = make_user("first", is_admin=True).id
+    second = make_user("second", is_admin=True).id
+    moderation.claim(first, 2)
+
+    assert moderation.release_claims(first) == 2
+    assert [e.id for e in moderation.claim(second, 2)] == ids
+
+
+def test_claim_skips_locked_rows_on_postgres():
+    from sqlalchemy.dialects import postgresql
+
+    query = moderation.claimable(datetime.now(timezone.utc), 10)
+    sql = str(query.compile(dialect=postgresql.dialect()))
+    assert "FOR UPDATE SKIP LOCKED" in sql
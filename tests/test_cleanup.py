@@ -0,0 +1,123 @@
+import os
+import time
+from datetime import datetime, timezone
+
+from app import db
+from app.models import Submission
+from app.cleanup import sweep
+from app.uploads import uploader
+
+DAY = 24 * 3600
+
+
+def store(app, name, age=DAY):
+    path = os.path.join(app.config["UPLOAD_FOLDER"], name)
+    with open(path, "wb") as f:
+        f.write(b"x" * 10)
+    then = time.time() - age
+    os.utime(path, (then, then))
+
+
+def stored(app):
+    return sorted(os.listdir(app.config["UPLOAD_FOLDER"]))
+
+
+def test_gc_deletes_only_old_unreferenced_objects(app, make_user, make_entry):
+    me = make_user("me")
+    entry = make_entry(me, "Mario Kart Stadium", 1, 40, 0)
+    entry.thumbnail_path = "/static/uploads/proof.thumb.webp"
+    db.session.commit()
+    for name in ["proof.png", "proof.thumb.webp", "orphan.png",
+                 ".incoming-stale", ".gitkeep"]:
+        store(app, name)
+    store(app, "just-uploaded.png", age=60)
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["gc-screenshots", "--dry-run"])
+    assert "would delete orphan.png" in result.output
+    assert "would delete .incoming-stale" in result.output
+    assert "2 orphaned. Would free 20 bytes" in result.output
+    assert len(stored(app)) == 6
+
+    result = runner.invoke(args=["gc-screenshots", "--batch-size", "2"])
+    assert "Scanned 5 objects, 2 orphaned. Freed 20 bytes" in result.output
+    assert stored(app) == [
+        ".gitkeep", "just-uploaded.png", "proof.png", "proof.thumb.webp"
+    ]
+
+
+def test_gc_refuses_when_entries_point_elsewhere(app, make_user, make_entry):
+    me = make_user("me")
+    entry = make_entry(me, "Mario Kart Stadium", 1, 40, 0)
+    entry.screenshot_path = "https://old-bucket.example/proof.png"
+    db.session.commit()
+    store(app, "orphan.png")
+
+    result = app.test_cli_runner().invoke(args=["gc-screenshots"])
+    assert result.exit_code != 0
+    assert stored(app) == ["orphan.png"]
+
+
+class PagedS3:
+    def __init__(self, keys):
+        self.keys = sorted(keys)
+        self.deleted = []
+        self.pages = 0
+
+    def get_paginator(self, operation):
+        assert operation == "list_objects_v2"
+        return self
+
+    def paginate(self, Bucket, PaginationConfig):
+        old = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        for i in range(0, len(self.keys), 2):
+            self.pages += 1
+            yield {"Contents": [
+                {"Key": key, "Size": 1, "LastModified": old}
+                for key in self.keys[i:i + 2]
+            ]}
+
+    def delete_objects(self, Bucket, Delete):
+        self.deleted.extend(obj["Key"] for obj in Delete["Objects"])
+
+
+def test_gc_pages_through_the_bucket(app, make_user, make_entry):
+    app.config.update(USE_S3=True, S3_BUCKET_NAME="proofs")
+    me = make_user("me")
+    entry = make_entry(me, "Mario Kart Stadium", 1, 40, 0)
+    entry.screenshot_path = "https://proofs.s3.us-west-2.amazonaws.com/b.png"
+    db.session.commit()
+    s3 = uploader().s3 = PagedS3(["a.png", "b.png", "c.png", "d.png", "e.png"])
+
+    batches = list(sweep(batch_size=2))
+    assert s3.pages == 3
+    assert [scanned for scanned, _ in batches] == [2, 2, 1]
+    assert s3.deleted == ["a.png", "c.png", "d.png", "e.png"]
+
+
+def history(user, path):
+    return Submission(
+        user_id=user.id, track="Mario Kart Stadium", time_mins=1, time_s=40,
+        time_ms=0, total_ms=100_000, screenshot_path=path, status="superseded",
+        submitted_at=datetime.now(timezone.utc),
+    )
+
+
+def test_gc_keeps_objects_only_the_history_uses(app, make_user):
+    db.session.add(history(make_user("me"), "/static/uploads/old-proof.png"))
+    db.session.commit()
+    store(app, "old-proof.png")
+    store(app, "orphan.png")
+
+    list(sweep())
+    assert stored(app) == ["old-proof.png"]
+
+
+def test_gc_refuses_when_history_points_elsewhere(app, make_user):
+    db.session.add(history(make_user("me"), "https://old-bucket.example/a.png"))
+    db.session.commit()
+    store(app, "orphan.png")
+
+    result = app.test_cli_runner().invoke(args=["gc-screenshots"])
+    assert result.exit_code != 0
+    assert stored(app) == ["orphan.png"]
@@ -0,0 +1,69 @@
+from app import cups, db
+from app.commands import rebuild_cups
+from app.models import CupStanding
+from app.tracks import CUPS
+
+MUSHROOM = CUPS["Mushroom Cup"]
+
+
+def enter_cup(make_entry, user, secs, verified=True):
+    return [
+        make_entry(user, track, 1, secs, 0, verified=verified)
+        for track in MUSHROOM
+    ]
+
+
+def test_cup_totals_only_count_players_with_all_four_tracks(make_user, make_entry):
+    enter_cup(make_entry, make_user("full"), 30)
+    partial = make_user("partial")
+    for track in MUSHROOM[:3]:
+        make_entry(partial, track, 1, 0, 0)
+
+    rows = db.session.execute(cups.cup_totals()).all()
+    assert [(r.cup, r.total_ms) for r in rows] == [("Mushroom Cup", 4 * 90_000)]
+
+
+def test_rebuild_cli_matches_incremental_updates(
+    app, client, make_user, make_entry, login
+):
+    enter_cup(make_entry, make_user("fast"), 20)
+    slow = make_user("slow")
+    *done, last = enter_cup(make_entry, slow, 40, verified=False)
+    for entry in done:
+        entry.verified = True
+    db.session.commit()
+
+    make_user("admin", is_admin=True)
+    login("admin")
+    client.post("/admin/claim")
+    assert client.get("/api/cup/Mushroom Cup").get_json()["standings"] == []
+
+    client.post(f"/admin/verify/{last.id}")
+    incremental = {(s.cup, s.user_id, s.total_ms) for s in CupStanding.query}
+    assert len(incremental) == 1
+
+    result = app.test_cli_runner().invoke(rebuild_cups)
+    assert "Rebuilt 2 cup standings" in result.output
+    standings = client.get("/api/cup/Mushroom Cup").get_json()["standings"]
+    assert [(s["rank"], s["player"]) for s in standings] == [(1, "fast"), (2, "slow")]
+    assert incremental < {(s.cup, s.user_id, s.total_ms) for s in CupStanding.query}
+
+
+def test_rejecting_a_verified_time_drops_the_cup_standing(
+    client, make_user, make_entry, login
+):
+    entries = enter_cup(make_entry, make_user("racer"), 30)
+    cups.refresh_player(MUSHROOM[0], entries[0].user_id)
+    db.session.commit()
+    assert CupStanding.query.count() == 1
+
+    make_user("admin", is_admin=True)
+    login("admin")
+    client.post("/admin/claim")
+    client.post(f"/admin/reject/{entries[0].id}")
+    assert CupStanding.query.count() == 0
+
+
+def test_cup_page_renders(client):
+    assert client.get("/cup/Mushroom Cup").status_code == 200
+    assert client.get("/cup/Nope Cup").status_code == 404
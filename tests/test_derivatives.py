@@ -0,0 +1,79 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+from app import db
+from app.derivatives import renderer
+from app.models import Leaderboard
+
+TRACK = "Mario Kart Stadium"
+
+
+def png(size=(1280, 720)):
+    out = io.BytesIO()
+    Image.new("RGB", size, "red").save(out, "PNG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def derivatives_on(app):
+    app.config["SCREENSHOT_DERIVATIVES"] = True
+    yield
+    renderer().shutdown()
+
+
+def stored(app, path):
+    return os.path.join(app.config["UPLOAD_FOLDER"], path.rsplit("/", 1)[-1])
+
+
+def test_submitted_screenshot_gets_thumbnail_and_webp(
+    app, client, derivatives_on, make_user, login, submit
+):
+    make_user("admin", is_admin=True)
+    make_user("me")
+    login("me")
+    submit(TRACK, 1, 40, 0, screenshot=png())
+    renderer().drain()
+
+    db.session.expire_all()
+    entry = Leaderboard.query.one()
+    with Image.open(stored(app, entry.thumbnail_path)) as thumbnail:
+        assert thumbnail.format == "WEBP"
+        assert thumbnail.size == (320, 180)
+    with Image.open(stored(app, entry.webp_path)) as webp:
+        assert webp.size == (1280, 720)
+
+    client.get("/logout")
+    login("admin")
+    client.post("/admin/claim")
+    page = client.get("/admin/pending").get_data(as_text=True)
+    assert f'<img src="{entry.thumbnail_path}"' in page
+
+
+def test_unreadable_screenshot_keeps_the_plain_link(
+    app, derivatives_on, make_user, login, submit
+):
+    make_user("me")
+    login("me")
+    submit(TRACK, 1, 40, 0, screenshot=b"not an image")
+    renderer().drain()
+
+    db.session.expire_all()
+    assert Leaderboard.query.one().thumbnail_path is None
+
+
+def test_backfill_command(app, make_user, make_entry):
+    me = make_user("me")
+    for i, data in enumerate([png(), b"broken"]):
+        entry = make_entry(me, f"Track {i}", 1, 40, 0)
+        entry.screenshot_path = f"/static/uploads/{i}_proof.png"
+        with open(stored(app, entry.screenshot_path), "wb") as f:
+            f.write(data)
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=["backfill-derivatives"])
+    renderer().shutdown()
+    assert "Made derivatives for 1 screenshots, 1 failed" in result.output
+    made = Leaderboard.query.filter(Leaderboard.thumbnail_path.isnot(None)).one()
+    assert made.webp_path == "/static/uploads/0_proof.webp"
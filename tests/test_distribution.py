@@ -0,0 +1,63 @@
+from app.distribution import percentile_of, snapshot_cache
+
+TRACK = "Mario Kart Stadium"
+
+
+def seed(make_user, make_entry):
+    # 1:30.000, 1:31.000 ... 1:39.000
+    return [make_entry(make_user(f"racer{i}"), TRACK, 1, 30 + i, 0) for i in range(10)]
+
+
+def test_stats_summarize_verified_times(client, make_user, make_entry):
+    seed(make_user, make_entry)
+    make_entry(make_user("pending"), TRACK, 0, 1, 0, verified=False)
+
+    stats = client.get(f"/api/leaderboard/{TRACK}/stats").get_json()
+    assert stats["count"] == 10
+    assert stats["best_ms"] == 90_000
+    assert stats["median_ms"] == 94_500
+    assert stats["percentiles"]["p25"] == 92_250
+    histogram = stats["histogram"]
+    assert len(histogram["counts"]) == len(histogram["edges_ms"]) - 1
+    assert sum(histogram["counts"]) + histogram["slower"] == 10
+    assert histogram["slower"] == 1
+    assert stats["you"] is None
+
+
+def test_stats_include_the_viewers_percentile(client, make_user, make_entry, login):
+    seed(make_user, make_entry)
+    login("racer0")
+    you = client.get(f"/api/leaderboard/{TRACK}/stats").get_json()["you"]
+    assert you == {"total_ms": 90_000, "percentile": 100.0}
+
+    client.get("/logout")
+    login("racer7")
+    you = client.get(f"/api/leaderboard/{TRACK}/stats").get_json()["you"]
+    assert you["percentile"] == 30.0
+
+
+def test_snapshot_is_rebuilt_only_when_the_track_changes(
+    client, make_user, make_entry, login
+):
+    seed(make_user, make_entry)
+    make_user("admin", is_admin=True)
+    entry = make_entry(make_user("late"), TRACK, 1, 20, 0, verified=False)
+
+    misses, hits = snapshot_cache.misses, snapshot_cache.hits
+    client.get(f"/api/leaderboard/{TRACK}/stats")
+    client.get(f"/api/leaderboard/{TRACK}/stats")
+    assert (snapshot_cache.misses - misses, snapshot_cache.hits - hits) == (1, 1)
+
+    login("admin")
+    client.post("/admin/claim")
+    client.post(f"/admin/verify/{entry.id}")
+    client.get("/logout")
+    stats = client.get(f"/api/leaderboard/{TRACK}/stats").get_json()
+    assert snapshot_cache.misses - misses == 2
+    assert (stats["count"], stats["best_ms"]) == (11, 80_000)
+
+
+def test_empty_track_has_no_distribution(client):
+    stats = client.get(f"/api/leaderboard/{TRACK}/stats").get_json()
+    assert stats["count"] == 0
+    assert percentile_of([], 90_000) is None
@@ -0,0 +1,89 @@
+from app.events import LocalBroker
+
+TRACK = "Mario Kart Stadium"
+
+
+def test_local_broker_delivers_only_to_track_subscribers():
+    broker = LocalBroker()
+    watching = broker.subscribe(TRACK)
+    elsewhere = broker.subscribe("Water Park")
+    broker.publish(TRACK, {"type": "added"})
+    assert watching.get_nowait() == {"type": "added"}
+    assert elsewhere.empty()
+
+
+def test_local_broker_caps_subscribers():
+    broker = LocalBroker(max_subscribers=1)
+    events = broker.subscribe(TRACK)
+    assert broker.subscribe(TRACK) is None
+    broker.unsubscribe(TRACK, events)
+    assert broker.subscribe(TRACK) is not None
+
+
+def test_slow_subscriber_is_told_to_resync():
+    broker = LocalBroker(queue_size=1)
+    events = broker.subscribe(TRACK)
+    broker.publish(TRACK, {"type": "added"})
+    broker.publish(TRACK, {"type": "added"})
+    assert events.get_nowait() == {"type": "resync"}
+
+
+def test_verify_publishes_added_diff(app, client, make_user, make_entry, login):
+    make_user("admin", is_admin=True)
+    make_entry(make_user("leader"), TRACK, 1, 20, 0)
+    entry = make_entry(make_user("racer"), TRACK, 1, 30, 0, verified=False)
+    events = app.extensions["events"].subscribe(TRACK)
+
+    login("admin")
+    client.post("/admin/claim")
+    client.post(f"/admin/verify/{entry.id}")
+    event = events.get_nowait()
+    assert event["type"] == "added"
+    assert event["entry"]["player"] == "racer"
+    assert event["entry"]["rank"] == 2
+    assert event["shift"] == {"from": 2, "by": 1}
+
+
+def test_reject_of_verified_entry_publishes_removed_diff(
+    app, client, make_user, make_entry, login
+):
+    make_user("admin", is_admin=True)
+    entry = make_entry(make_user("racer"), TRACK, 1, 30, 0)
+    events = app.extensions["events"].subscribe(TRACK)
+
+    login("admin")
+    client.post("/admin/claim")
+    client.post(f"/admin/reject/{entry.id}")
+    assert events.get_nowait() == {
+        "type": "removed", "id": entry.id, "shift": {"from": 2, "by": -1},
+    }
+
+
+def test_event_stream_sends_heartbeats_and_events(app, client):
+    app.config["SSE_HEARTBEAT_SECONDS"] = 0.01
+    rv = client.get(f"/api/leaderboard/{TRACK}/events", buffered=False)
+    assert rv.mimetype == "text/event-stream"
+    body = iter(rv.response)
+    assert next(body) == b"retry: 5000\n\n"
+    assert next(body) == b": heartbeat\n\n"
+
+    app.extensions["events"].publish(TRACK, {"type": "resync"})
+    assert next(body) == b'event: resync\ndata: {"type": "resync"}\n\n'
+    rv.close()
+    assert app.extensions["events"].subscriber_count() == 0
+
+
+def test_unread_event_streams_give_their_slot_back(app, client):
+    for _ in range(3):
+        rv = client.head(f"/api/leaderboard/{TRACK}/events")
+        assert rv.status_code == 200
+        # what the server does with a body it never sends
+        rv.close()
+    assert app.extensions["events"].subscriber_count() == 0
+
+
+def test_event_stream_refuses_past_subscriber_cap(app, client):
+    app.extensions["events"].max_subscribers = 0
+    rv = client.get(f"/api/leaderboard/{TRACK}/events")
+    assert rv.status_code == 503
+    assert rv.headers["Retry-After"] == "30"
@@ -0,0 +1,62 @@
+import csv
+import io
+import json
+
+from app.commands import export_times
+
+TRACK = "Mario Kart Stadium"
+
+
+def seed(make_user, make_entry):
+    racer = make_user("racer")
+    make_entry(racer, TRACK, 1, 30, 5)
+    make_entry(racer, "Toad Harbor", 2, 0, 0)
+    make_entry(make_user("pending"), TRACK, 1, 0, 0, verified=False)
+
+
+def test_export_requires_admin(client, make_user, login):
+    make_user("me")
+    login("me")
+    assert client.get("/admin/export").status_code == 403
+
+
+def test_admin_csv_export_streams_verified_rows(
+    client, make_user, make_entry, login
+):
+    seed(make_user, make_entry)
+    make_user("admin", is_admin=True)
+    login("admin")
+
+    rv = client.get("/admin/export?format=csv")
+    assert rv.mimetype == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(rv.get_data(as_text=True))))
+    assert [(r["player"], r["track"]) for r in rows] == [
+        ("racer", TRACK), ("racer", "Toad Harbor"),
+    ]
+    assert rows[0]["total_ms"] == "90005"
+
+
+def test_admin_ndjson_export_filters_by_cup(client, make_user, make_entry, login):
+    seed(make_user, make_entry)
+    make_user("admin", is_admin=True)
+    login("admin")
+
+    rv = client.get("/admin/export?format=ndjson&cup=Flower Cup")
+    rows = [json.loads(line) for line in rv.get_data(as_text=True).splitlines()]
+    assert [r["track"] for r in rows] == ["Toad Harbor"]
+
+
+def test_admin_export_rejects_unknown_cup(client, make_user, login):
+    make_user("admin", is_admin=True)
+    login("admin")
+    assert client.get("/admin/export?cup=Nope").status_code == 400
+
+
+def test_export_cli_writes_ndjson(app, make_user, make_entry):
+    seed(make_user, make_entry)
+    result = app.test_cli_runner().invoke(
+        export_times, ["--format", "ndjson", "--track", TRACK]
+    )
+    assert result.exit_code == 0
+    rows = [json.loads(line) for line in result.output.splitlines()]
+    assert [r["player"] for r in rows] == ["racer"]
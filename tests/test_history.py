@@ -0,0 +1,58 @@
+from app.models import Leaderboard, Submission
+
+TRACK = "Mario Kart Stadium"
+
+
+def test_resubmitting_keeps_every_time_in_history(
+    client, make_user, login, submit
+):
+    me = make_user("me")
+    login("me")
+    submit(TRACK, 1, 40, 0)
+    submit(TRACK, 1, 35, 0)
+
+    entry = Leaderboard.query.filter_by(user_id=me.id).one()
+    assert entry.total_ms == 95_000
+    assert entry.submission.total_ms == 95_000
+
+    data = client.get(f"/api/player/me/history/{TRACK}").get_json()
+    assert [(s["time"], s["status"]) for s in data["submissions"]] == [
+        ("01:40:000", "superseded"), ("01:35:000", "pending"),
+    ]
+
+
+def test_record_progression_lists_record_setting_verifications(
+    client, make_user, login, submit
+):
+    make_user("admin", is_admin=True)
+    for name, secs in [("first", 40), ("slower", 45), ("second", 30)]:
+        make_user(name)
+        login(name)
+        submit(TRACK, 1, secs, 0)
+        client.get("/logout")
+
+    login("admin")
+    client.post("/admin/claim")
+    for entry in Leaderboard.query.order_by(Leaderboard.id):
+        client.post(f"/admin/verify/{entry.id}")
+
+    records = client.get(f"/api/leaderboard/{TRACK}/history").get_json()["records"]
+    assert [(r["player"], r["time"]) for r in records] == [
+        ("first", "01:40:000"), ("second", "01:30:000"),
+    ]
+
+
+def test_reject_keeps_the_submission_as_rejected(
+    client, make_user, login, submit
+):
+    make_user("admin", is_admin=True)
+    make_user("me")
+    login("me")
+    submit(TRACK, 1, 40, 0)
+    entry = Leaderboard.query.one()
+
+    login("admin")
+    client.post("/admin/claim")
+    client.post(f"/admin/reject/{entry.id}")
+    assert Leaderboard.query.count() == 0
+    assert Submission.query.one().status == "rejected"
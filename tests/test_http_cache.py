@@ -0,0 +1,69 @@
+from sqlalchemy import event
+
+from app import db
+
+TRACK = "Mario Kart Stadium"
+
+
+def test_anonymous_leaderboard_is_publicly_cacheable(client):
+    rv = client.get(f"/leaderboard/{TRACK}")
+    assert rv.headers["ETag"]
+    assert "public" in rv.headers["Cache-Control"]
+    assert "max-age=30" in rv.headers["Cache-Control"]
+
+
+def test_if_none_match_returns_304_without_ranking_queries(
+    client, make_user, make_entry
+):
+    make_entry(make_user("racer"), TRACK, 1, 30, 0)
+    etag = client.get(f"/leaderboard/{TRACK}").headers["ETag"]
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        rv = client.get(f"/leaderboard/{TRACK}", headers={"If-None-Match": etag})
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+    assert rv.status_code == 304
+    assert len(statements) == 1
+    assert "cache_version" in statements[0]
+
+
+def test_etag_changes_after_verify(client, make_user, make_entry, login):
+    before = client.get(f"/leaderboard/{TRACK}").headers["ETag"]
+    make_user("admin", is_admin=True)
+    entry = make_entry(make_user("racer"), TRACK, 1, 30, 0, verified=False)
+    login("admin")
+    client.post("/admin/claim")
+    client.post(f"/admin/verify/{entry.id}")
+    client.get("/logout")
+
+    rv = client.get(f"/leaderboard/{TRACK}", headers={"If-None-Match": before})
+    assert rv.status_code == 200
+    assert "racer" in rv.get_data(as_text=True)
+
+
+def test_if_modified_since_returns_304(client, make_user, make_entry, login):
+    make_user("admin", is_admin=True)
+    entry = make_entry(make_user("racer"), TRACK, 1, 30, 0, verified=False)
+    login("admin")
+    client.post("/admin/claim")
+    client.post(f"/admin/verify/{entry.id}", follow_redirects=True)
+
+    last_modified = client.get(f"/api/leaderboard/{TRACK}").headers["Last-Modified"]
+    rv = client.get(
+        f"/api/leaderboard/{TRACK}", headers={"If-Modified-Since": last_modified}
+    )
+    assert rv.status_code == 304
+
+
+def test_logged_in_pages_are_private(client, make_user, login):
+    make_user("me")
+    login("me")
+    rv = client.get(f"/leaderboard/{TRACK}")
+    assert "private" in rv.headers["Cache-Control"]
+    assert rv.headers["ETag"].startswith("W/")
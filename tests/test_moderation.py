@@ -0,0 +1,161 @@
+from flask import g
+from sqlalchemy import event
+
+from app import cups, db, points
+from app.models import CupStanding, Leaderboard, PlayerPoints, Submission
+from app.routes import admin as admin_routes
+from app.tracks import CUPS
+
+MUSHROOM = CUPS["Mushroom Cup"]
+TRACK = MUSHROOM[0]
+
+
+def statements_during(action):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    # the test app context outlives requests; drop what it remembers
+    db.session.expunge_all()
+    g.pop("_login_user", None)
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        action()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    return statements
+
+
+def test_pending_queue_pages_by_id_with_constant_queries(
+    app, client, make_user, make_entry, login, monkeypatch
+):
+    monkeypatch.setattr(admin_routes, "PENDING_PAGE_SIZE", 2)
+    make_user("admin", is_admin=True)
+    entries = [
+        make_entry(make_user(f"racer{i}"), TRACK, 1, 30, i, verified=False)
+        for i in range(3)
+    ]
+    login("admin")
+
+    first = client.get("/admin/pending").get_data(as_text=True)
+    assert "racer0" in first and "racer1" in first and "racer2" not in first
+    assert f"after={entries[1].id}" in first
+
+    second = client.get(f"/admin/pending?after={entries[1].id}")
+    page = second.get_data(as_text=True)
+    assert "racer2" in page and "racer1" not in page
+    assert "Next page" not in page
+
+    # with the logged-in user cached
+    statements_during(lambda: client.get("/admin/pending"))
+    few = statements_during(lambda: client.get("/admin/pending"))
+    for i in range(3, 8):
+        make_entry(make_user(f"racer{i}"), TRACK, 1, 30, i, verified=False)
+    monkeypatch.setattr(admin_routes, "PENDING_PAGE_SIZE", 6)
+    many = statements_during(lambda: client.get("/admin/pending"))
+    assert len(many) == len(few)
+
+
+def test_bulk_verify_is_one_update_and_refreshes_each_track_once(
+    app, client, make_user, make_entry, login
+):
+    make_user("admin", is_admin=True)
+    racers = [make_user(f"racer{i}") for i in range(4)]
+    for racer in racers[:2]:
+        for track in MUSHROOM:
+            make_entry(racer, track, 1, 40, 0)
+    cups.rebuild()
+    points.rebuild()
+    db.session.commit()
+
+    pending = [
+        make_entry(racers[2], TRACK, 1, 30, 0, verified=False),
+        make_entry(racers[3], TRACK, 1, 35, 0, verified=False),
+        make_entry(racers[3], MUSHROOM[1], 1, 35, 0, verified=False),
+    ]
+    for entry in pending:
+        entry.submission = Submission(
+            user_id=entry.user_id, track=entry.track, time_mins=1, time_s=30,
+            time_ms=0, total_ms=entry.total_ms, status="pending",
+            screenshot_path=entry.screenshot_path, submitted_at=db.func.now(),
+        )
+    db.session.commit()
+    ids = [e.id for e in pending]
+    fast, slow = racers[2].id, racers[3].id
+    login("admin")
+    client.post("/admin/claim")
+
+    statements = statements_during(
+        lambda: client.post("/admin/bulk/verify", data={"ids": ids})
+    )
+    updates = [s for s in statements if s.startswith("UPDATE leaderboard")]
+    assert len(updates) == 1
+
+    db.session.expire_all()
+    assert Leaderboard.query.filter_by(verified=False).count() == 0
+    records = Submission.query.filter_by(was_record=True).all()
+    # the slower of the two new Mario Kart Stadium times never held the record
+    assert {(s.track, s.user_id) for s in records} == {
+        (TRACK, fast), (MUSHROOM[1], slow)
+    }
+    awarded = dict(db.session.query(PlayerPoints.user_id, PlayerPoints.points))
+    assert awarded[fast] == 15
+    assert awarded[slow] == 12 + 15
+    assert CupStanding.query.count() == 2
+
+
+def test_bulk_reject_deletes_the_selection_in_one_statement(
+    app, client, make_user, make_entry, login
+):
+    make_user("admin", is_admin=True)
+    verified = make_entry(make_user("fast"), TRACK, 1, 20, 0)
+    pending = make_entry(make_user("slow"), TRACK, 1, 50, 0, verified=False)
+    kept = make_entry(make_user("kept"), TRACK, 1, 30, 0)
+    points.rebuild()
+    db.session.commit()
+    ids, kept_id = [verified.id, pending.id], kept.id
+    login("admin")
+    client.post("/admin/claim")
+
+    statements = statements_during(
+        lambda: client.post("/admin/bulk/reject", data={"ids": ids})
+    )
+    deletes = [s for s in statements if s.startswith("DELETE FROM leaderboard")]
+    assert len(deletes) == 1
+
+    assert [e.id for e in Leaderboard.query] == [kept_id]
+    assert dict(db.session.query(PlayerPoints.user_id, PlayerPoints.points)) == {
+        Leaderboard.query.one().user_id: 15
+    }
+
+
+def test_writes_bump_tracks_then_records_then_players(
+    client, make_user, make_entry, login, submit, monkeypatch
+):
+    from app import standings
+
+    bumped = []
+    bump = standings.bump_version
+
+    def recording(key):
+        bumped.append(key.split(":")[0])
+        return bump(key)
+
+    monkeypatch.setattr(standings, "bump_version", recording)
+    make_user("admin", is_admin=True)
+    racer = make_user("racer")
+    ids = [
+        make_entry(racer, track, 1, 30, 0, verified=False).id
+        for track in MUSHROOM[:2]
+    ]
+    login("admin")
+    client.post("/admin/claim")
+    client.post("/admin/bulk/verify", data={"ids": ids})
+    assert bumped == ["track", "track", "records", "user"]
+
+    bumped.clear()
+    client.get("/logout")
+    login("racer")
+    submit(TRACK, 1, 25, 0)
+    assert bumped == ["track", "records", "user"]
@@ -0,0 +1,138 @@
+import io
+import random
+
+from PIL import Image
+from app import db
+from app.derivatives import renderer
+from app.models import Leaderboard, Submission
+from app.phash import BKTree, dhash, distance
+
+TRACK = "Mario Kart Stadium"
+
+
+def noise(seed, size=(320, 180)):
+    rng = random.Random(seed)
+    image = Image.new("L", (16, 9))
+    image.putdata([rng.randrange(256) for _ in range(16 * 9)])
+    return image.resize(size).convert("RGB")
+
+
+def encode(image, fmt="PNG", **options):
+    out = io.BytesIO()
+    image.save(out, fmt, **options)
+    return out.getvalue()
+
+
+def test_dhash_survives_rescaling_and_recompression():
+    original = noise(1, (1280, 720))
+    resaved = Image.open(io.BytesIO(encode(original.resize((640, 360)), "JPEG",
+                                           quality=60)))
+    a, b = int(dhash(original), 16), int(dhash(resaved), 16)
+    assert distance(a, b) <= 6
+    assert distance(a, int(dhash(noise(2)), 16)) > 6
+
+
+def test_bk_tree_search_matches_a_linear_scan():
+    rng = random.Random(0)
+    values = [rng.getrandbits(64) for _ in range(500)]
+    tree = BKTree()
+    for i, value in enumerate(values):
+        tree.add(value, i)
+
+    probe = values[42] ^ 0b1011  # three bits off
+    expected = sorted(
+        (distance(probe, value), i) for i, value in enumerate(values)
+        if distance(probe, value) <= 12
+    )
+    assert sorted(tree.search(probe, 12)) == expected
+    assert tree.search(probe, 3)[0] == (3, 42)
+
+
+def test_pending_page_flags_a_reused_screenshot(
+    app, client, make_user, login, submit
+):
+    app.config["SCREENSHOT_DERIVATIVES"] = True
+    make_user("admin", is_admin=True)
+    proof = noise(7, (1280, 720))
+    for name, data in [("honest", encode(proof)),
+                       ("copycat", encode(proof, "JPEG", quality=70))]:
+        make_user(name)
+        login(name)
+        submit(TRACK, 1, 40, 0, screenshot=data,
+               filename="proof.png" if name == "honest" else "proof.jpg")
+        client.get("/logout")
+    renderer().shutdown()
+
+    db.session.expire_all()
+    assert Submission.query.filter(Submission.dhash.isnot(None)).count() == 2
+
+    login("admin")
+    client.post("/admin/claim")
+    page = client.get("/admin/pending").get_data(as_text=True)
+    honest, copycat = Leaderboard.query.order_by(Leaderboard.id)
+    assert f"Looks like #{honest.submission_id}: honest" in page
+    assert f"Looks like #{copycat.submission_id}: copycat" in page
+
+
+def test_uploads_are_hashed_without_derivatives(
+    app, make_user, login, submit
+):
+    app.config["SCREENSHOT_HASHES"] = True
+    make_user("me")
+    login("me")
+    submit(TRACK, 1, 40, 0, screenshot=encode(noise(3)))
+    renderer().shutdown()
+
+    db.session.expire_all()
+    assert Submission.query.one().dhash == dhash(noise(3))
+    assert Leaderboard.query.one().thumbnail_path is None
+
+
+def test_hash_command_backfills_history(
+    app, client, make_user, login, submit
+):
+    for seed, name in enumerate(["first", "second", "broken"]):
+        make_user(name)
+        login(name)
+        data = b"not an image" if name == "broken" else encode(noise(seed))
+        submit(TRACK, 1, 40, 0, screenshot=data)
+        client.get("/logout")
+
+    result = app.test_cli_runner().invoke(args=["hash-screenshots"])
+    renderer().shutdown()
+    assert "Hashed 2 screenshots, 1 unreadable" in result.output
+    assert Submission.query.filter(Submission.dhash.isnot(None)).count() == 2
+
+
+def test_new_hashes_are_added_to_the_cached_tree_without_a_rebuild(make_user):
+    from datetime import datetime, timedelta, timezone
+
+    from app.phash import cached_index, index_cache, store_hash
+
+    user = make_user("racer")
+    now = datetime.now(timezone.utc)
+
+    def submission(path, value=None, age=timedelta()):
+        row = Submission(
+            user_id=user.id, track=TRACK, time_mins=1, time_s=30, time_ms=0,
+            total_ms=90_000, screenshot_path=path, dhash=value,
+            submitted_at=now - age,
+        )
+        db.session.add(row)
+        db.session.commit()
+        return row.id
+
+    hashed = submission("/a.png", "00000000000000ff")
+    stale = submission("/lost.png", age=timedelta(days=2))
+    waiting = submission("/b.png")
+    assert [i for _, i in cached_index().search(0xFF, 0)] == [hashed]
+    misses = index_cache.misses
+
+    assert store_hash("/b.png", "00000000000000fe") == 1
+    db.session.commit()
+    assert sorted(i for _, i in cached_index().search(0xFF, 1)) == [hashed, waiting]
+    assert index_cache.misses == misses
+
+    index = index_cache.get(0)
+    assert index.watermark == waiting > stale
+    assert store_hash("/b.png", "0000000000000000") == 0
@@ -0,0 +1,57 @@
+TRACK = "Mario Kart Stadium"
+
+
+def seed(make_user, make_entry):
+    me, rival = make_user("me"), make_user("rival")
+    make_entry(rival, TRACK, 1, 20, 0)
+    make_entry(me, TRACK, 1, 30, 0)
+    make_entry(me, "Water Park", 1, 10, 0)
+    make_entry(rival, "Water Park", 1, 15, 0)
+    make_entry(make_user("third"), "Water Park", 1, 50, 0)
+    make_entry(me, "Toad Harbor", 1, 0, 0, verified=False)
+    return me, rival
+
+
+def test_player_api_ranks_every_track_in_one_query(
+    client, make_user, make_entry
+):
+    seed(make_user, make_entry)
+    data = client.get("/api/player/me").get_json()
+
+    assert [(t["track"], t["rank"], t["field"]) for t in data["tracks"]] == [
+        (TRACK, 2, 2), ("Water Park", 1, 3),
+    ]
+    summary = data["summary"]
+    assert summary["verified"] == 2
+    assert summary["pending"] == 1
+    assert summary["records"] == 1
+    assert summary["best_rank"] == 1
+    assert summary["average_rank"] == 1.5
+
+
+def test_player_page_renders(client, make_user, make_entry):
+    seed(make_user, make_entry)
+    rv = client.get("/player/rival")
+    assert rv.status_code == 200
+    assert "Water Park" in rv.get_data(as_text=True)
+
+
+def test_unknown_player_is_404(client):
+    assert client.get("/player/nobody").status_code == 404
+    assert client.get("/api/player/nobody").status_code == 404
+
+
+def test_player_cache_is_invalidated_by_their_verify(
+    client, make_user, make_entry, login
+):
+    me, _ = seed(make_user, make_entry)
+    assert client.get("/api/player/me").get_json()["summary"]["pending"] == 1
+
+    make_user("admin", is_admin=True)
+    login("admin")
+    client.post("/admin/claim")
+    pending = me.scores.filter_by(verified=False).first()
+    client.post(f"/admin/verify/{pending.id}")
+    summary = client.get("/api/player/me").get_json()["summary"]
+    assert summary["pending"] == 0
+    assert summary["verified"] == 3
@@ -0,0 +1,71 @@
+from app import db, points
+from app.commands import check_points, rebuild_points
+from app.models import PlayerPoints
+
+TRACK = "Mario Kart Stadium"
+
+
+def totals():
+    return dict(db.session.query(PlayerPoints.user_id, PlayerPoints.points))
+
+
+def test_verify_applies_point_deltas_for_the_track(
+    client, make_user, make_entry, login
+):
+    leader = make_user("leader")
+    make_entry(leader, TRACK, 1, 30, 0)
+    points.recompute_track(TRACK)
+    db.session.commit()
+    assert totals() == {leader.id: 15}
+
+    faster = make_user("faster")
+    entry = make_entry(faster, TRACK, 1, 20, 0, verified=False)
+    make_user("admin", is_admin=True)
+    login("admin")
+    client.post("/admin/claim")
+    client.post(f"/admin/verify/{entry.id}")
+    assert totals() == {faster.id: 15, leader.id: 12}
+
+    client.post(f"/admin/reject/{entry.id}")
+    assert totals() == {leader.id: 15}
+
+
+def test_only_top_twelve_placements_score(make_user, make_entry):
+    racers = [make_user(f"racer{i}") for i in range(13)]
+    for i, racer in enumerate(racers):
+        make_entry(racer, TRACK, 1, 30, i)
+    points.recompute_track(TRACK)
+    db.session.commit()
+
+    scored = totals()
+    assert racers[12].id not in scored
+    assert scored[racers[11].id] == 1
+
+
+def test_cli_check_detects_drift_and_rebuild_fixes_it(app, make_user, make_entry):
+    racer = make_user("racer")
+    make_entry(racer, TRACK, 1, 30, 0)
+    make_entry(racer, "Water Park", 1, 30, 0)
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(check_points)
+    assert result.exit_code == 1
+    assert f"user {racer.id}: stored 0, expected 30" in result.output
+
+    assert runner.invoke(rebuild_points).exit_code == 0
+    result = runner.invoke(check_points)
+    assert result.exit_code == 0
+    assert totals() == {racer.id: 30}
+
+
+def test_rankings_api_orders_by_points(client, make_user, make_entry):
+    make_entry(make_user("second"), TRACK, 1, 40, 0)
+    make_entry(make_user("first"), TRACK, 1, 30, 0)
+    points.rebuild()
+    db.session.commit()
+
+    standings = client.get("/api/rankings").get_json()["standings"]
+    assert [(s["player"], s["points"]) for s in standings] == [
+        ("first", 15), ("second", 12),
+    ]
+    assert client.get("/rankings").status_code == 200
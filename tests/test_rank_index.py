@@ -0,0 +1,103 @@
+import pytest
+from sqlalchemy import event
+
+from app import db, rank_index
+from app.models import Leaderboard
+from app.standings import standings_page, touch_track, user_standing
+
+TRACK = "Mario Kart Stadium"
+
+
+@pytest.fixture(autouse=True)
+def enabled(app):
+    app.config["RANK_INDEX"] = True
+
+
+def loads():
+    return rank_index.stats()["loads"]
+
+
+def assert_matches_sql(track=TRACK):
+    db.session.expire_all()
+    index = rank_index.index_for(track)
+    assert index.page(limit=len(index) + 1) == standings_page(track, limit=None)
+    for standing in index.standings:
+        user = db.session.get(Leaderboard, standing.id).user
+        assert rank_index.user_standing(track, user) == user_standing(track, user)
+
+
+def test_index_follows_verify_reject_and_submit_without_reloading(
+    client, make_user, make_entry, login, submit
+):
+    for i in range(5):
+        make_entry(make_user(f"racer{i}"), TRACK, 1, 30 + i, 0)
+    make_user("admin", is_admin=True)
+    one = make_entry(make_user("one"), TRACK, 1, 32, 0, verified=False).id
+    two = make_entry(make_user("two"), TRACK, 1, 20, 0, verified=False).id
+    three = make_entry(make_user("three"), TRACK, 1, 50, 0, verified=False).id
+    assert_matches_sql()
+    assert loads() == 1
+
+    login("admin")
+    client.post("/admin/claim")
+    client.post(f"/admin/verify/{one}")
+    client.post("/admin/bulk/verify", data={"ids": [two, three]})
+    client.post(f"/admin/reject/{one}")
+    client.post("/admin/bulk/reject", data={"ids": [three]})
+    client.get("/logout")
+    login("racer2")
+    submit(TRACK, 1, 25, 0)
+
+    assert_matches_sql()
+    assert len(rank_index.index_for(TRACK)) == 5
+    assert rank_index.stats()["updates"] == 5
+    assert loads() == 1
+
+
+def test_index_reloads_after_a_write_it_did_not_see(make_user, make_entry):
+    make_entry(make_user("first"), TRACK, 1, 30, 0)
+    assert len(rank_index.index_for(TRACK)) == 1
+
+    # as if another worker verified a time
+    make_entry(make_user("second"), TRACK, 1, 20, 0)
+    touch_track(TRACK)
+    db.session.commit()
+    assert [s.username for s in rank_index.page(TRACK)] == ["second", "first"]
+    assert loads() == 2
+
+
+def test_leaderboard_ranks_the_viewer_without_counting(
+    client, make_user, make_entry, login
+):
+    for i in range(15):
+        make_entry(make_user(f"racer{i}"), TRACK, 1, 30, i)
+    make_entry(make_user("me"), TRACK, 1, 40, 0)
+    login("me")
+    client.get(f"/leaderboard/{TRACK}")
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        body = client.get(f"/leaderboard/{TRACK}").get_data(as_text=True)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    assert not any("count(" in s.lower() for s in statements)
+    assert "16" in body
+
+
+def test_api_pages_come_from_the_index(client, make_user, make_entry):
+    for i in range(5):
+        make_entry(make_user(f"racer{i}"), TRACK, 1, 30, 4 - i)
+
+    page = client.get(f"/api/leaderboard/{TRACK}?limit=3").get_json()
+    page = client.get(
+        f"/api/leaderboard/{TRACK}?limit=3&after={page['next']}"
+    ).get_json()
+    assert [(e["rank"], e["player"]) for e in page["entries"]] == [
+        (4, "racer1"), (5, "racer0"),
+    ]
+    assert loads() == 1
@@ -1,13 +1,73 @@
-import pytest
-from app import app
+TRACK = "Mario Kart Stadium"
 
-@pytest.fixture
-def client():
-    app.config["TESTING"] = True
-    with app.test_client() as client:
-        yield client
 
 def test_index_route_returns_200(client):
     rv = client.get("/")
     assert rv.status_code == 200
 
+
+def test_unknown_track_returns_404(client):
+    rv = client.get("/leaderboard/Not a Track")
+    assert rv.status_code == 404
+
+
+def test_leaderboard_orders_by_total_time(client, make_user, make_entry):
+    slow = make_user("slow")
+    fast = make_user("fast")
+    make_entry(slow, TRACK, 1, 59, 999)
+    make_entry(fast, TRACK, 1, 30, 5)
+
+    body = client.get(f"/leaderboard/{TRACK}").get_data(as_text=True)
+    assert body.index("fast") < body.index("slow")
+
+
+def test_leaderboard_shows_rank_of_user_outside_top_10(
+    client, make_user, make_entry, login
+):
+    for i in range(12):
+        make_entry(make_user(f"racer{i}"), TRACK, 1, 30, i)
+    me = make_user("me")
+    make_entry(me, TRACK, 1, 40, 0)
+    login("me")
+
+    body = client.get(f"/leaderboard/{TRACK}").get_data(as_text=True)
+    assert ">13</td>" in body
+    assert "racer10" not in body
+
+
+def test_leaderboard_query_count_is_constant(
+    app, client, make_user, make_entry, login
+):
+    from flask import g
+    from sqlalchemy import event
+    from app import db
+
+    def fresh_request():
+        # the test app context outlives requests; drop what it remembers
+        db.session.expunge_all()
+        g.pop("_login_user", None)
+
+    for i in range(15):
+        make_entry(make_user(f"racer{i}"), TRACK, 1, 30, i)
+    me = make_user("me")
+    make_entry(me, TRACK, 1, 40, 0)
+    login("me")
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        # user loader, track version, top 10 with usernames, own entry + rank
+        fresh_request()
+        client.get(f"/leaderboard/{TRACK}")
+        assert len(statements) == 4
+        # the top 10 now comes from the standings cache, the user from theirs
+        statements.clear()
+        fresh_request()
+        client.get(f"/leaderboard/{TRACK}")
+        assert len(statements) == 2
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
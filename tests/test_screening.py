@@ -0,0 +1,113 @@
+import pytest
+
+from app import db, moderation, screening
+from app.models import Leaderboard, TrackStats
+from app.tracks import CUPS
+
+TRACK = CUPS["Mushroom Cup"][0]
+
+
+def field(make_user, make_entry, count=20):
+    # a spread of ordinary times around 1:40
+    for i in range(count):
+        make_entry(make_user(f"racer{i}"), TRACK, 1, 35 + i % 10, 37 * i % 1000)
+    screening.rebuild()
+    db.session.commit()
+
+
+def stats():
+    db.session.expire_all()
+    return db.session.get(TrackStats, TRACK)
+
+
+def test_verify_and_reject_keep_stats_equal_to_a_rebuild(
+    client, make_user, make_entry, login
+):
+    field(make_user, make_entry)
+    make_user("admin", is_admin=True)
+    slow = make_entry(make_user("slow"), TRACK, 1, 50, 0, verified=False).id
+    fast = make_entry(make_user("fast"), TRACK, 1, 20, 0, verified=False).id
+    login("admin")
+    client.post("/admin/claim")
+    client.post(f"/admin/verify/{slow}")
+    client.post("/admin/bulk/verify", data={"ids": [fast]})
+    assert stats().best_ms == 80_000
+
+    client.post(f"/admin/reject/{fast}")
+    kept = stats()
+    kept = (kept.count, kept.sum_log, kept.sum_log_sq, kept.best_ms)
+    screening.rebuild()
+    rebuilt = stats()
+    assert kept[0] == rebuilt.count == 21
+    assert kept[1] == pytest.approx(rebuilt.sum_log)
+    assert kept[2] == pytest.approx(rebuilt.sum_log_sq)
+    assert kept[3] == rebuilt.best_ms == 95_000
+
+
+def test_submit_scores_the_time_against_its_track(
+    client, make_user, make_entry, login, submit
+):
+    field(make_user, make_entry)
+    make_user("me")
+    login("me")
+
+    submit(TRACK, 1, 40, 0)
+    ordinary = Leaderboard.query.filter_by(verified=False).one().suspicion
+    assert ordinary < 1
+
+    submit(TRACK, 0, 0, 1)
+    fake = Leaderboard.query.filter_by(verified=False).one().suspicion
+    assert fake > 100
+
+
+def test_times_beating_the_record_are_always_flagged(app, make_user, make_entry):
+    field(make_user, make_entry)
+    record = stats().best_ms
+    assert screening.score(TRACK, record - 1) >= app.config["SUSPICION_FLAG"]
+    assert screening.score(TRACK, record) < app.config["SUSPICION_FLAG"]
+
+
+def test_tracks_without_enough_times_are_not_scored(make_user, make_entry):
+    field(make_user, make_entry, count=screening.MIN_SAMPLES - 1)
+    assert screening.score(TRACK, 1) is None
+
+
+def test_rescore_matches_submit_scoring_and_claims_riskiest_first(
+    app, make_user, make_entry
+):
+    field(make_user, make_entry)
+    totals = {}
+    for i, (mins, s) in enumerate([(1, 45), (0, 30), (1, 38), (1, 25)]):
+        entry = make_entry(make_user(f"new{i}"), TRACK, mins, s, 0, verified=False)
+        totals[entry.id] = entry.total_ms
+
+    result = app.test_cli_runner().invoke(
+        args=["rescore-pending", "--batch-size", "3"]
+    )
+    assert "Rescored 4 pending entries" in result.output
+    db.session.expire_all()
+    scored = {e.id: e.suspicion for e in Leaderboard.query.filter_by(verified=False)}
+    assert scored == {i: screening.score(TRACK, total) for i, total in totals.items()}
+
+    admin = make_user("admin", is_admin=True).id
+    claimed = [e.id for e in moderation.claim(admin, 4)]
+    assert claimed == sorted(scored, key=scored.get, reverse=True)
+
+
+def test_verifying_twice_counts_the_time_once(client, make_user, make_entry, login):
+    field(make_user, make_entry)
+    make_user("admin", is_admin=True)
+    entry_id = make_entry(make_user("new"), TRACK, 1, 30, 0, verified=False).id
+    login("admin")
+    client.post("/admin/claim")
+    client.post(f"/admin/verify/{entry_id}")
+    client.post(f"/admin/verify/{entry_id}")
+
+    kept = stats()
+    kept = (kept.count, kept.sum_log, kept.sum_log_sq, kept.best_ms)
+    screening.rebuild()
+    rebuilt = stats()
+    assert kept[0] == rebuilt.count == 21
+    assert kept[1] == pytest.approx(rebuilt.sum_log)
+    assert kept[2] == pytest.approx(rebuilt.sum_log_sq)
+    assert kept[3] == rebuilt.best_ms
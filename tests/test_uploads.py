@@ -0,0 +1,347 @@
+import hashlib
+import os
+
+import pytest
+from botocore.exceptions import ClientError
+from app import db, uploads
+from app.models import Leaderboard, ScreenshotObject
+from app.uploads import resume, uploader
+
+TRACK = "Mario Kart Stadium"
+
+
+class FakeS3:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.objects = {}
+
+    def upload_file(self, filename, bucket, key, ExtraArgs=None):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("bucket unreachable")
+        with open(filename, "rb") as f:
+            self.objects[(bucket, key)] = f.read()
+
+    def generate_presigned_url(self, method, Params, ExpiresIn):
+        self.presigned = (method, Params)
+        return f"https://{Params['Bucket']}.example/{Params['Key']}?signed"
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {"ContentLength": len(self.objects[(Bucket, Key)]),
+                "ContentType": "image/png"}
+
+
+@pytest.fixture
+def s3(app, tmp_path):
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    app.config.update(
+        USE_S3=True,
+        S3_BUCKET_NAME="proofs",
+        UPLOAD_SPOOL=str(spool),
+    )
+    fake = FakeS3()
+    uploader().s3 = fake
+    uploader().retries = 1
+    uploader().backoff = 0
+    return fake
+
+
+def status():
+    db.session.expire_all()
+    return Leaderboard.query.one().upload_status
+
+
+def test_submit_returns_before_the_upload_and_worker_finishes_it(
+    app, s3, make_user, login, submit
+):
+    make_user("me")
+    login("me")
+    s3.failures = 1  # first attempt fails, the retry succeeds
+
+    assert submit(TRACK, 1, 40, 0).status_code == 302
+    uploader().drain()
+
+    assert status() == "done"
+    [(bucket, key)] = s3.objects
+    assert bucket == "proofs"
+    assert Leaderboard.query.one().screenshot_path.endswith(key)
+    assert not os.listdir(app.config["UPLOAD_SPOOL"])
+
+
+def test_failed_upload_stays_spooled_and_blocks_verification(
+    app, client, s3, make_user, login, submit
+):
+    make_user("admin", is_admin=True)
+    make_user("me")
+    login("me")
+    s3.failures = 2
+    submit(TRACK, 1, 40, 0)
+    uploader().drain()
+
+    assert status() == "failed"
+    assert len(os.listdir(app.config["UPLOAD_SPOOL"])) == 1
+
+    client.get("/logout")
+    login("admin")
+    client.post("/admin/claim")
+    entry_id = Leaderboard.query.one().id
+    client.post(f"/admin/verify/{entry_id}")
+    db.session.expire_all()
+    assert not Leaderboard.query.one().verified
+
+    assert resume() == (1, 0)
+    assert status() == "done"
+    assert not os.listdir(app.config["UPLOAD_SPOOL"])
+
+
+def test_local_uploads_skip_the_pipeline(app, make_user, login, submit):
+    make_user("me")
+    login("me")
+    submit(TRACK, 1, 40, 0)
+
+    entry = Leaderboard.query.one()
+    assert entry.upload_status == "done"
+    assert entry.screenshot_path.startswith("/static/uploads/")
+
+
+def direct_upload(client, filename="proof.png", data=b"proof",
+                  content_type="image/png"):
+    target = client.post("/submit/upload-url", data={
+        "filename": filename,
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }).get_json()
+    if target["exists"]:
+        return target["key"], None
+    response = client.put(
+        target["url"], data=data, headers={"Content-Type": content_type}
+    )
+    return target["key"], response
+
+
+def submit_key(client, key):
+    return client.post("/submit", data={
+        "map_name": TRACK, "time_mins": 1, "time_s": 40, "time_ms": 0,
+        "screenshot_key": key,
+    })
+
+
+def test_direct_upload_to_local_endpoint_then_confirm(
+    app, client, make_user, login
+):
+    make_user("me")
+    login("me")
+    key, response = direct_upload(client)
+    assert response.status_code == 204
+    assert key == hashlib.sha256(b"proof").hexdigest() + ".png"
+
+    submit_key(client, key)
+    entry = Leaderboard.query.one()
+    assert entry.screenshot_path == f"/static/uploads/{key}"
+    assert entry.upload_status == "done"
+
+    # the same bytes again are recognised before anything is sent
+    assert direct_upload(client) == (key, None)
+
+
+def test_local_endpoint_checks_token_type_and_content(
+    app, client, make_user, login
+):
+    make_user("me")
+    login("me")
+    data = b"proof"
+    target = client.post("/submit/upload-url", data={
+        "filename": "proof.png",
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }).get_json()
+
+    def put(url, body=data, content_type="image/png"):
+        return client.put(
+            url, data=body, headers={"Content-Type": content_type}
+        ).status_code
+
+    assert put(target["url"] + "x") == 403
+    assert put(target["url"], content_type="image/gif") == 400
+    assert put(target["url"], body=b"other") == 400
+    assert put(target["url"], body=b"proof and more") == 400
+    assert os.listdir(app.config["UPLOAD_FOLDER"]) == []
+
+    def ask(**form):
+        return client.post("/submit/upload-url", data={
+            "filename": "proof.png", "size": 5, "sha256": "0" * 64, **form,
+        }).status_code
+
+    assert ask(filename="proof.exe") == 400
+    assert ask(sha256="../../etc") == 400
+    assert ask(size=app.config["MAX_SCREENSHOT_BYTES"] + 1) == 400
+
+
+def test_confirm_rejects_objects_that_are_not_stored(
+    app, client, make_user, login
+):
+    make_user("me")
+    login("me")
+    submit_key(client, "0" * 64 + ".png")
+    submit_key(client, "proof.png")
+    assert Leaderboard.query.count() == 0
+
+
+def test_presigned_put_pins_the_checksum(app, client, s3, make_user, login):
+    make_user("me")
+    login("me")
+    data = b"proof"
+    target = client.post("/submit/upload-url", data={
+        "filename": "proof.png",
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }).get_json()
+    method, params = s3.presigned
+    assert method == "put_object"
+    assert params["Key"] == target["key"]
+    assert params["ContentLength"] == len(data)
+    assert target["headers"]["x-amz-checksum-sha256"] == params["ChecksumSHA256"]
+
+    submit_key(client, target["key"])
+    assert Leaderboard.query.count() == 0
+
+    s3.objects[("proofs", target["key"])] = data  # the browser's PUT landed
+    submit_key(client, target["key"])
+    entry = Leaderboard.query.one()
+    assert entry.screenshot_path.endswith(target["key"])
+    assert entry.upload_status == "done"
+
+
+def stored_files(app):
+    return sorted(os.listdir(app.config["UPLOAD_FOLDER"]))
+
+
+def test_identical_screenshots_share_one_object(
+    app, client, make_user, login, submit
+):
+    make_user("admin", is_admin=True)
+    for name in ("first", "second"):
+        make_user(name)
+        login(name)
+        submit(TRACK, 1, 40, 0, screenshot=b"same proof")
+        client.get("/logout")
+
+    key = hashlib.sha256(b"same proof").hexdigest() + ".png"
+    assert stored_files(app) == [key]
+    # one reference from each entry and each history row
+    assert db.session.get(ScreenshotObject, key).refs == 4
+
+    login("admin")
+    client.post("/admin/claim")
+    for entry in Leaderboard.query.order_by(Leaderboard.id).all():
+        client.post(f"/admin/reject/{entry.id}")
+    # the history still shows the rejected submissions' proof
+    assert stored_files(app) == [key]
+    assert db.session.get(ScreenshotObject, key).refs == 2
+
+
+def test_an_object_goes_once_nothing_references_it(
+    app, client, make_user, make_entry, login
+):
+    key = hashlib.sha256(b"seeded").hexdigest() + ".png"
+    with open(os.path.join(app.config["UPLOAD_FOLDER"], key), "wb") as f:
+        f.write(b"seeded")
+    # seeded entries have no history rows
+    for name in ("first", "second"):
+        entry = make_entry(make_user(name), TRACK, 1, 40, 0)
+        entry.screenshot_path = f"/static/uploads/{key}"
+    uploads.rebuild_references()
+    db.session.commit()
+
+    make_user("admin", is_admin=True)
+    login("admin")
+    first, second = [e.id for e in Leaderboard.query.order_by(Leaderboard.id)]
+    client.post(f"/admin/reject/{first}")
+    assert stored_files(app) == [key]
+    client.post(f"/admin/reject/{second}")
+    assert stored_files(app) == []
+    assert db.session.get(ScreenshotObject, key) is None
+
+
+def test_resubmitting_keeps_the_replaced_screenshot_for_the_history(
+    app, make_user, login, submit
+):
+    make_user("me")
+    login("me")
+    submit(TRACK, 1, 40, 0, screenshot=b"old proof")
+    submit(TRACK, 1, 35, 0, screenshot=b"new proof")
+
+    old, new = (
+        hashlib.sha256(proof).hexdigest() + ".png"
+        for proof in (b"old proof", b"new proof")
+    )
+    assert stored_files(app) == sorted([old, new])
+    assert db.session.get(ScreenshotObject, old).refs == 1
+    assert db.session.get(ScreenshotObject, new).refs == 2
+
+
+def test_content_address_command_rewrites_legacy_paths(
+    app, make_user, make_entry, login, submit
+):
+    me = make_user("me")
+    other = make_user("other")
+    for user, name in [(me, "a1_proof.png"), (other, "b2_proof.PNG")]:
+        entry = make_entry(user, TRACK, 1, 40, 0)
+        entry.screenshot_path = f"/static/uploads/{name}"
+        with open(os.path.join(app.config["UPLOAD_FOLDER"], name), "wb") as f:
+            f.write(b"legacy")
+    missing = make_entry(me, "Water Park", 1, 40, 0)
+    missing.screenshot_path = "/static/uploads/gone.png"
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=["content-address-screenshots"])
+    assert "Moved 2 screenshots, 1 missing" in result.output
+
+    key = hashlib.sha256(b"legacy").hexdigest() + ".png"
+    assert stored_files(app) == [key]
+    db.session.expire_all()
+    assert {e.screenshot_path for e in Leaderboard.query.filter_by(track=TRACK)} == {
+        f"/static/uploads/{key}"
+    }
+    assert db.session.get(ScreenshotObject, key).refs == 2
+
+
+def test_content_address_keeps_originals_until_the_batch_commits(
+    app, make_user, make_entry, monkeypatch
+):
+    entry = make_entry(make_user("me"), TRACK, 1, 40, 0)
+    entry.screenshot_path = "/static/uploads/a1_proof.png"
+    with open(os.path.join(app.config["UPLOAD_FOLDER"], "a1_proof.png"), "wb") as f:
+        f.write(b"legacy")
+    db.session.commit()
+
+    def lost_connection():
+        raise OSError("database went away")
+
+    monkeypatch.setattr(db.session, "commit", lost_connection)
+    with pytest.raises(OSError):
+        uploads.content_address()
+    monkeypatch.undo()
+    db.session.rollback()
+
+    # the entry still points at the original, so it must still be there
+    assert "a1_proof.png" in stored_files(app)
+    assert Leaderboard.query.one().screenshot_path == "/static/uploads/a1_proof.png"
+
+
+def test_discard_leaves_an_object_acquired_again(app, make_user, login, submit):
+    make_user("me")
+    login("me")
+    submit(TRACK, 1, 40, 0, screenshot=b"proof")
+    key = hashlib.sha256(b"proof").hexdigest() + ".png"
+
+    assert uploads.release(key, count=2)
+    uploads.acquire(key)
+    db.session.commit()
+    uploads.discard(key)
+
+    assert stored_files(app) == [key]
+    assert db.session.get(ScreenshotObject, key).refs == 1
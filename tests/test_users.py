@@ -0,0 +1,76 @@
+from flask import g
+from sqlalchemy import event, update
+
+from app import db
+from app.models import User
+from app.users import user_cache
+
+
+def user_queries(client, url):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "FROM user" in statement:
+            statements.append(statement)
+
+    # the test app context outlives requests; drop what it remembers
+    db.session.expunge_all()
+    g.pop("_login_user", None)
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        rv = client.get(url)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    return rv, statements
+
+
+def test_logged_in_user_is_loaded_once(client, make_user, login):
+    make_user("racer")
+    login("racer")
+
+    _, first = user_queries(client, "/")
+    rv, second = user_queries(client, "/")
+    assert len(first) == 1
+    assert second == []
+    assert b"Logout" in rv.data
+
+
+def test_changing_the_user_drops_the_cached_copy(client, make_user, login):
+    user = make_user("racer")
+    user_id = user.id
+    login("racer")
+    user_queries(client, "/")
+    cached = user_cache.get(user_id)
+    assert cached is not None
+
+    user = db.session.get(User, user_id)
+    user.is_admin = True
+    db.session.flush()
+    # another request caching the committed row before this one commits
+    user_cache.set(user_id, cached)
+    db.session.commit()
+    assert user_cache.get(user_id) is None
+
+    rv, statements = user_queries(client, "/admin/metrics")
+    assert rv.status_code == 200
+    assert len(statements) == 2
+
+
+def test_admin_rights_are_rechecked_past_the_cache(client, make_user, login):
+    make_user("admin", is_admin=True)
+    login("admin")
+    assert user_queries(client, "/admin/metrics")[0].status_code == 200
+
+    # a demotion this worker's mapper events never saw
+    db.session.execute(update(User).values(is_admin=False))
+    db.session.commit()
+    assert user_queries(client, "/admin/metrics")[0].status_code == 403
+
+
+def test_metrics_report_the_user_cache(client, make_user, login):
+    make_user("admin", is_admin=True)
+    login("admin")
+    user_queries(client, "/admin/metrics")
+    users = user_queries(client, "/admin/metrics")[0].get_json()["caches"]["users"]
+    assert users["hits"] >= 1
+    assert users["hit_rate"] > 0